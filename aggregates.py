@@ -0,0 +1,138 @@
+import datetime
+from events import ProductAdded, ProductRemoved, ProductChanged, LotsChanged, StockReloaded
+from money import CENTS, Money
+from products import FoodProduct
+
+
+class InventoryAggregates:
+    """
+    Running totals over the warehouse stock.
+    Each product contributes price * quantity; attached to a warehouse event bus,
+    every change event is folded in with O(1) work. Values are summed in integer
+    cents, so the totals stay exact however many changes are folded in.
+    """
+
+    def __init__(self):
+        self.total_cents = 0
+        self.total_units = 0
+        self.cents_by_category = {}
+        self.units_by_category = {}
+        self.units_by_expiry = {}
+
+    @property
+    def total_value(self) -> float:
+        return self.total_cents / CENTS
+
+    @property
+    def value_by_category(self) -> dict:
+        return {category: cents / CENTS for category, cents in self.cents_by_category.items()}
+
+    @classmethod
+    def from_products(cls, products):
+        aggregates = cls()
+        for product in products:
+            aggregates.add(product)
+        return aggregates
+
+    def attach(self, bus):
+        bus.subscribe(ProductAdded, lambda event: self.add(event.product))
+        bus.subscribe(ProductRemoved, lambda event: self.discard(event.product))
+        bus.subscribe(ProductChanged, self._on_changed)
+        bus.subscribe(LotsChanged, self._on_lots_changed)
+        bus.subscribe(StockReloaded, self._on_reloaded)
+        return self
+
+    def _on_reloaded(self, event):
+        self.__init__()
+        for product in event.products:
+            self.add(product)
+
+    def _on_changed(self, event):
+        product = event.product
+        category = product.category
+        if event.field == "quantity":
+            units = event.after - event.before
+            value = product.price_cents * units
+            self.total_units += units
+            self.units_by_category[category] = self.units_by_category.get(category, 0) + units
+        elif event.field == "price_cents":
+            value = product.quantity * (event.after - event.before)
+        else:
+            return
+        self.total_cents += value
+        self.cents_by_category[category] = self.cents_by_category.get(category, 0) + value
+
+    def _on_lots_changed(self, event):
+        for day, units in event.removed:
+            self._add_expiring(day, -units)
+        for day, units in event.added:
+            self._add_expiring(day, units)
+
+    def _add_expiring(self, day, units):
+        remaining = self.units_by_expiry.get(day, 0) + units
+        if remaining:
+            self.units_by_expiry[day] = remaining
+        else:
+            self.units_by_expiry.pop(day, None)
+
+    def add(self, product):
+        self._apply(product, 1)
+
+    def discard(self, product):
+        self._apply(product, -1)
+
+    def _apply(self, product, sign):
+        value = sign * product.total_cents()
+        units = sign * product.quantity
+        category = product.category
+
+        self.total_cents += value
+        self.total_units += units
+        self.cents_by_category[category] = self.cents_by_category.get(category, 0) + value
+        self.units_by_category[category] = self.units_by_category.get(category, 0) + units
+
+        if isinstance(product, FoodProduct):
+            for day, _, lot_units in product.lots:
+                self._add_expiring(day, sign * lot_units)
+
+    def merge(self, other, sign=1):
+        """ Fold another set of totals into this one (sign=-1 takes them out again). """
+        self.total_cents += sign * other.total_cents
+        self.total_units += sign * other.total_units
+        for category, value in other.cents_by_category.items():
+            self.cents_by_category[category] = self.cents_by_category.get(category, 0) + sign * value
+        for category, units in other.units_by_category.items():
+            self.units_by_category[category] = self.units_by_category.get(category, 0) + sign * units
+        for day, units in other.units_by_expiry.items():
+            self._add_expiring(day, sign * units)
+        return self
+
+    def units_expiring_within(self, days=7, today=None) -> int:
+        if today is None:
+            today = datetime.date.today()
+        return sum(self.units_by_expiry.get(today + datetime.timedelta(days=d), 0) for d in range(days + 1))
+
+    def differences(self, other) -> list:
+        """ Human readable list of totals that disagree between two aggregate sets. """
+        problems = []
+        if self.total_cents != other.total_cents:
+            problems.append(f"Total value: {Money(self.total_cents)} != {Money(other.total_cents)}")
+        if self.total_units != other.total_units:
+            problems.append(f"Total units: {self.total_units} != {other.total_units}")
+
+        for category in sorted(set(self.cents_by_category) | set(other.cents_by_category)):
+            mine = self.cents_by_category.get(category, 0)
+            theirs = other.cents_by_category.get(category, 0)
+            if mine != theirs:
+                problems.append(f"{category} value: {Money(mine)} != {Money(theirs)}")
+        for category in sorted(set(self.units_by_category) | set(other.units_by_category)):
+            mine = self.units_by_category.get(category, 0)
+            theirs = other.units_by_category.get(category, 0)
+            if mine != theirs:
+                problems.append(f"{category} units: {mine} != {theirs}")
+
+        mine = {d: u for d, u in self.units_by_expiry.items() if u}
+        theirs = {d: u for d, u in other.units_by_expiry.items() if u}
+        if mine != theirs:
+            problems.append("Units by expiration date differ")
+        return problems
@@ -0,0 +1,90 @@
+import atexit
+import logging
+import logging.handlers
+import queue
+import time
+
+LOGGER_NAME = "warehouse"
+LOG_FILE = "warehouse.log"
+MAX_BYTES = 5 * 1024 * 1024
+BACKUP_COUNT = 5
+
+logger = logging.getLogger(LOGGER_NAME)
+# Library use stays silent until an entry point calls setup_logging()
+logger.addHandler(logging.NullHandler())
+
+_listener = None
+
+
+class StructuredFormatter(logging.Formatter):
+    """ One line per record: time, level, event name, key=value fields, then the message. """
+
+    def format(self, record):
+        fields = getattr(record, "fields", {})
+        parts = [self.formatTime(record, "%Y-%m-%d %H:%M:%S"), record.levelname, getattr(record, "event", "-")]
+        parts.extend(f"{key}={value!r}" if isinstance(value, str) else f"{key}={value}"
+                     for key, value in fields.items())
+        line = " ".join(parts) + " | " + record.getMessage()
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class ConsoleFormatter(logging.Formatter):
+    """ The /=== message ===/ style the console has always used. """
+
+    def format(self, record):
+        prefix = "" if record.levelno <= logging.INFO else f"{record.levelname}: "
+        return f"/=== {prefix}{record.getMessage()} ===/\n"
+
+
+def setup_logging(path=LOG_FILE, level=logging.INFO, console=True):
+    """
+    Route the warehouse logger through a queue: callers only enqueue, and a background
+    thread formats and writes to a rotating audit file (and the console).
+    Calling it again replaces the previous configuration.
+    """
+    global _listener
+    shutdown_logging()
+
+    file_handler = logging.handlers.RotatingFileHandler(path, maxBytes=MAX_BYTES, backupCount=BACKUP_COUNT,
+                                                        encoding="utf-8")
+    file_handler.setFormatter(StructuredFormatter())
+    handlers = [file_handler]
+    if console:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(ConsoleFormatter())
+        handlers.append(console_handler)
+
+    records = queue.SimpleQueue()
+    logger.handlers = [logging.handlers.QueueHandler(records)]
+    logger.setLevel(level)
+    logger.propagate = False
+    _listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def shutdown_logging():
+    """ Flush what is queued and close the files. """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+        logger.handlers = [logging.NullHandler()]
+
+
+atexit.register(shutdown_logging)
+
+
+def log(level, event: str, message: str, **fields):
+    if logger.isEnabledFor(level):
+        logger.log(level, message, extra={"event": event, "fields": fields})
+
+
+def log_batch(event: str, message: str, started: float, level=logging.INFO, **fields):
+    """ One summary record for a whole batch; started is a time.perf_counter() reading. """
+    seconds = time.perf_counter() - started
+    log(level, event, f"{message} in {seconds:.3f}s", seconds=round(seconds, 6), **fields)
@@ -0,0 +1,133 @@
+import logging
+import os
+import pickle
+import threading
+import time
+from audit_log import log, log_batch
+from warehouse import write_atomically
+
+# Seconds without a change before the pending changes are written
+AUTOSAVE_DELAY = 5.0
+# How often the owning thread should call Autosaver.poll()
+AUTOSAVE_POLL_INTERVAL = 1.0
+
+
+class Autosaver:
+    """
+    Saves a warehouse snapshot once changes have settled for `delay` seconds, and only when
+    something changed since the last save. The file is replaced atomically, so a crash never
+    leaves a half-written snapshot.
+
+    Warehouse methods change their state before they publish the event that counts the change,
+    so the state is only ever pickled on the thread that owns the warehouse: poll() (called
+    regularly from that thread, e.g. by a GUI timer) syncs the cold store, pickles the state and
+    hands the bytes to a background thread, which writes the file.
+    """
+
+    def __init__(self, warehouse, path: str, delay: float = AUTOSAVE_DELAY):
+        self.warehouse = warehouse
+        # Resolved now, so a later change of working directory cannot redirect the saves
+        self.path = os.path.abspath(path)
+        self.delay = delay
+        self.saves = 0
+        self._last_change = time.monotonic()
+        # Change count of the snapshot last handed to the writer, and of the one last written
+        self._queued = None
+        self._written = -1
+        self._pending = None
+        self._ready = threading.Condition()
+        self._stopped = False
+        # Keeps a flush on the caller thread from overlapping a background write
+        self._saving = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name=f"autosave {warehouse.name}", daemon=True)
+        warehouse.events.subscribe_all(self._on_change)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _on_change(self, event):
+        self._last_change = time.monotonic()
+
+    @property
+    def pending(self) -> bool:
+        return self.warehouse.dirty
+
+    def poll(self, now=None) -> bool:
+        """ On the owning thread: queue a snapshot once the changes have settled. Returns whether one was queued. """
+        warehouse = self.warehouse
+        if not warehouse.dirty or warehouse.change_count == self._queued:
+            return False
+        now = time.monotonic() if now is None else now
+        if now - self._last_change < self.delay:
+            return False
+        snapshot = self._snapshot()
+        if snapshot is None:
+            # Try again after another quiet period
+            self._last_change = now
+            return False
+        self._queued = snapshot[0]
+        with self._ready:
+            self._pending = snapshot
+            self._ready.notify()
+        return True
+
+    def _snapshot(self):
+        # Called on the owning thread: nothing changes between syncing the cold store and pickling the state
+        warehouse = self.warehouse
+        try:
+            if warehouse.cold is not None:
+                warehouse.cold.sync()
+            return warehouse.snapshot_bytes()
+        except (OSError, pickle.PickleError) as e:
+            log(logging.ERROR, "store.autosave", f"Autosave of {warehouse.name} failed: {e}", file=self.path)
+            return None
+
+    def _run(self):
+        while True:
+            with self._ready:
+                while self._pending is None and not self._stopped:
+                    self._ready.wait()
+                if self._stopped:
+                    return
+                changes, data = self._pending
+                self._pending = None
+            if not self._write(changes, data):
+                self._queued = None
+                self._last_change = time.monotonic()
+
+    def _write(self, changes, data) -> bool:
+        with self._saving:
+            warehouse = self.warehouse
+            if changes <= self._written:
+                # A flush already wrote this state or a later one
+                return True
+            started = time.perf_counter()
+            try:
+                write_atomically(self.path, data)
+            except OSError as e:
+                log(logging.ERROR, "store.autosave", f"Autosave of {warehouse.name} failed: {e}", file=self.path)
+                return False
+            self._written = changes
+            warehouse.saved_change_count = changes
+            self.saves += 1
+            log_batch("store.autosave", f"Autosaved {warehouse.name} to '{self.path}'", started, file=self.path,
+                      bytes=len(data))
+            return True
+
+    def flush(self) -> bool:
+        """ Save pending changes now, on the calling (owning) thread; a no-op when everything is saved. """
+        if not self.warehouse.dirty:
+            return True
+        snapshot = self._snapshot()
+        return snapshot is not None and self._write(*snapshot)
+
+    def close(self, flush: bool = True) -> bool:
+        """ Stop the writer and, unless told otherwise, write whatever is still pending. """
+        with self._ready:
+            self._stopped = True
+            self._ready.notify()
+        if self._thread.is_alive():
+            self._thread.join()
+        self.warehouse.events.unsubscribe_all(self._on_change)
+        return self.flush() if flush else True
@@ -0,0 +1,113 @@
+import uuid
+
+# GS1 reserves the 20-29 prefixes for numbers issued inside a single store,
+# so codes built on it never collide with manufacturer bar codes.
+STORE_PREFIX = 20
+SERIAL_DIGITS = 10
+MAX_SERIAL = 10 ** SERIAL_DIGITS - 1
+
+
+def ean13_check_digit(body: int) -> int:
+    """ Check digit for the 12-digit body of an EAN-13 code. """
+    digits = f"{body:012d}"
+    odd = sum(int(d) for d in digits[0::2])
+    even = sum(int(d) for d in digits[1::2])
+    return (10 - (odd + 3 * even) % 10) % 10
+
+
+def make_ean13(serial: int) -> int:
+    if not (0 < serial <= MAX_SERIAL):
+        raise ValueError(f"Serial {serial} is outside the bar code range.")
+    body = STORE_PREFIX * 10 ** SERIAL_DIGITS + serial
+    return body * 10 + ean13_check_digit(body)
+
+
+def is_valid_ean13(code: int) -> bool:
+    if not isinstance(code, int) or not (0 <= code < 10 ** 13):
+        return False
+    return ean13_check_digit(code // 10) == code % 10
+
+
+def serial_of(code: int) -> int:
+    return (code // 10) % 10 ** SERIAL_DIGITS
+
+
+def format_bar_code(code) -> str:
+    if isinstance(code, int):
+        return f"{code:013d}"
+    return "-" if code is None else str(code)
+
+
+def parse_bar_code(text) -> int:
+    """ Turn scanned or typed input into the integer form of a bar code. """
+    if isinstance(text, int):
+        code = text
+    else:
+        text = str(text).strip()
+        if not text.isdigit() or len(text) != 13:
+            raise ValueError(f"'{text}' is not a 13-digit bar code.")
+        code = int(text)
+    if not is_valid_ean13(code):
+        raise ValueError(f"'{format_bar_code(code)}' has an invalid check digit.")
+    return code
+
+
+def is_legacy_bar_code(value) -> bool:
+    if not isinstance(value, str):
+        return False
+    try:
+        uuid.UUID(value)
+    except ValueError:
+        return False
+    return True
+
+
+class BarCodeAllocator:
+    """
+    Monotonic source of store bar codes; never hands out the same serial twice.
+    With step > 1 it only issues serials congruent to next_serial modulo step, which
+    lets several warehouses share one code space without coordinating.
+    """
+
+    def __init__(self, next_serial: int = 1, step: int = 1):
+        self.next_serial = next_serial
+        self.step = step
+
+    def allocate(self) -> int:
+        code = make_ean13(self.next_serial)
+        self.next_serial += self.step
+        return code
+
+    def observe(self, code: int):
+        """ Make sure a code issued elsewhere (e.g. loaded from disk) is never reissued. """
+        serial = serial_of(code)
+        if serial >= self.next_serial:
+            self.next_serial += ((serial - self.next_serial) // self.step + 1) * self.step
+
+    def __repr__(self):
+        return f"<BarCodeAllocator next serial: {self.next_serial}, step: {self.step}>"
+
+
+def migrate_bar_codes(products, allocator: BarCodeAllocator) -> dict:
+    """
+    Give every product an integer bar code.
+    Returns a mapping from each replaced legacy (UUID) code to its new code.
+    """
+    for product in products:
+        if isinstance(product.bar_code, int):
+            allocator.observe(product.bar_code)
+
+    mapping = {}
+    for product in products:
+        code = product.bar_code
+        if isinstance(code, int):
+            continue
+        if code in mapping:
+            product.bar_code = mapping[code]
+            continue
+        new_code = allocator.allocate()
+        # Only real UUIDs were ever printed on labels; anything else just gets a fresh code
+        if is_legacy_bar_code(code):
+            mapping[code] = new_code
+        product.bar_code = new_code
+    return mapping
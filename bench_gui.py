@@ -0,0 +1,156 @@
+import argparse
+import datetime
+import os
+import random
+import statistics
+import tempfile
+import time
+
+# Must be set before Qt is imported: the benchmark never needs a display
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt6.QtWidgets import QApplication, QDialog, QMessageBox
+
+import main as gui
+from products import FoodProduct, ElectronicProduct, ClothingProduct, ClothingStyle
+
+# One frame at 60 Hz; anything longer than this on the GUI thread is a visible stall
+FRAME_MS = 1000 / 60
+DEFAULT_SIZES = (1_000, 5_000, 20_000)
+
+
+def generate_catalog(count: int, seed: int = 0) -> list:
+    """ A reproducible mix of food, electronics, clothing and clothing lines. """
+    rng = random.Random(seed)
+    today = datetime.date.today()
+    products = []
+    for i in range(count):
+        kind = i % 10
+        price = round(rng.uniform(0.5, 500), 2)
+        quantity = rng.randint(0, 50)
+        if kind < 4:
+            product = FoodProduct(f"Food {i}", price, quantity, "Generated",
+                                  today + datetime.timedelta(days=rng.randint(1, 60)))
+        elif kind < 7:
+            product = ElectronicProduct(f"Device {i}", price, quantity, "Generated",
+                                        today + datetime.timedelta(days=rng.randint(30, 900)))
+        elif kind < 9:
+            product = ClothingProduct(f"Shirt {i}", price, quantity, "Generated",
+                                      rng.choice("SML"), rng.choice(["red", "blue", "black"]))
+        else:
+            stock = {(s, c): rng.randint(0, 10) for s in "SML" for c in ("red", "blue")}
+            product = ClothingStyle(f"Line {i}", price, "Generated", list("SML"), ["red", "blue"], stock=stock)
+        products.append(product)
+    return products
+
+
+def _time(func, repeat: int) -> list:
+    app = QApplication.instance()
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        # Layout and paint happen in the event loop, so they count towards the stall
+        app.processEvents()
+        durations.append((time.perf_counter() - start) * 1000)
+    return durations
+
+
+def _summary(name: str, size: int, durations: list) -> dict:
+    return {
+        "case": name,
+        "size": size,
+        "median_ms": statistics.median(durations),
+        "max_ms": max(durations),
+        "frames_blocked": max(int(d // FRAME_MS) for d in durations),
+    }
+
+
+def _run_command(window, command: str):
+    window.cmd_input.setText(command)
+    window.handle_command()
+
+
+def _load_all_pages(window):
+    window.populate_table(None)
+    while window._cursor is not None:
+        window.fetch_more_rows()
+
+
+def bench_size(window, size: int, repeat: int) -> list:
+    warehouse = window.warehouse
+    warehouse.products = generate_catalog(size)
+    sellable = [p for p in warehouse.sellable_items() if p.quantity > 0]
+    pickup = datetime.datetime.now() + datetime.timedelta(days=1)
+    for product in sellable[:size // 100]:
+        warehouse.add_reservation(product, 1, pickup)
+    changed = sellable[-10:]
+
+    cases = [
+        ("populate_table", lambda: window.populate_table(None)),
+        ("scroll through every page", lambda: _load_all_pages(window)),
+        ("populate_table (Food)", lambda: window.populate_table("Food")),
+        ("refresh_rows (10 products)", lambda: window.refresh_rows(changed)),
+        ("refresh_dashboard", window.refresh_dashboard),
+        ("BuyProductDialog()", lambda: gui.BuyProductDialog(window, warehouse).deleteLater()),
+        ("ReserveProductDialog()", lambda: gui.ReserveProductDialog(window, warehouse).deleteLater()),
+        ("handle_command 8 (buy)", lambda: _run_command(window, "8")),
+        ("handle_command 7 (reserve)", lambda: _run_command(window, "7")),
+        ("handle_command 10 (totals)", lambda: _run_command(window, "10")),
+    ]
+    results = [_summary(name, size, _time(func, repeat)) for name, func in cases]
+
+    window.expand_cb.setChecked(True)
+    results.append(_summary("populate_table (variants)", size,
+                            _time(lambda: window.populate_table(None), repeat)))
+    window.expand_cb.setChecked(False)
+    return results
+
+
+def print_report(results: list):
+    print(f"{'case':<30}{'size':>8}{'median ms':>12}{'max ms':>10}{'frames':>8}")
+    for r in results:
+        flag = "  <-- blocks the UI" if r["frames_blocked"] else ""
+        print(f"{r['case']:<30}{r['size']:>8}{r['median_ms']:>12.2f}{r['max_ms']:>10.2f}"
+              f"{r['frames_blocked']:>8}{flag}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the warehouse GUI against generated catalogs, without a display.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    app = QApplication.instance() or QApplication([])
+    # Modal dialogs and message boxes would wait for a click; only their construction is timed
+    QDialog.exec = lambda self: 0
+    QMessageBox.information = staticmethod(lambda *a, **k: QMessageBox.StandardButton.Ok)
+    QMessageBox.critical = staticmethod(lambda *a, **k: QMessageBox.StandardButton.Ok)
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        # The window loads and saves its files in the working directory; keep real data out of it
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            window = gui.MainWindow()
+            window.show()
+            app.processEvents()
+            for size in args.sizes:
+                results.extend(bench_size(window, size, args.repeat))
+            window.snapshot_timer.stop()
+            window.autosave_timer.stop()
+            # The benchmark's changes are throwaway; stop the savers before leaving the temporary directory
+            for saver in window.autosavers:
+                saver.close(flush=False)
+            window.snapshots.close()
+            window.warehouse.close_cold_store()
+            window.deleteLater()
+        finally:
+            os.chdir(cwd)
+    print_report(results)
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,396 @@
+import argparse
+import heapq
+import logging
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from audit_log import LOG_FILE, log, setup_logging
+from barcodes import BarCodeAllocator, format_bar_code, parse_bar_code, serial_of
+from ledger import DEMAND_DAYS, ledger_filename
+from low_stock import export_reorder_list
+from money import CENTS, Money
+from pagination import PAGE_SIZE, Page
+from query import Query
+from tiering import IDLE_DAYS, cold_filename
+from warehouse import Warehouse, format_reservation_id, parse_reservation_id
+
+
+def shard_filename(name: str, directory: str = ".") -> str:
+    slug = re.sub(r"[^a-z0-9]+", "_", name.lower()).strip("_")
+    return os.path.join(directory, f"warehouse_{slug}.pickle")
+
+
+def _load_shard(name: str, path: str) -> Warehouse:
+    shard = Warehouse(name)
+    shard.open_cold_store(cold_filename(path))
+    if os.path.exists(path):
+        shard.load_snapshot(path)
+    return shard
+
+
+def sweep_shard(name: str, path: str) -> dict:
+    """ Nightly maintenance for one shard file; runs inside a worker process. """
+    shard = _load_shard(name, path)
+    expired = shard.remove_expired()
+    out_of_warranty = shard.remove_out_of_warranty()
+    reservations = shard.expire_reservations()
+    paged = shard.page_out(IDLE_DAYS)
+    # A shard with nothing to sweep keeps its file as it is
+    changed = shard.dirty
+    if changed:
+        shard.save_snapshot(path)
+    shard.close_cold_store()
+    return {
+        "name": name,
+        "expired": len(expired),
+        "out_of_warranty": len(out_of_warranty),
+        "expired_reservations": len(reservations),
+        "paged_out": len(paged),
+        "changed": changed,
+    }
+
+
+def _next_in_lane(current: int, index: int, count: int) -> int:
+    """ Smallest number >= current that belongs to lane index (numbers congruent to index + 1 modulo count). """
+    number = index + 1
+    if current > number:
+        number += ((current - number + count - 1) // count) * count
+    return number
+
+
+class WarehouseCluster:
+    """
+    Several sites behind one interface. Each shard is an ordinary Warehouse with its
+    own snapshot file; shard i of n only issues bar code serials congruent to i + 1
+    modulo n, so any bar code routes straight to the shard that issued it. Reservation
+    IDs are laned the same way.
+    """
+
+    def __init__(self, names, directory="."):
+        if not names:
+            raise ValueError("A cluster needs at least one warehouse.")
+        if len(set(names)) != len(names):
+            raise ValueError("Warehouse names in a cluster must be unique.")
+        self.directory = directory
+        self.shards = [Warehouse(name) for name in names]
+        # Shards whose snapshot file exists but could not be read by load()
+        self.unreadable = []
+        for index, shard in enumerate(self.shards):
+            shard.bar_codes = BarCodeAllocator(index + 1, len(self.shards))
+            shard.next_reservation_id, shard.reservation_id_step = index + 1, len(self.shards)
+
+    def __len__(self):
+        return len(self.shards)
+
+    @property
+    def names(self) -> list:
+        return [shard.name for shard in self.shards]
+
+    def path_of(self, shard: Warehouse) -> str:
+        return shard_filename(shard.name, self.directory)
+
+    def shard(self, name: str) -> Warehouse:
+        for shard in self.shards:
+            if shard.name == name:
+                return shard
+        raise KeyError(f"No warehouse named '{name}' in the cluster.")
+
+    def _align_allocators(self):
+        # Snapshots written outside the cluster use step 1; move bar codes and reservation IDs onto their lane
+        count = len(self.shards)
+        # Reservation IDs already issued are kept when sites are added or removed (shard_for_reservation still
+        # finds them); every site then issues new IDs above all of them, so none is handed out twice
+        resized = any(shard.reservation_id_step != count for shard in self.shards)
+        floor = max(shard.next_reservation_id for shard in self.shards) if resized else 1
+        for index, shard in enumerate(self.shards):
+            allocator = shard.bar_codes
+            if allocator.step != count or allocator.next_serial % count != (index + 1) % count:
+                shard.bar_codes = BarCodeAllocator(_next_in_lane(allocator.next_serial, index, count), count)
+            if resized or shard.next_reservation_id % count != (index + 1) % count:
+                shard.next_reservation_id = _next_in_lane(max(shard.next_reservation_id, floor), index, count)
+                shard.reservation_id_step = count
+
+    def load(self):
+        for shard in self.shards:
+            path = self.path_of(shard)
+            shard.open_cold_store(cold_filename(path))
+            shard.open_ledger(ledger_filename(path))
+            if os.path.exists(path) and not shard.load_snapshot(path):
+                self.unreadable.append(shard)
+        self._align_allocators()
+
+    def save(self):
+        for shard in self.shards:
+            shard.save_snapshot(self.path_of(shard))
+
+    def close(self):
+        for shard in self.shards:
+            shard.close_cold_store()
+            shard.close_ledger()
+
+    def shard_for(self, bar_code) -> Warehouse:
+        code = parse_bar_code(bar_code)
+        return self.shards[(serial_of(code) - 1) % len(self.shards)]
+
+    def shard_for_reservation(self, reservation_id) -> Warehouse:
+        """ The site that issued a reservation ID, read off its lane like shard_for() does for bar codes. """
+        number = parse_reservation_id(reservation_id)
+        shard = self.shards[(number - 1) % len(self.shards)]
+        if shard.reservation(number) is not None:
+            return shard
+        # IDs issued before the cluster existed or before sites were added or removed are not on a lane
+        for other in self.shards:
+            if other.reservation(number) is not None:
+                return other
+        return shard
+
+    def reservations_of(self, customer: str) -> list:
+        """ (shard, reservation) pairs made under the customer's name on any site. """
+        return [(shard, r) for shard in self.shards for r in shard.reservations_of(customer)]
+
+    def find_by_bar_code(self, bar_code):
+        try:
+            product = self.shard_for(bar_code).find_by_bar_code(bar_code)
+        except ValueError:
+            product = None
+        if product is not None:
+            return product
+        # Codes migrated from UUIDs or issued before the cluster existed are not on a lane
+        for shard in self.shards:
+            product = shard.find_by_bar_code(bar_code)
+            if product is not None:
+                return product
+        return None
+
+    def find_by_name(self, name: str) -> list:
+        found = [(shard, p) for shard in self.shards for p in shard.products if p.name == name]
+        if not found:
+            # Only fault in from the cold stores when nothing resident matches
+            found = [(shard, p) for shard in self.shards for p in [shard.find_by_name(name)] if p is not None]
+        return found
+
+    def insert_product(self, product, shard_name=None, merge=True):
+        if shard_name is None:
+            # An identical product on any site takes the units; otherwise the emptiest site gets it
+            identical = [s for s in self.shards if merge and s.find_identical(product) is not None]
+            target = identical[0] if identical else min(self.shards, key=lambda s: len(s.products))
+        else:
+            target = self.shard(shard_name)
+        return target.insert_product(product, merge)
+
+    def price_range(self, low=None, high=None, category=None) -> list:
+        """ (shard, product) pairs priced between low and high on any site, cheapest first. """
+        per_shard = [[(shard, p) for p in shard.price_range(low, high, category)] for shard in self.shards]
+        return list(heapq.merge(*per_shard, key=lambda pair: pair[1].price))
+
+    def cheapest(self, n=1, category=None) -> list:
+        per_shard = [[(shard, p) for p in shard.cheapest(n, category)] for shard in self.shards]
+        return list(heapq.merge(*per_shard, key=lambda pair: pair[1].price))[:n]
+
+    def top_by_value(self, n, category=None) -> list:
+        # Every site's top n holds the overall top n
+        candidates = [(shard, p) for shard in self.shards for p in shard.top_by_value(n, category)]
+        return heapq.nlargest(n, candidates, key=lambda pair: pair[1].get_total_value())
+
+    def low_stock_items(self) -> list:
+        """ (shard, product) pairs at or below their reorder level on any site, most short first. """
+        per_shard = [[(shard, p) for p in shard.low_stock_items()] for shard in self.shards]
+        return list(heapq.merge(*per_shard, key=lambda pair: pair[1].quantity - pair[1].reorder_level))
+
+    def reorder_suggestions(self, days=DEMAND_DAYS) -> list:
+        """ (shard, item, units to order) from each site's sales history, largest order first. """
+        found = [(shard, item, units) for shard in self.shards for item, units in shard.reorder_suggestions(days)]
+        return sorted(found, key=lambda row: row[2], reverse=True)
+
+    def merge_duplicates(self) -> dict:
+        return {shard.name: shard.merge_duplicates() for shard in self.shards}
+
+    def _fan_out(self, func, max_workers):
+        jobs = [(shard.name, self.path_of(shard)) for shard in self.shards]
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            return list(pool.map(func, *zip(*jobs)))
+
+    def sweep(self, max_workers=None) -> list:
+        """
+        Expiry, warranty and reservation sweeps on every shard, one worker process per shard.
+        Only shards with unsaved changes are written beforehand, and only shards the sweep changed are read back.
+        """
+        for shard in self.shards:
+            if shard.dirty:
+                shard.save_snapshot(self.path_of(shard))
+            # Worker processes open the cold stores themselves
+            shard.close_cold_store()
+        results = self._fan_out(sweep_shard, max_workers)
+        for shard, r in zip(self.shards, results):
+            path = self.path_of(shard)
+            shard.open_cold_store(cold_filename(path))
+            if r["changed"]:
+                shard.load_snapshot(path)
+        self._align_allocators()
+        # Workers have no log listener of their own; their summaries are logged here
+        for r in results:
+            log(logging.INFO, "sweep.shard", f"Swept {r['name']}", **r)
+        return results
+
+    def valuation_report(self) -> dict:
+        """ Totals per site and overall, read from each shard's running aggregates (paged-out stock included). """
+        shards = []
+        for shard in self.shards:
+            stats = shard.stats
+            shards.append({
+                "name": shard.name,
+                "total_cents": stats.total_cents,
+                "total_value": stats.total_cents / CENTS,
+                "total_units": stats.total_units,
+                "cents_by_category": dict(stats.cents_by_category),
+                "reserved_units": sum(r["quantity"] for r in shard.reserved_products),
+            })
+        # Summed in integer cents so the sites add up exactly; *_value are the same totals in units
+        by_category = {}
+        for report in shards:
+            for category, cents in report["cents_by_category"].items():
+                by_category[category] = by_category.get(category, 0) + cents
+        total_cents = sum(r["total_cents"] for r in shards)
+        return {
+            "shards": shards,
+            "total_cents": total_cents,
+            "total_value": total_cents / CENTS,
+            "total_units": sum(r["total_units"] for r in shards),
+            "cents_by_category": by_category,
+            "value_by_category": {category: cents / CENTS for category, cents in by_category.items()},
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintenance jobs over several warehouse snapshot files.")
+    parser.add_argument("command",
+                        choices=["sweep", "report", "dedupe", "prices", "cheapest", "top", "reorder", "demand",
+                                 "list", "pickup", "cancel", "customer"])
+    parser.add_argument("--site", action="append", required=True, help="warehouse name (repeat per site)")
+    parser.add_argument("--dir", default=".", help="directory holding the shard files")
+    parser.add_argument("--workers", type=int, default=None, help="sweep: number of worker processes")
+    parser.add_argument("--category", default=None, help="prices/cheapest/top/list: Food, Electronic or Clothing")
+    parser.add_argument("--min", type=float, default=None, help="prices: lowest unit price")
+    parser.add_argument("--max", type=float, default=None, help="prices: highest unit price")
+    parser.add_argument("--limit", type=int, default=20, help="cheapest/top: number of products")
+    parser.add_argument("--out", default=None, help="reorder: write the list to this CSV file")
+    parser.add_argument("--days", type=int, default=DEMAND_DAYS, help="reorder/demand: days of sales to go by")
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE, help="list: rows per page")
+    parser.add_argument("--after", default=None, help="list: token printed at the end of the previous page")
+    parser.add_argument("--reservations", action="store_true", help="list: reservations instead of stock")
+    parser.add_argument("--where", default=None,
+                        help="list: only stock matching a filter such as 'type=Food and qty<10'")
+    parser.add_argument("--id", default=None, help="pickup/cancel: reservation ID such as R1F")
+    parser.add_argument("--name", default=None, help="customer: name the reservations were made under")
+    args = parser.parse_args(argv)
+    if args.after and len(args.site) > 1:
+        parser.error("--after continues the listing of a single --site")
+    if args.command in ("pickup", "cancel") and not args.id:
+        parser.error(f"{args.command} needs --id")
+    if args.command == "customer" and not args.name:
+        parser.error("customer needs --name")
+    setup_logging(os.path.join(args.dir, LOG_FILE), console=False)
+
+    cluster = WarehouseCluster(args.site, args.dir)
+    cluster.load()
+    if args.command == "sweep":
+        for r in cluster.sweep(args.workers):
+            print(f"/=== {r['name']}: removed {r['expired']} expired, {r['out_of_warranty']} out of warranty, "
+                  f"{r['expired_reservations']} expired reservations; paged out {r['paged_out']} ===/")
+    elif args.command in ("prices", "cheapest", "top"):
+        if args.command == "prices":
+            found = cluster.price_range(args.min, args.max, args.category)
+        elif args.command == "cheapest":
+            found = cluster.cheapest(args.limit, args.category)
+        else:
+            found = cluster.top_by_value(args.limit, args.category)
+        if not found:
+            print("/=== No products found ===/")
+        for shard, p in found:
+            print(f"{shard.name:<16}{p.category:<12}{p.name:<24}{p.price:>10.2f}{p.quantity:>8}"
+                  f"{Money(p.total_cents()):>12.2f}  {format_bar_code(p.bar_code)}")
+    elif args.command == "reorder":
+        low = cluster.low_stock_items()
+        suggestions = cluster.reorder_suggestions(args.days)
+        if args.out:
+            orders = [(item, units) for _, item, units in suggestions]
+            count = export_reorder_list((p for _, p in low), args.out, orders)
+            print(f"/=== Exported {count} product(s) to reorder to '{args.out}' ===/")
+        elif not low and not suggestions:
+            print("/=== Nothing to reorder ===/")
+        else:
+            for shard, p in low:
+                print(f"{shard.name:<16}{p.category:<12}{p.name:<24}{p.quantity:>8} / {p.reorder_level:<8}"
+                      f"{format_bar_code(p.bar_code)}")
+            if suggestions:
+                print(f"/=== Suggested orders from the last {args.days} days of sales ===/")
+            for shard, item, units in suggestions:
+                print(f"{shard.name:<16}{item.category:<12}{item.name:<24}{item.quantity:>8} + {units:<8}"
+                      f"{format_bar_code(item.bar_code)}")
+    elif args.command == "demand":
+        for shard in cluster.shards:
+            units = shard.ledger.demand_by_category(args.days)
+            revenue = shard.ledger.revenue_by_category(args.days)
+            print(f"/=== {shard.name}: last {args.days} days ===/")
+            for category in sorted(units):
+                print(f"{category:<12}{units[category]:>8} units{Money(revenue[category]):>14.2f}")
+    elif args.command == "list" and args.where:
+        try:
+            query = Query(args.where)
+        except ValueError as e:
+            parser.error(str(e))
+        for shard in cluster.shards:
+            result = shard.query(query, args.category)
+            print(f"/=== {shard.name}: {len(result.products)} match(es); {result.plan.describe()} ===/")
+            with shard.view() as view:
+                shard.print_page(Page([view.record(p.bar_code) for p in result.products], None))
+    elif args.command == "list":
+        # One page per site; memory stays at one page whatever the catalog size
+        for shard in cluster.shards:
+            fetch = shard.page_reservations if args.reservations else shard.page_products
+            print(f"/=== {shard.name} ===/")
+            try:
+                token = shard.print_page(fetch(args.page_size, args.after, args.category), args.reservations)
+            except ValueError as e:
+                parser.error(str(e))
+            if token is not None:
+                print(f"/=== Next page: --site \"{shard.name}\" --after {token} ===/")
+    elif args.command in ("pickup", "cancel"):
+        try:
+            shard = cluster.shard_for_reservation(args.id)
+            reservation = shard.reservation(args.id)
+            if args.command == "pickup":
+                total = shard.pickup_reservation(args.id)
+            else:
+                expired = shard.cancel_reservation(args.id)
+        except (KeyError, ValueError) as e:
+            parser.error(e.args[0])
+        units = f"{reservation['quantity']} {reservation['product'].name}"
+        if args.command == "pickup":
+            print(f"/=== {shard.name}: {units} picked up. Total to pay: {total:.2f} ===/")
+        elif expired:
+            print(f"/=== {shard.name}: reservation cancelled; {expired} expired unit(s) of {units} written off ===/")
+        else:
+            print(f"/=== {shard.name}: reservation cancelled; {units} back in stock ===/")
+        cluster.save()
+    elif args.command == "customer":
+        found = cluster.reservations_of(args.name)
+        if not found:
+            print(f"/=== No open reservations for {args.name} ===/")
+        for shard, r in found:
+            print(f"{format_reservation_id(r['id']):<8}{shard.name:<16}{r['product'].name:<24}{r['quantity']:>8}  "
+                  f"{r['pickup_datetime']:%Y-%m-%d %H:%M}")
+    elif args.command == "dedupe":
+        for name, merged in cluster.merge_duplicates().items():
+            print(f"/=== {name}: merged {len(merged)} duplicate product(s) ===/")
+        cluster.save()
+    else:
+        report = cluster.valuation_report()
+        for r in report["shards"]:
+            print(f"/=== {r['name']}: {r['total_units']} units, value {Money(r['total_cents'])} ===/")
+        print(f"/=== All sites: {report['total_units']} units, value {Money(report['total_cents'])} ===/")
+    cluster.close()
+
+
+if __name__ == "__main__":
+    main()
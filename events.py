@@ -0,0 +1,109 @@
+from dataclasses import dataclass
+from typing import Any
+
+
+@dataclass(frozen=True)
+class ProductAdded:
+    product: Any
+
+
+@dataclass(frozen=True)
+class ProductRemoved:
+    product: Any
+
+
+@dataclass(frozen=True)
+class ProductPagedOut:
+    """ Moved to the cold store; still part of the inventory, just not resident. """
+    product: Any
+
+
+@dataclass(frozen=True)
+class ProductPagedIn:
+    product: Any
+
+
+@dataclass(frozen=True)
+class ProductChanged:
+    product: Any
+    field: str
+    before: Any
+    after: Any
+
+
+@dataclass(frozen=True)
+class LotsChanged:
+    """ (expiration date, units) pairs taken from or added to a food product's lots. """
+    product: Any
+    removed: tuple = ()
+    added: tuple = ()
+
+
+@dataclass(frozen=True)
+class ProductSold:
+    """ Units sold over the counter at unit_cents each; published after the stock was taken. """
+    product: Any
+    quantity: int
+    unit_cents: int
+    when: Any
+
+
+@dataclass(frozen=True)
+class ReservationAdded:
+    reservation: dict
+
+
+@dataclass(frozen=True)
+class ReservationRemoved:
+    reservation: dict
+
+
+@dataclass(frozen=True)
+class ReservationsReloaded:
+    """ The whole reservation list was replaced; consumers should rebuild. """
+    reservations: list
+
+
+@dataclass(frozen=True)
+class StockReloaded:
+    """ The whole product list was replaced (load, bulk assignment); consumers should rebuild. """
+    products: list
+
+
+class EventBus:
+    """
+    Synchronous publish/subscribe keyed on the event class.
+    Dispatch is one dict lookup, and publishers can skip building an event
+    nobody listens to by checking has_subscribers() first.
+    """
+
+    def __init__(self):
+        self._handlers = {}
+        self._catch_all = []
+
+    def subscribe(self, event_type, handler):
+        self._handlers.setdefault(event_type, []).append(handler)
+        return handler
+
+    def subscribe_all(self, handler):
+        self._catch_all.append(handler)
+        return handler
+
+    def unsubscribe(self, event_type, handler):
+        handlers = self._handlers.get(event_type, [])
+        if handler in handlers:
+            handlers.remove(handler)
+
+    def unsubscribe_all(self, handler):
+        if handler in self._catch_all:
+            self._catch_all.remove(handler)
+
+    def has_subscribers(self, event_type) -> bool:
+        return bool(self._catch_all or self._handlers.get(event_type))
+
+    def publish(self, event):
+        # Copy so a handler may unsubscribe itself while being called
+        for handler in tuple(self._handlers.get(type(event), ())):
+            handler(event)
+        for handler in tuple(self._catch_all):
+            handler(event)
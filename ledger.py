@@ -0,0 +1,176 @@
+import datetime
+import math
+import os
+import sys
+from array import array
+from bisect import bisect_right
+from itertools import compress, groupby
+from events import ProductSold
+from products import PRODUCT_KINDS, kind_of
+
+# Sales stored per chunk; only the last chunk grows, the others are never touched again
+CHUNK_ROWS = 1 << 16
+COLUMNS = ("timestamps", "bar_codes", "quantities", "unit_cents", "categories")
+DAY = 24 * 60 * 60
+# Demand is measured over this many days, and an order should cover the delivery lead
+# time plus the given number of days of sales
+DEMAND_DAYS = 28
+LEAD_DAYS = 7
+COVER_DAYS = 14
+CATEGORY_NAMES = {kind.type_code: kind.category for kind in PRODUCT_KINDS.values()}
+
+
+def ledger_filename(snapshot_file: str) -> str:
+    """ The sales ledger lives next to the snapshot it belongs to. """
+    base = snapshot_file[:-len(".pickle")] if snapshot_file.endswith(".pickle") else snapshot_file
+    return base + "_sales.bin"
+
+
+def reorder_quantity(units_sold: int, days: int, on_hand: int, lead_days=LEAD_DAYS, cover_days=COVER_DAYS) -> int:
+    """ Units to order so the stock lasts lead_days + cover_days at the rate units_sold / days. """
+    needed = math.ceil(units_sold * (lead_days + cover_days) / days)
+    return max(0, needed - on_hand)
+
+
+def _sum_by(keys: array, values: array) -> dict:
+    # Sort the row positions on key in C, then add each run of equal keys with one sum();
+    # Python only runs once per distinct key, never once per row
+    order = sorted(range(len(keys)), key=keys.__getitem__)
+    return {key: sum(map(values.__getitem__, run)) for key, run in groupby(order, keys.__getitem__)}
+
+
+class LedgerChunk:
+    """ Up to CHUNK_ROWS sales as parallel int64 columns. """
+    __slots__ = COLUMNS
+
+    def __init__(self):
+        for column in COLUMNS:
+            setattr(self, column, array("q"))
+
+    def __len__(self):
+        return len(self.timestamps)
+
+
+class SalesLedger:
+    """
+    Append-only record of every sale: timestamp (epoch seconds), bar code, units, unit price
+    in cents and product type, stored column-wise in array chunks of CHUNK_ROWS rows.
+    Rows are in time order, so a time window is found by bisecting the timestamps, and
+    demand over the window is summed column-wise instead of row by row.
+
+    With a file attached (open()), every sale is appended to it as it happens.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.path = None
+        self._file = None
+
+    def attach(self, bus):
+        bus.subscribe(ProductSold, self._on_sold)
+        return self
+
+    def __len__(self):
+        return sum(len(chunk) for chunk in self.chunks)
+
+    def _on_sold(self, event):
+        product = event.product
+        self.record(product.bar_code or 0, event.quantity, event.unit_cents, kind_of(product).type_code, event.when)
+
+    def record(self, bar_code: int, quantity: int, unit_cents: int, type_code: int, when=None):
+        timestamp = int((when or datetime.datetime.now()).timestamp())
+        if self.chunks and self.chunks[-1].timestamps:
+            # A clock stepping back must not break the time order the windows rely on
+            timestamp = max(timestamp, self.chunks[-1].timestamps[-1])
+        row = (timestamp, bar_code, quantity, unit_cents, type_code)
+        if not self.chunks or len(self.chunks[-1]) >= CHUNK_ROWS:
+            self.chunks.append(LedgerChunk())
+        chunk = self.chunks[-1]
+        for column, value in zip(COLUMNS, row):
+            getattr(chunk, column).append(value)
+        if self._file is not None:
+            self._write(array("q", row))
+
+    def _write(self, data: array):
+        if sys.byteorder != "little":
+            data.byteswap()
+        data.tofile(self._file)
+        self._file.flush()
+
+    def open(self, path: str):
+        """ Load the sales recorded in path and append every new sale to it. Call before recording any sale. """
+        if self.chunks:
+            raise ValueError("Open the ledger file before recording sales.")
+        self.close()
+        width = len(COLUMNS)
+        data = array("q")
+        if os.path.exists(path):
+            rows = os.path.getsize(path) // (data.itemsize * width)
+            with open(path, "r+b") as f:
+                data.fromfile(f, rows * width)
+                # A crash mid-append leaves a partial row; drop it
+                f.truncate(rows * width * data.itemsize)
+            if sys.byteorder != "little":
+                data.byteswap()
+        for start in range(0, len(data), CHUNK_ROWS * width):
+            part = data[start:start + CHUNK_ROWS * width]
+            chunk = LedgerChunk()
+            for offset, column in enumerate(COLUMNS):
+                setattr(chunk, column, part[offset::width])
+            self.chunks.append(chunk)
+        self.path = path
+        self._file = open(path, "ab")
+
+    def close(self):
+        """ Detach the file; the sales in it are dropped from memory and read back by the next open(). """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self.chunks = []
+            self.path = None
+
+    def window(self, days: int, now=None) -> LedgerChunk:
+        """ The sales of the last `days` days up to now, copied out of the chunks a slice at a time. """
+        until = int((now or datetime.datetime.now()).timestamp())
+        since = until - days * DAY
+        sales = LedgerChunk()
+        for chunk in self.chunks:
+            timestamps = chunk.timestamps
+            if not timestamps or timestamps[-1] <= since or timestamps[0] > until:
+                continue
+            start, stop = bisect_right(timestamps, since), bisect_right(timestamps, until)
+            for column in COLUMNS:
+                getattr(sales, column).extend(getattr(chunk, column)[start:stop])
+        return sales
+
+    def demand(self, days=DEMAND_DAYS, now=None) -> dict:
+        """ Units sold per bar code over the last `days` days. """
+        sales = self.window(days, now)
+        return _sum_by(sales.bar_codes, sales.quantities)
+
+    def demand_by_category(self, days=DEMAND_DAYS, now=None) -> dict:
+        """ Units sold per product type over the last `days` days. """
+        sales = self.window(days, now)
+        totals = _sum_by(sales.categories, sales.quantities)
+        return {CATEGORY_NAMES.get(code, "Product"): units for code, units in totals.items()}
+
+    def revenue_by_category(self, days=DEMAND_DAYS, now=None) -> dict:
+        """ Takings in cents per product type over the last `days` days. """
+        sales = self.window(days, now)
+        amounts = array("q", map(int.__mul__, sales.quantities, sales.unit_cents))
+        totals = _sum_by(sales.categories, amounts)
+        return {CATEGORY_NAMES.get(code, "Product"): cents for code, cents in totals.items()}
+
+    def daily_units(self, days=DEMAND_DAYS, now=None, bar_code=None) -> list:
+        """ Units sold on each of the last `days` days (oldest first), for one bar code or for everything. """
+        sales = self.window(days, now)
+        quantities = sales.quantities
+        if bar_code is not None:
+            mask = list(map(bar_code.__eq__, sales.bar_codes))
+            quantities = array("q", compress(quantities, mask))
+            timestamps = array("q", compress(sales.timestamps, mask))
+        else:
+            timestamps = sales.timestamps
+        until = int((now or datetime.datetime.now()).timestamp())
+        bounds = [bisect_right(timestamps, until - (days - day) * DAY) for day in range(days + 1)]
+        return [sum(quantities[start:stop]) for start, stop in zip(bounds, bounds[1:])]
@@ -0,0 +1,90 @@
+import csv
+from events import ProductAdded, ProductRemoved, ProductChanged, ProductPagedOut, ProductPagedIn, StockReloaded
+from price_index import SortedIndex
+from products import ClothingVariant
+
+REORDER_FILE = "reorder_list.csv"
+
+
+def is_low(product) -> bool:
+    """ At or below its reorder level; products without a level are never low. """
+    return product.reorder_level is not None and product.quantity <= product.reorder_level
+
+
+class LowStockIndex:
+    """
+    The products at or below their reorder level, most short first (sorted on quantity
+    minus reorder level). Attached to a warehouse event bus, every quantity or level change
+    costs O(log n), so listing the k low items costs O(k) however large the stock is.
+    """
+
+    def __init__(self):
+        self._index = SortedIndex()
+        # bar code -> key the product is filed under, for low products only
+        self._keys = {}
+
+    def attach(self, bus):
+        bus.subscribe(ProductAdded, lambda event: self.update(event.product))
+        bus.subscribe(ProductRemoved, lambda event: self.discard(event.product))
+        bus.subscribe(ProductPagedIn, lambda event: self.update(event.product))
+        bus.subscribe(ProductPagedOut, lambda event: self.discard(event.product))
+        bus.subscribe(ProductChanged, self._on_changed)
+        bus.subscribe(StockReloaded, self._on_reloaded)
+        return self
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, bar_code):
+        return bar_code in self._keys
+
+    def _on_reloaded(self, event):
+        self.__init__()
+        for product in event.products:
+            self.update(product)
+
+    def _on_changed(self, event):
+        if event.field not in ("quantity", "reorder_level"):
+            return
+        product = event.product
+        if isinstance(product, ClothingVariant):
+            product = product.style
+        self.update(product)
+
+    def update(self, product):
+        self.discard(product)
+        if is_low(product):
+            key = product.quantity - product.reorder_level
+            self._keys[product.bar_code] = key
+            self._index.add(key, product.bar_code)
+
+    def discard(self, product):
+        key = self._keys.pop(product.bar_code, None)
+        if key is not None:
+            self._index.discard(key, product.bar_code)
+
+    def codes(self, n=None) -> list:
+        """ Bar codes of the low products, most short first (all of them when n is None). """
+        return self._index.smallest(len(self._keys) if n is None else n)
+
+
+def export_reorder_list(products, path: str = REORDER_FILE, suggestions=()) -> int:
+    """
+    Write the products to reorder as CSV, with the units needed to get back to the reorder level
+    and the units to order: the larger of that shortfall and the demand-based suggestion, given as
+    (item, units) pairs from Warehouse.reorder_suggestions (a variant's units count for its style).
+    """
+    suggested = {}
+    for item, units in suggestions:
+        code = item.style.bar_code if isinstance(item, ClothingVariant) else item.bar_code
+        suggested[code] = suggested.get(code, 0) + units
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["bar_code", "type", "name", "quantity", "reorder_level", "shortfall", "order"])
+        count = 0
+        for product in products:
+            shortfall = product.reorder_level - product.quantity
+            writer.writerow([f"{product.bar_code:013d}", product.category, product.name, product.quantity,
+                             product.reorder_level, shortfall, max(shortfall, suggested.get(product.bar_code, 0))])
+            count += 1
+    return count
@@ -1,18 +1,35 @@
+import argparse
+import logging
+import os
 import sys
 import datetime
+import tracemalloc
+from collections import Counter
 from typing import List, Optional
 
-from PyQt6.QtCore import Qt, QDateTime
+from PyQt6.QtCore import Qt, QDateTime, QTimer
 from PyQt6.QtGui import QFont
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel,
     QLineEdit, QPushButton, QTableWidget, QTableWidgetItem, QMessageBox,
     QDialog, QFormLayout, QComboBox, QSpinBox, QDoubleSpinBox, QTextEdit,
-    QDateEdit, QDateTimeEdit, QCheckBox
+    QDateEdit, QDateTimeEdit, QCheckBox, QListWidget, QListWidgetItem, QFileDialog
 )
 
-from warehouse import Warehouse
-from products import FoodProduct, ElectronicProduct, ClothingProduct, Product
+from audit_log import LOG_FILE, log, setup_logging
+from autosave import AUTOSAVE_POLL_INTERVAL, Autosaver
+from barcodes import format_bar_code
+from cluster import WarehouseCluster
+from ledger import ledger_filename
+from low_stock import REORDER_FILE, export_reorder_list
+from memory_report import MemoryReport
+from money import Money
+from query import Query, looks_like_query
+from shared_snapshot import SnapshotPublisher
+from tiering import IDLE_DAYS, cold_filename
+from warehouse import SNAPSHOT_FILE, Warehouse, format_reservation_id
+from products import (FoodProduct, ElectronicProduct, ClothingProduct, ClothingStyle, ClothingVariant, Product,
+                      date_header, kind_of)
 
 def is_manager_hours(now: Optional[datetime.datetime] = None) -> bool:
     """ Manager operations only between 11PM and AM. """
@@ -32,32 +49,19 @@ def show_info(parent, text: str):
     QMessageBox.information(parent, "Info", text)
 
 
-def product_type_name(p: Product) -> str:
-    if isinstance(p, FoodProduct):
-        return "Food"
-    if isinstance(p, ElectronicProduct):
-        return "Electronic"
-    if isinstance(p, ClothingProduct):
-        return "Clothing"
-    return "Product"
+def exp_warranty_str(record) -> str:
+    if record.expires is None:
+        return "-"
+    if getattr(record, "lots", 0) > 1:
+        return f"{record.expires} (+{record.lots - 1} lots)"
+    return str(record.expires)
 
 
-def product_exp_warranty_str(p: Product) -> str:
-    if isinstance(p, FoodProduct):
-        return str(p.expiration_date)
-    if isinstance(p, ElectronicProduct):
-        return str(p.warranty_date)
-    return "-"
-
-
-def is_product_valid_for_sale_or_reservation(p: Product, now: Optional[datetime.datetime] = None) -> bool:
+def sale_block_reason(p: Product, now: Optional[datetime.datetime] = None) -> Optional[str]:
+    """ Why p cannot be sold or reserved right now, or None when it can. """
     if now is None:
         now = datetime.datetime.now()
-    if isinstance(p, FoodProduct):
-        return p.expiration_date > now.date()
-    if isinstance(p, ElectronicProduct):
-        return p.warranty_date >= now.date()
-    return True
+    return kind_of(p).sale_block(p, now.date())
 
 class AddProductDialog(QDialog):
     def __init__(self, parent, warehouse: Warehouse):
@@ -72,7 +76,7 @@ class AddProductDialog(QDialog):
         form = QFormLayout(self)
 
         self.type_cb = QComboBox()
-        self.type_cb.addItems(["Food", "Electronic", "Clothing"])
+        self.type_cb.addItems(["Food", "Electronic", "Clothing", "Clothing line"])
         form.addRow("Type:", self.type_cb)
 
         self.name_le = QLineEdit()
@@ -107,9 +111,15 @@ class AddProductDialog(QDialog):
         self.clo_row1 = ("Size:", self.size_le)
         self.clo_row2 = ("Color:", self.color_le)
         self.clo_row3 = ("Material (optional):", self.material_le)
+        self.line_row1 = ("Sizes (comma separated):", self.size_le)
+        self.line_row2 = ("Colors (comma separated):", self.color_le)
 
         form.addRow(*self.food_row)
 
+        # Unchecked, an identical product already in stock only gets the quantity added
+        self.separate_cb = QCheckBox("Keep as a separate product")
+        form.addRow(self.separate_cb)
+
         btns = QHBoxLayout()
         self.ok_btn = QPushButton("Add")
         self.cancel_btn = QPushButton("Cancel")
@@ -150,6 +160,10 @@ class AddProductDialog(QDialog):
             form.insertRow(5, *self.food_row)
         elif t == "Electronic":
             form.insertRow(5, *self.elec_row)
+        elif t == "Clothing line":
+            form.insertRow(5, *self.line_row1)
+            form.insertRow(6, *self.line_row2)
+            form.insertRow(7, *self.clo_row3)
         else:
             form.insertRow(5, *self.clo_row1)
             form.insertRow(6, *self.clo_row2)
@@ -165,7 +179,7 @@ class AddProductDialog(QDialog):
         if not name:
             show_error(self, "Name cannot be empty.")
             return
-        if price <= 0:
+        if Money.of(price) <= 0:
             show_error(self, "Price must be positive.")
             return
         if qty < 0:
@@ -179,6 +193,13 @@ class AddProductDialog(QDialog):
             elif t == "Electronic":
                 war = self.warranty_date.date().toPyDate()
                 p = ElectronicProduct(name, price, qty, desc, war)
+            elif t == "Clothing line":
+                sizes = [s for s in self.size_le.text().split(",") if s.strip()]
+                colors = [c for c in self.color_le.text().split(",") if c.strip()]
+                material = self.material_le.text().strip() or None
+                # Quantity is the opening stock of every size/color combination
+                stock = {(s.strip(), c.strip()): qty for s in sizes for c in colors}
+                p = ClothingStyle(name, price, desc, sizes, colors, material, stock)
             else:
                 size = self.size_le.text().strip()
                 color = self.color_le.text().strip()
@@ -194,8 +215,12 @@ class AddProductDialog(QDialog):
             show_error(self, f"Validation error: {e}")
             return
 
-        self.warehouse.products.append(p)
-        show_info(self, f"Product '{name}' added successfully!")
+        stocked = self.warehouse.insert_product(p, merge=not self.separate_cb.isChecked())
+        if stocked is p:
+            show_info(self, f"Product '{name}' added successfully!")
+        else:
+            show_info(self, f"Merged into the identical product {format_bar_code(stocked.bar_code)}: "
+                            f"{stocked.quantity} in stock now.")
         self.accept()
 
 
@@ -222,6 +247,18 @@ class UpdateProductDialog(QDialog):
         self.add_qty_le.setPlaceholderText("Leave empty to keep current")
         form.addRow("Quantity to add:", self.add_qty_le)
 
+        self.new_lot_cb = QCheckBox("Added food stock is a new lot expiring on:")
+        self.new_lot_date = QDateEdit()
+        self.new_lot_date.setCalendarPopup(True)
+        self.new_lot_date.setDate(datetime.date.today())
+        self.new_lot_date.setEnabled(False)
+        self.new_lot_cb.toggled.connect(self.new_lot_date.setEnabled)
+        form.addRow(self.new_lot_cb, self.new_lot_date)
+
+        self.reorder_le = QLineEdit()
+        self.reorder_le.setPlaceholderText("Leave empty to keep current, '-' to stop tracking")
+        form.addRow("Reorder level:", self.reorder_le)
+
         btns = QHBoxLayout()
         self.ok_btn = QPushButton("Update")
         self.cancel_btn = QPushButton("Cancel")
@@ -241,10 +278,7 @@ class UpdateProductDialog(QDialog):
         close_btn.clicked.connect(self.reject)
 
     def _find_by_barcode(self, code: str) -> Optional[Product]:
-        for p in self.warehouse.products:
-            if p.bar_code == code:
-                return p
-        return None
+        return self.warehouse.find_by_bar_code(code)
 
     def _on_submit(self):
         code = self.barcode_le.text().strip()
@@ -261,12 +295,10 @@ class UpdateProductDialog(QDialog):
         if new_price_str:
             try:
                 new_price = float(new_price_str)
-                if new_price <= 0:
+                if Money.of(new_price) <= 0:
                     show_error(self, "Price must be positive.")
                     return
-                p.price = new_price
-                if hasattr(p, "base_price"):
-                    p.base_price = new_price
+                self.warehouse.set_price(p, new_price)
             except ValueError:
                 show_error(self, "Invalid price. Enter a valid number.")
                 return
@@ -275,13 +307,28 @@ class UpdateProductDialog(QDialog):
         if add_qty_str:
             try:
                 add_qty = int(add_qty_str)
-                if add_qty < 0:
-                    show_error(self, "Quantity to add cannot be negative.")
-                    return
-                p.quantity += add_qty
             except ValueError:
                 show_error(self, "Invalid quantity. Enter a valid integer.")
                 return
+            if add_qty < 0:
+                show_error(self, "Quantity to add cannot be negative.")
+                return
+            expiration_date = None
+            if isinstance(p, FoodProduct) and self.new_lot_cb.isChecked():
+                expiration_date = self.new_lot_date.date().toPyDate()
+            try:
+                self.warehouse.add_stock(p, add_qty, expiration_date)
+            except ValueError as e:
+                show_error(self, str(e))
+                return
+
+        level_str = self.reorder_le.text().strip()
+        if level_str:
+            try:
+                self.warehouse.set_reorder_level(p, None if level_str == "-" else int(level_str))
+            except ValueError as e:
+                show_error(self, f"Invalid reorder level: {e}")
+                return
 
         show_info(self, f"Product '{p.name}' updated successfully.")
         self.accept()
@@ -297,11 +344,7 @@ class RemoveExpiredDialog(QDialog):
             self._blocked_ui("Removing expired products is allowed only between 23:00 and 06:00.")
             return
 
-        removed_any = False
-        for product in self.warehouse.products[:]:
-            if isinstance(product, FoodProduct) and product.is_expired():
-                self.warehouse.products.remove(product)
-                removed_any = True
+        removed_any = bool(self.warehouse.remove_expired())
 
         layout = QVBoxLayout(self)
         if removed_any:
@@ -331,12 +374,7 @@ class RemoveOutOfWarrantyDialog(QDialog):
             self._blocked_ui("Removing out-of-warranty products is allowed only between 23:00 and 06:00.")
             return
 
-        removed_any = False
-        today = datetime.date.today()
-        for product in self.warehouse.products[:]:
-            if isinstance(product, ElectronicProduct) and not product.is_under_warranty():
-                self.warehouse.products.remove(product)
-                removed_any = True
+        removed_any = bool(self.warehouse.remove_out_of_warranty())
 
         layout = QVBoxLayout(self)
         if removed_any:
@@ -368,6 +406,7 @@ class DeleteProductDialog(QDialog):
 
         form = QFormLayout(self)
         self.barcode_le = QLineEdit()
+        self.barcode_le.setPlaceholderText("Bar code, or a filter such as type=Food and qty<10")
         form.addRow("Bar Code:", self.barcode_le)
 
         self.ok_btn = QPushButton("Delete")
@@ -389,10 +428,7 @@ class DeleteProductDialog(QDialog):
         close_btn.clicked.connect(self.reject)
 
     def _find_by_barcode(self, code: str) -> Optional[Product]:
-        for p in self.warehouse.products:
-            if p.bar_code == code:
-                return p
-        return None
+        return self.warehouse.find_by_bar_code(code)
 
     def _on_submit(self):
         code = self.barcode_le.text().strip()
@@ -400,13 +436,20 @@ class DeleteProductDialog(QDialog):
             show_error(self, "Please enter a bar code.")
             return
 
+        if looks_like_query(code):
+            self._delete_matching(code)
+            return
+
         p = self._find_by_barcode(code)
         if p is None:
             show_error(self, "No product found with that bar code.")
             return
 
-        reserved_count = sum(r["quantity"] for r in self.warehouse.reserved_products
-                             if r["product"].bar_code == code)
+        if isinstance(p, ClothingVariant):
+            show_error(self, "This bar code is one size/color variant. Delete the whole style by its own bar code.")
+            return
+
+        reserved_count = self.warehouse.reserved_quantity(p.bar_code)
         if reserved_count > 0:
             QMessageBox.warning(
                 self,
@@ -414,10 +457,26 @@ class DeleteProductDialog(QDialog):
                 f"There are {reserved_count} reserved unit(s) of this product. Only warehouse stock will be deleted."
             )
 
-        self.warehouse.products.remove(p)
+        self.warehouse.remove_product(p)
         show_info(self, f"Product '{p.name}' deleted from warehouse stock.")
         self.accept()
 
+    def _delete_matching(self, text: str):
+        try:
+            matches = self.warehouse.query(text).products
+        except ValueError as e:
+            show_error(self, f"Invalid filter: {e}")
+            return
+        if not matches:
+            show_error(self, "No product matches this filter.")
+            return
+        answer = QMessageBox.question(self, "Confirm", f"Delete {len(matches)} product(s) matching '{text}'?")
+        if answer != QMessageBox.StandardButton.Yes:
+            return
+        removed = self.warehouse.remove_where(text)
+        show_info(self, f"{len(removed)} product(s) deleted from warehouse stock.")
+        self.accept()
+
 
 class AddDiscountDialog(QDialog):
     def __init__(self, parent, warehouse: Warehouse):
@@ -431,6 +490,7 @@ class AddDiscountDialog(QDialog):
 
         form = QFormLayout(self)
         self.barcode_le = QLineEdit()
+        self.barcode_le.setPlaceholderText("Bar code, or a filter such as type=Food and expires<2026-11-01")
         form.addRow("Bar Code:", self.barcode_le)
 
         self.percent_sb = QSpinBox()
@@ -456,10 +516,7 @@ class AddDiscountDialog(QDialog):
         close_btn.clicked.connect(self.reject)
 
     def _find_by_barcode(self, code: str) -> Optional[Product]:
-        for p in self.warehouse.products:
-            if p.bar_code == code:
-                return p
-        return None
+        return self.warehouse.find_by_bar_code(code)
 
     def _on_submit(self):
         code = self.barcode_le.text().strip()
@@ -467,16 +524,33 @@ class AddDiscountDialog(QDialog):
             show_error(self, "Please enter a bar code.")
             return
 
+        percent = int(self.percent_sb.value())
+        if looks_like_query(code):
+            try:
+                matches = self.warehouse.query(code).products
+            except ValueError as e:
+                show_error(self, f"Invalid filter: {e}")
+                return
+            if not matches:
+                show_error(self, "No product matches this filter.")
+                return
+            answer = QMessageBox.question(
+                self, "Confirm", f"Apply a {percent}% discount to {len(matches)} product(s) matching '{code}'?")
+            if answer != QMessageBox.StandardButton.Yes:
+                return
+            discounted = self.warehouse.discount_where(code, percent)
+            show_info(self, f"Discount of {percent}% applied to {len(discounted)} product(s).")
+            self.accept()
+            return
+
         p = self._find_by_barcode(code)
         if p is None:
             show_error(self, "No product found with that bar code.")
             return
 
-        percent = int(self.percent_sb.value())
         try:
             old_price = p.price
-            base = getattr(p, "base_price", p.price)
-            p.price = base * (1 - percent / 100)
+            self.warehouse.apply_discount(p, percent)
             show_info(self, f"Discount applied. Old price: {old_price:.2f}, New price: {p.price:.2f}")
             self.accept()
         except Exception as e:
@@ -492,8 +566,10 @@ class ReserveProductDialog(QDialog):
         form = QFormLayout(self)
 
         self.name_cb = QComboBox()
-        names = sorted({p.name for p in self.warehouse.products if p.quantity > 0})
+        names = sorted({p.name for p in self.warehouse.sellable_items() if p.quantity > 0})
         self.name_cb.addItems(names)
+        # Products paged out by menu option 12 are not listed but can still be typed in
+        self.name_cb.setEditable(True)
         form.addRow("Product name:", self.name_cb)
 
         self.qty_sb = QSpinBox()
@@ -505,6 +581,10 @@ class ReserveProductDialog(QDialog):
         self.dt_res.setDateTime(QDateTime.currentDateTime().addSecs(3600))
         form.addRow("Pickup date/time:", self.dt_res)
 
+        self.customer_le = QLineEdit()
+        self.customer_le.setPlaceholderText("Optional; lets staff find the reservation by name")
+        form.addRow("Customer:", self.customer_le)
+
         h = QHBoxLayout()
         self.ok_btn = QPushButton("Reserve")
         self.cancel_btn = QPushButton("Cancel")
@@ -516,16 +596,10 @@ class ReserveProductDialog(QDialog):
         self.cancel_btn.clicked.connect(self.reject)
 
     def _find_by_name(self, name: str) -> Optional[Product]:
-        for p in self.warehouse.products:
-            if p.name == name:
-                return p
-        return None
+        return self.warehouse.find_by_name(name)
 
     def _cleanup_expired_reservations(self):
-        now = datetime.datetime.now()
-        for r in self.warehouse.reserved_products[:]:
-            if r["pickup_datetime"] <= now:
-                self.warehouse.reserved_products.remove(r)
+        self.warehouse.expire_reservations()
 
     def _on_submit(self):
         self._cleanup_expired_reservations()
@@ -536,15 +610,9 @@ class ReserveProductDialog(QDialog):
             show_error(self, "No product found with this name.")
             return
 
-        if not is_product_valid_for_sale_or_reservation(p):
-            msg = "Cannot reserve this product: "
-            if isinstance(p, FoodProduct):
-                msg += "expired."
-            elif isinstance(p, ElectronicProduct):
-                msg += "out of warranty."
-            else:
-                msg += "invalid state."
-            show_error(self, msg)
+        reason = sale_block_reason(p)
+        if reason:
+            show_error(self, f"Cannot reserve this product: {reason}.")
             return
 
         qty = int(self.qty_sb.value())
@@ -560,17 +628,119 @@ class ReserveProductDialog(QDialog):
             show_error(self, "Cannot reserve for a past date/time.")
             return
 
-        p.quantity -= qty
-        reservation = {
-            "product": p,
-            "quantity": qty,
-            "pickup_datetime": dt
-        }
-        self.warehouse.reserved_products.append(reservation)
-        show_info(self, f"Reserved {qty} '{p.name}' for {dt.strftime('%Y-%m-%d %H:%M')}.")
+        try:
+            reservation = self.warehouse.add_reservation(p, qty, dt, self.customer_le.text().strip() or None)
+        except ValueError as e:
+            show_error(self, str(e))
+            return
+        show_info(self, f"Reserved {qty} '{p.name}' for {dt.strftime('%Y-%m-%d %H:%M')}. "
+                        f"Reservation ID: {format_reservation_id(reservation['id'])}")
         self.accept()
 
 
+class PickupReservationDialog(QDialog):
+    """ Find a reservation by its ID or the customer's name, then hand it over or cancel it. """
+
+    def __init__(self, parent, warehouse: Warehouse):
+        super().__init__(parent)
+        self.setWindowTitle("Pick up or cancel a reservation")
+        self.warehouse = warehouse
+        self.changed = False
+
+        layout = QVBoxLayout(self)
+        find_row = QHBoxLayout()
+        self.ref_le = QLineEdit()
+        self.ref_le.setPlaceholderText("Reservation ID (e.g. R1F) or customer name")
+        self.find_btn = QPushButton("Find")
+        find_row.addWidget(self.ref_le, 1)
+        find_row.addWidget(self.find_btn)
+        layout.addLayout(find_row)
+
+        self.matches = QListWidget()
+        layout.addWidget(self.matches, 1)
+
+        h = QHBoxLayout()
+        self.pickup_btn = QPushButton("Pick up")
+        self.cancel_res_btn = QPushButton("Cancel reservation")
+        self.close_btn = QPushButton("Close")
+        h.addWidget(self.pickup_btn)
+        h.addWidget(self.cancel_res_btn)
+        h.addWidget(self.close_btn)
+        layout.addLayout(h)
+
+        self.ref_le.returnPressed.connect(self._on_find)
+        self.find_btn.clicked.connect(self._on_find)
+        self.pickup_btn.clicked.connect(self._on_pickup)
+        self.cancel_res_btn.clicked.connect(self._on_cancel)
+        self.close_btn.clicked.connect(self._on_close)
+
+    def _on_find(self):
+        text = self.ref_le.text().strip()
+        if not text:
+            show_error(self, "Please enter a reservation ID or a customer name.")
+            return
+        try:
+            found = self.warehouse.reservation(text)
+            found = [found] if found is not None else []
+        except ValueError:
+            found = self.warehouse.reservations_of(text)
+        self.matches.clear()
+        for r in found:
+            customer = f", {r['customer']}" if r.get("customer") else ""
+            item = QListWidgetItem(f"{format_reservation_id(r['id'])}: {r['quantity']} x {r['product'].name}, "
+                                   f"pickup {r['pickup_datetime']:%Y-%m-%d %H:%M}{customer}")
+            item.setData(Qt.ItemDataRole.UserRole, r["id"])
+            self.matches.addItem(item)
+        if found:
+            self.matches.setCurrentRow(0)
+        else:
+            show_error(self, f"No open reservation found for '{text}'.")
+
+    def _selected_id(self):
+        item = self.matches.currentItem()
+        if item is None:
+            show_error(self, "Find and select a reservation first.")
+            return None
+        return item.data(Qt.ItemDataRole.UserRole)
+
+    def _on_pickup(self):
+        reservation_id = self._selected_id()
+        if reservation_id is None:
+            return
+        try:
+            total = self.warehouse.pickup_reservation(reservation_id)
+        except KeyError as e:
+            show_error(self, e.args[0])
+            return
+        self.changed = True
+        self.matches.takeItem(self.matches.currentRow())
+        show_info(self, f"Reservation {format_reservation_id(reservation_id)} picked up. Total to pay: {total:.2f}")
+
+    def _on_cancel(self):
+        reservation_id = self._selected_id()
+        if reservation_id is None:
+            return
+        try:
+            expired = self.warehouse.cancel_reservation(reservation_id)
+        except (KeyError, ValueError) as e:
+            show_error(self, e.args[0])
+            return
+        self.changed = True
+        self.matches.takeItem(self.matches.currentRow())
+        if expired:
+            show_info(self, f"Reservation {format_reservation_id(reservation_id)} cancelled; "
+                            f"{expired} expired unit(s) were written off, the rest are back in stock.")
+        else:
+            show_info(self, f"Reservation {format_reservation_id(reservation_id)} cancelled; "
+                            "the units are back in stock.")
+
+    def _on_close(self):
+        if self.changed:
+            self.accept()
+        else:
+            self.reject()
+
+
 class BuyProductDialog(QDialog):
     def __init__(self, parent, warehouse: Warehouse):
         super().__init__(parent)
@@ -580,8 +750,10 @@ class BuyProductDialog(QDialog):
         form = QFormLayout(self)
 
         self.name_cb = QComboBox()
-        names = sorted({p.name for p in self.warehouse.products if p.quantity > 0})
+        names = sorted({p.name for p in self.warehouse.sellable_items() if p.quantity > 0})
         self.name_cb.addItems(names)
+        # Products paged out by menu option 12 are not listed but can still be typed in
+        self.name_cb.setEditable(True)
         form.addRow("Product name:", self.name_cb)
 
         self.qty_sb = QSpinBox()
@@ -599,10 +771,7 @@ class BuyProductDialog(QDialog):
         self.cancel_btn.clicked.connect(self.reject)
 
     def _find_by_name(self, name: str) -> Optional[Product]:
-        for p in self.warehouse.products:
-            if p.name == name:
-                return p
-        return None
+        return self.warehouse.find_by_name(name)
 
     def _on_submit(self):
         name = self.name_cb.currentText().strip()
@@ -611,15 +780,9 @@ class BuyProductDialog(QDialog):
             show_error(self, "No product found with this name.")
             return
 
-        if not is_product_valid_for_sale_or_reservation(p):
-            msg = "Cannot buy this product: "
-            if isinstance(p, FoodProduct):
-                msg += "expired."
-            elif isinstance(p, ElectronicProduct):
-                msg += "out of warranty."
-            else:
-                msg += "invalid state."
-            show_error(self, msg)
+        reason = sale_block_reason(p)
+        if reason:
+            show_error(self, f"Cannot buy this product: {reason}.")
             return
 
         qty = int(self.qty_sb.value())
@@ -630,11 +793,97 @@ class BuyProductDialog(QDialog):
             show_error(self, f"Not enough in stock. Available: {p.quantity}")
             return
 
-        total = qty * p.price
-        p.quantity -= qty
+        try:
+            total = self.warehouse.sell(p, qty)
+        except ValueError as e:
+            show_error(self, str(e))
+            return
         show_info(self, f"Bought {qty} '{p.name}'. Total to pay: {total:.2f}")
         self.accept()
 
+class MemoryReportDialog(QDialog):
+    def __init__(self, parent, text: str):
+        super().__init__(parent)
+        self.setWindowTitle("Memory report")
+        self.resize(800, 600)
+        layout = QVBoxLayout(self)
+        view = QTextEdit()
+        view.setReadOnly(True)
+        view.setFont(QFont("Courier New", 10))
+        view.setPlainText(text)
+        layout.addWidget(view)
+        close_btn = QPushButton("Close")
+        close_btn.clicked.connect(self.accept)
+        layout.addWidget(close_btn)
+
+
+class ScanModeDialog(QDialog):
+    """
+    Receiving goods with a keyboard-wedge scanner: each scan arrives as a line of digits
+    followed by Enter. Scans are counted per bar code and applied in one batch once the
+    stream pauses (or after MAX_WAIT_MS of continuous scanning).
+    """
+    DEBOUNCE_MS = 400
+    MAX_WAIT_MS = 2000
+
+    def __init__(self, parent, warehouse: Warehouse):
+        super().__init__(parent)
+        self.setWindowTitle("Scanner mode")
+        self.setModal(False)
+        self.warehouse = warehouse
+        self.pending = Counter()
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(QLabel("Scan bar codes; each scan adds one unit."))
+        self.scan_le = QLineEdit()
+        self.scan_le.returnPressed.connect(self._on_scan)
+        layout.addWidget(self.scan_le)
+        self.status = QLabel("Waiting for scans...")
+        layout.addWidget(self.status)
+        self.log = QTextEdit()
+        self.log.setReadOnly(True)
+        layout.addWidget(self.log)
+        close_btn = QPushButton("Close")
+        close_btn.clicked.connect(self.accept)
+        layout.addWidget(close_btn)
+
+        self.debounce = QTimer(self)
+        self.debounce.setSingleShot(True)
+        self.debounce.timeout.connect(self.flush)
+        self.max_wait = QTimer(self)
+        self.max_wait.setSingleShot(True)
+        self.max_wait.timeout.connect(self.flush)
+
+    def _on_scan(self):
+        code = self.scan_le.text().strip()
+        self.scan_le.clear()
+        if not code:
+            return
+        self.pending[code] += 1
+        self.status.setText(f"{sum(self.pending.values())} scan(s) pending")
+        self.debounce.start(self.DEBOUNCE_MS)
+        if not self.max_wait.isActive():
+            self.max_wait.start(self.MAX_WAIT_MS)
+
+    def flush(self):
+        self.debounce.stop()
+        self.max_wait.stop()
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, Counter()
+        received, unknown = self.warehouse.receive_scans(batch)
+        for product, units in received:
+            self.log.append(f"+{units}  {product.name}")
+        for code in unknown:
+            self.log.append(f"Unknown bar code: {code} (x{batch[code]})")
+        self.status.setText(f"Applied {sum(u for _, u in received)} unit(s)")
+        self.parent().refresh_rows([product for product, _ in received])
+
+    def done(self, result):
+        self.flush()
+        super().done(result)
+
+
 MENU_TEXT = (
     "/=== MENU ===/\n"
     "1. Add a new product\n"
@@ -646,23 +895,44 @@ MENU_TEXT = (
     "7. Reserve a product now, buy it later\n"
     "8. Buy a product\n"
     "9. Exit program\n"
+    "10. Check inventory totals\n"
+    "11. Scanner mode (receive goods)\n"
+    "12. Page out sold-out and idle products\n"
+    "13. Merge duplicate products\n"
+    "14. Memory report\n"
+    "15. Pick up or cancel a reservation\n"
 )
+LAST_MENU_OPTION = 15
+SNAPSHOT_INTERVAL_MS = 30_000
+# Rows fetched per page, and how close to the bottom (in scroll steps) the next page is fetched
+TABLE_PAGE_SIZE = 200
+SCROLL_FETCH_MARGIN = 5
 
 class MainWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, cluster: Optional[WarehouseCluster] = None):
         super().__init__()
         self.setWindowTitle("Warehouse GUI")
         self.resize(1100, 700)
 
-        self.warehouse = Warehouse("Main Warehouse")
-        try:
-            self.warehouse.load_products()
-        except Exception:
-            pass
-        try:
-            self.warehouse.load_reservation()
-        except Exception:
-            pass
+        self.cluster = cluster
+        if cluster is None:
+            self.warehouse = Warehouse("Main Warehouse")
+            # Sites whose snapshot could not be read; they are never autosaved over
+            self.unreadable = []
+            try:
+                self.warehouse.open_cold_store(cold_filename(SNAPSHOT_FILE))
+                self.warehouse.open_ledger(ledger_filename(SNAPSHOT_FILE))
+                if not self.warehouse.load_snapshot():
+                    self.unreadable.append(self.warehouse)
+                # Start without the sold-out products; idle products that still have stock stay
+                # resident so they remain in the table and in the Buy/Reserve name lists
+                self.warehouse.page_out()
+            except Exception as e:
+                log(logging.ERROR, "store.load_snapshot", f"Error loading warehouse: {e}", file=SNAPSHOT_FILE)
+                self.unreadable.append(self.warehouse)
+        else:
+            self.warehouse = cluster.shards[0]
+            self.unreadable = list(cluster.unreadable)
 
         central = QWidget()
         self.setCentralWidget(central)
@@ -684,7 +954,7 @@ class MainWindow(QMainWindow):
 
         input_row = QHBoxLayout()
         self.cmd_input = QLineEdit()
-        self.cmd_input.setPlaceholderText("Enter a number 1-9")
+        self.cmd_input.setPlaceholderText(f"Enter a number 1-{LAST_MENU_OPTION}")
         self.submit_btn = QPushButton("Submit")
         self.submit_btn.clicked.connect(self.handle_command)
         input_row.addWidget(self.cmd_input)
@@ -694,6 +964,15 @@ class MainWindow(QMainWindow):
         right = QVBoxLayout()
         top.addLayout(right, 1)
 
+        if self.cluster is not None:
+            site_row = QHBoxLayout()
+            self.site_cb = QComboBox()
+            self.site_cb.addItems(self.cluster.names)
+            self.site_cb.currentTextChanged.connect(self.switch_site)
+            site_row.addWidget(QLabel("Site:"))
+            site_row.addWidget(self.site_cb, 1)
+            right.addLayout(site_row)
+
         cat_row = QHBoxLayout()
         self.btn_food = QPushButton("Food Products")
         self.btn_elec = QPushButton("Electronic Products")
@@ -703,66 +982,337 @@ class MainWindow(QMainWindow):
         cat_row.addWidget(self.btn_elec)
         cat_row.addWidget(self.btn_clo)
         cat_row.addWidget(self.btn_all)
+        self.expand_cb = QCheckBox("Show clothing variants")
+        self.expand_cb.toggled.connect(lambda _: self.populate_table(self.current_filter))
+        cat_row.addWidget(self.expand_cb)
         right.addLayout(cat_row)
 
+        # Served from the warehouse's sorted price/value indexes, not by scanning the rows
+        price_row = QHBoxLayout()
+        self.price_min = QDoubleSpinBox()
+        self.price_max = QDoubleSpinBox()
+        for box in (self.price_min, self.price_max):
+            box.setRange(0.0, 1_000_000_000.0)
+            box.setDecimals(2)
+            box.setSpecialValueText("any")
+        self.top_n = QSpinBox()
+        self.top_n.setRange(0, 100_000)
+        self.top_n.setSpecialValueText("off")
+        self.price_filter_btn = QPushButton("Filter")
+        self.price_clear_btn = QPushButton("Clear")
+        self.price_filter_btn.clicked.connect(self.apply_price_filter)
+        self.price_clear_btn.clicked.connect(self.clear_price_filter)
+        price_row.addWidget(QLabel("Price from"))
+        price_row.addWidget(self.price_min)
+        price_row.addWidget(QLabel("to"))
+        price_row.addWidget(self.price_max)
+        price_row.addWidget(QLabel("Top by value"))
+        price_row.addWidget(self.top_n)
+        price_row.addWidget(self.price_filter_btn)
+        price_row.addWidget(self.price_clear_btn)
+        right.addLayout(price_row)
+
+        query_row = QHBoxLayout()
+        self.query_le = QLineEdit()
+        self.query_le.setPlaceholderText("Filter, e.g. type=Food and expires<2026-11-01 and qty<10")
+        self.query_le.returnPressed.connect(self.apply_query)
+        self.query_btn = QPushButton("Apply filter")
+        self.query_btn.clicked.connect(self.apply_query)
+        query_row.addWidget(self.query_le, 1)
+        query_row.addWidget(self.query_btn)
+        right.addLayout(query_row)
+        self.price_filter = None
+
+        self.current_filter = None
+        self.scan_dialog = None
+        self.last_memory_report = None
+
         self.btn_food.clicked.connect(lambda: self.populate_table("Food"))
         self.btn_elec.clicked.connect(lambda: self.populate_table("Electronic"))
         self.btn_clo.clicked.connect(lambda: self.populate_table("Clothing"))
         self.btn_all.clicked.connect(lambda: self.populate_table(None))
 
         self.table = QTableWidget()
-        self.table.setColumnCount(9)
+        self.table.setColumnCount(10)
         self.table.setHorizontalHeaderLabels([
             "Type", "Name", "Price", "Quantity", "Description", "Bar Code",
-            "Exp/Warranty", "Reservation Date/Time", "Reserved"
+            date_header(), "Reservation Date/Time", "Reserved", "Held"
         ])
         self.table.horizontalHeader().setStretchLastSection(True)
         self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self._cursor = None
+        self.table.verticalScrollBar().valueChanged.connect(self._on_table_scrolled)
         right.addWidget(self.table, 5)
 
+        low_row = QHBoxLayout()
+        self.low_stock_label = QLabel()
+        self.export_reorder_btn = QPushButton("Export reorder list")
+        self.export_reorder_btn.clicked.connect(self.export_reorder_list)
+        low_row.addWidget(self.low_stock_label, 1)
+        low_row.addWidget(self.export_reorder_btn)
+        right.addLayout(low_row)
+        self.low_stock_list = QListWidget()
+        right.addWidget(self.low_stock_list, 1)
+
+        self.dashboard = QLabel()
+        root.addWidget(self.dashboard)
+        self._dashboard_pending = False
+        self.warehouse.events.subscribe_all(self._on_warehouse_event)
+
         self.populate_table(None)
 
+        # Reporting processes attach to this read-only copy instead of the live objects
+        self.snapshots = SnapshotPublisher(self.warehouse)
+        self.snapshot_timer = QTimer(self)
+        self.snapshot_timer.timeout.connect(self.publish_snapshot)
+        self.snapshot_timer.start(SNAPSHOT_INTERVAL_MS)
+        self.publish_snapshot()
+
+        # Every site is saved once its changes settle: the state is pickled here on the UI thread, between two
+        # operations, and the file is written in the background
+        shards = self.cluster.shards if self.cluster is not None else [self.warehouse]
+        self.autosavers = [Autosaver(shard, self.snapshot_path(shard)).start()
+                           for shard in shards if shard not in self.unreadable]
+        self.autosave_timer = QTimer(self)
+        self.autosave_timer.timeout.connect(self.poll_autosavers)
+        self.autosave_timer.start(int(AUTOSAVE_POLL_INTERVAL * 1000))
+        if self.unreadable:
+            files = ", ".join(f"'{self.snapshot_path(shard)}'" for shard in self.unreadable)
+            show_error(self, f"Could not read {files}; see the log. The file was left untouched and changes "
+                             f"to that site are not saved until it is repaired and the program restarted.")
+
+    def publish_snapshot(self):
+        try:
+            name = self.snapshots.publish()
+        except OSError as e:
+            self.statusBar().showMessage(f"Could not publish snapshot: {e}")
+            return
+        self.statusBar().showMessage(f"Report snapshot: {name}")
+
+    def apply_price_filter(self):
+        if self.top_n.value():
+            self.price_filter = ("top", self.top_n.value())
+        else:
+            self.price_filter = ("range", self.price_min.value() or None, self.price_max.value() or None)
+        self.populate_table(self.current_filter)
+
+    def clear_price_filter(self):
+        self.price_filter = None
+        self.query_le.clear()
+        self.populate_table(self.current_filter)
+
+    def apply_query(self):
+        text = self.query_le.text().strip()
+        if not text:
+            self.clear_price_filter()
+            return
+        try:
+            # Compiled once; re-run as is when the category buttons change
+            self.price_filter = ("query", Query(text))
+        except ValueError as e:
+            show_error(self, f"Invalid filter: {e}")
+            return
+        self.populate_table(self.current_filter)
+
+    def _price_filter_codes(self, filter_type: Optional[str]) -> list:
+        prices = self.warehouse.prices
+        if self.price_filter[0] == "query":
+            result = self.warehouse.query(self.price_filter[1], filter_type)
+            self.statusBar().showMessage(f"{len(result.products)} match(es); {result.plan.describe()}")
+            return [p.bar_code for p in result.products]
+        if self.price_filter[0] == "top":
+            return prices.top_by_value(self.price_filter[1], filter_type)
+        return prices.price_range(self.price_filter[1], self.price_filter[2], filter_type)
+
     def collect_rows(self, filter_type: Optional[str]):
-        """Return list of rows (tuple) for table, combining products and reservations."""
+        """ Rows of the price filter: stock only, in index order (cheapest or most valuable first). """
         rows = []
-        for p in self.warehouse.products:
-            tname = product_type_name(p)
-            if filter_type and tname != filter_type:
-                continue
-            rows.append((
-                tname, p.name, f"{p.price:.2f}", str(p.quantity), p.description,
-                p.bar_code, product_exp_warranty_str(p), "", "No"
-            ))
-        for r in self.warehouse.reserved_products:
-            p = r["product"]
-            qty = r["quantity"]
-            dt = r["pickup_datetime"].strftime("%Y-%m-%d %H:%M")
-            tname = product_type_name(p)
-            if filter_type and tname != filter_type:
-                continue
-            rows.append((
-                tname, p.name, f"{p.price:.2f}", str(qty), p.description,
-                p.bar_code, product_exp_warranty_str(p), dt, "Yes"
-            ))
+        # A pinned view: buyers may keep writing while the rows are built
+        with self.warehouse.view() as view:
+            for code in self._price_filter_codes(filter_type):
+                rec = view.record(code)
+                if rec is not None:
+                    rows.append(self._product_row(rec))
         return rows
 
+    def fetch_rows(self, limit: int) -> list:
+        """
+        About limit more rows from the listing cursor: stock pages first, then reservation pages.
+        Only these rows are built, so the cost of a fetch does not grow with the catalog.
+        """
+        rows = []
+        while self._cursor is not None and len(rows) < limit:
+            kind, token = self._cursor
+            if kind == "products":
+                page = self.warehouse.page_products(limit - len(rows), token, self.current_filter)
+                for rec in page.items:
+                    # Collapsed: one row per clothing style; expanded: one row per size/color variant
+                    if rec.variants and self.expand_cb.isChecked():
+                        rows.extend(self._product_row(v) for v in rec.variants)
+                    else:
+                        rows.append(self._product_row(rec))
+                self._cursor = ("products", page.token) if page.token else ("reservations", None)
+            else:
+                page = self.warehouse.page_reservations(limit - len(rows), token, self.current_filter)
+                rows.extend(self._reservation_row(rec) for rec in page.items)
+                self._cursor = ("reservations", page.token) if page.token else None
+        return rows
+
+    def fetch_more_rows(self):
+        rows = self.fetch_rows(TABLE_PAGE_SIZE)
+        if rows:
+            self._append_rows(rows)
+
+    def _on_table_scrolled(self, value: int):
+        if self._cursor is not None and value >= self.table.verticalScrollBar().maximum() - SCROLL_FETCH_MARGIN:
+            self.fetch_more_rows()
+
+    def _reservation_row(self, rec) -> tuple:
+        return (
+            rec.category, rec.name, f"{rec.price:.2f}", str(rec.quantity), rec.description,
+            format_bar_code(rec.bar_code), exp_warranty_str(rec),
+            rec.pickup_datetime.strftime("%Y-%m-%d %H:%M"), self._reserved_label(rec), ""
+        )
+
+    @staticmethod
+    def _reserved_label(rec) -> str:
+        reference = format_reservation_id(rec.reservation_id) if rec.reservation_id else ""
+        if rec.customer:
+            reference = f"{reference}, {rec.customer}" if reference else rec.customer
+        return f"Yes ({reference})" if reference else "Yes"
+
+    def _product_row(self, rec) -> tuple:
+        return (
+            rec.category, rec.name, f"{rec.price:.2f}", str(rec.quantity), rec.description,
+            format_bar_code(rec.bar_code), exp_warranty_str(rec), "", "No", str(rec.held)
+        )
+
+    def _set_row(self, i: int, row: tuple):
+        for j, cell in enumerate(row):
+            item = QTableWidgetItem(cell)
+            if j in (2, 3, 9):
+                item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+            else:
+                item.setTextAlignment(Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter)
+            self.table.setItem(i, j, item)
+
     def populate_table(self, filter_type: Optional[str]):
-        rows = self.collect_rows(filter_type)
-        self.table.setRowCount(len(rows))
-        for i, row in enumerate(rows):
-            for j, cell in enumerate(row):
-                item = QTableWidgetItem(cell)
-                if j in (2, 3):
-                    item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
-                else:
-                    item.setTextAlignment(Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter)
-                self.table.setItem(i, j, item)
+        self.current_filter = filter_type
+        self.table.setHorizontalHeaderItem(6, QTableWidgetItem(date_header(filter_type)))
+        # Clearing the table moves the scroll bar; no page may be fetched from the old cursor
+        self._cursor = None
+        self.table.setRowCount(0)
+        # Stock rows by bar code, so single products can be repainted without a rebuild
+        self._row_of = {}
+        if self.price_filter is not None:
+            self._append_rows(self.collect_rows(filter_type))
+        else:
+            # The first page now, the rest as the table is scrolled down
+            self._cursor = ("products", None)
+            self._append_rows(self.fetch_rows(TABLE_PAGE_SIZE))
         self.table.resizeColumnsToContents()
+        self.refresh_dashboard()
+
+    def _append_rows(self, rows: list):
+        first = self.table.rowCount()
+        self.table.setRowCount(first + len(rows))
+        for i, row in enumerate(rows, first):
+            self._set_row(i, row)
+            if row[8] == "No":
+                self._row_of[row[5]] = i
+
+    def refresh_rows(self, products):
+        """ Repaint only the rows showing these products (or their clothing style). """
+        with self.warehouse.view() as view:
+            for p in products:
+                owners = [p, p.style] if isinstance(p, ClothingVariant) else [p]
+                for owner in owners:
+                    i = self._row_of.get(format_bar_code(owner.bar_code))
+                    if i is None:
+                        continue
+                    if isinstance(owner, ClothingVariant):
+                        # Variant records hang off their style's record, in matrix order
+                        style = view.record(owner.style.bar_code)
+                        rec = style.variants[owner.index] if style else None
+                    else:
+                        rec = view.record(owner.bar_code)
+                    if rec is not None:
+                        self._set_row(i, self._product_row(rec))
+        self.refresh_dashboard()
+
+    def open_scan_mode(self):
+        # Non-modal, so the table stays live while codes stream in
+        if self.scan_dialog is None:
+            self.scan_dialog = ScanModeDialog(self, self.warehouse)
+            self.scan_dialog.finished.connect(self._on_scan_mode_closed)
+        self.scan_dialog.show()
+        self.scan_dialog.raise_()
+        self.scan_dialog.activateWindow()
+
+    def _on_scan_mode_closed(self, _result):
+        self.scan_dialog = None
+
+    def switch_site(self, name: str):
+        self.warehouse.events.unsubscribe_all(self._on_warehouse_event)
+        self.snapshots.close()
+        self.warehouse = self.cluster.shard(name)
+        self.warehouse.events.subscribe_all(self._on_warehouse_event)
+        self.snapshots = SnapshotPublisher(self.warehouse)
+        self.populate_table(None)
+        self.publish_snapshot()
+
+    def poll_autosavers(self):
+        for saver in self.autosavers:
+            saver.poll()
+
+    def snapshot_path(self, shard: Warehouse) -> str:
+        return self.cluster.path_of(shard) if self.cluster is not None else SNAPSHOT_FILE
+
+    def save_all(self):
+        """ Write the sites with unsaved changes now; sites the autosaver already wrote are skipped. """
+        for saver in self.autosavers:
+            saver.flush()
+
+    def _on_warehouse_event(self, event):
+        # A bulk operation publishes many events; repaint the totals once afterwards
+        if not self._dashboard_pending:
+            self._dashboard_pending = True
+            QTimer.singleShot(0, self.refresh_dashboard)
+
+    def refresh_dashboard(self):
+        self._dashboard_pending = False
+        stats = self.warehouse.stats
+        parts = [f"Stock value: {Money(stats.total_cents)}", f"Units: {stats.total_units}"]
+        for category in ("Food", "Electronic", "Clothing"):
+            parts.append(f"{category}: {Money(stats.cents_by_category.get(category, 0))}")
+        parts.append(f"Expiring within 7 days: {stats.units_expiring_within(7)}")
+        self.dashboard.setText("  |  ".join(parts))
+        self.refresh_low_stock()
+
+    def refresh_low_stock(self):
+        # Only the low items are touched, straight from the warehouse's low-stock index
+        low = self.warehouse.low_stock_items()
+        self.low_stock_label.setText(f"Low stock: {len(low)} product(s) at or below their reorder level")
+        self.low_stock_list.clear()
+        self.low_stock_list.addItems([f"{p.name} ({p.category}): {p.quantity} left, reorder at {p.reorder_level}"
+                                      f"  [{format_bar_code(p.bar_code)}]" for p in low])
+
+    def export_reorder_list(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Export reorder list", REORDER_FILE, "CSV files (*.csv)")
+        if not path:
+            return
+        try:
+            count = export_reorder_list(self.warehouse.low_stock_items(), path,
+                                        self.warehouse.reorder_suggestions())
+        except OSError as e:
+            show_error(self, f"Could not export the reorder list: {e}")
+            return
+        show_info(self, f"Exported {count} product(s) to reorder to '{path}'.")
 
     def handle_command(self):
         cmd = self.cmd_input.text().strip()
-        if cmd not in [str(i) for i in range(1, 10)]:
-            show_error(self, "Invalid option. Enter a number 1-9.")
+        if cmd not in [str(i) for i in range(1, LAST_MENU_OPTION + 1)]:
+            show_error(self, f"Invalid option. Enter a number 1-{LAST_MENU_OPTION}.")
             return
 
         if cmd == "1":
@@ -806,25 +1356,115 @@ class MainWindow(QMainWindow):
                 self.populate_table(None)
 
         elif cmd == "9":
-            self.warehouse.save_products()
-            self.warehouse.save_reservation()
+            self.save_all()
             show_info(self, "Thank you for stopping by. See you later!")
             QApplication.instance().quit()
 
+        elif cmd == "10":
+            problems = self.warehouse.check_aggregates()
+            if problems:
+                show_error(self, "Inventory totals are out of sync:\n" + "\n".join(problems))
+            else:
+                show_info(self, "Inventory totals match a full recount.")
+
+        elif cmd == "11":
+            if not is_manager_hours():
+                show_error(self, "Receiving goods is allowed only between 23:00 and 06:00.")
+            else:
+                self.open_scan_mode()
+
+        elif cmd == "12":
+            if not is_manager_hours():
+                show_error(self, "Paging out products is allowed only between 23:00 and 06:00.")
+            else:
+                self.page_out()
+
+        elif cmd == "13":
+            if not is_manager_hours():
+                show_error(self, "Merging products is allowed only between 23:00 and 06:00.")
+            else:
+                merged = self.warehouse.merge_duplicates()
+                self.populate_table(self.current_filter)
+                show_info(self, f"Merged {len(merged)} duplicate product(s).")
+
+        elif cmd == "14":
+            self.show_memory_report()
+
+        elif cmd == "15":
+            dlg = PickupReservationDialog(self, self.warehouse)
+            dlg.exec()
+            if dlg.changed:
+                self.populate_table(self.current_filter)
+
         self.cmd_input.clear()
 
-    def closeEvent(self, event):
+    def show_memory_report(self):
+        # Tracing starts with the first report; later reports show the growth since the previous one
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        report = MemoryReport(self.warehouse)
+        MemoryReportDialog(self, report.format(self.last_memory_report)).exec()
+        self.last_memory_report = report
+
+    def page_out(self):
         try:
-            self.warehouse.save_products()
-            self.warehouse.save_reservation()
-        except Exception:
-            pass
+            paged = self.warehouse.page_out(IDLE_DAYS)
+        except ValueError as e:
+            show_error(self, str(e))
+            return
+        self.save_all()
+        self.populate_table(self.current_filter)
+        show_info(self, f"Moved {len(paged)} product(s) to the cold store; "
+                        f"{len(self.warehouse.cold)} product(s) are stored there in total.")
+
+    def closeEvent(self, event):
+        self.autosave_timer.stop()
+        for saver in self.autosavers:
+            try:
+                saver.close()
+            except Exception:
+                pass
+        self.snapshots.close()
+        if self.cluster is not None:
+            self.cluster.close()
+        else:
+            self.warehouse.close_cold_store()
+            self.warehouse.close_ledger()
         event.accept()
 
 
 def main():
-    app = QApplication(sys.argv)
-    win = MainWindow()
+    parser = argparse.ArgumentParser(description="Warehouse management GUI")
+    parser.add_argument("--site", action="append", help="run one console over several warehouses (repeat per site)")
+    parser.add_argument("--dir", default=".", help="directory holding the per-site files")
+    parser.add_argument("--memory-report", action="store_true",
+                        help="print where the loaded stock uses memory and exit without opening the window")
+    args, qt_args = parser.parse_known_args()
+    setup_logging(os.path.join(args.dir, LOG_FILE))
+
+    if args.memory_report:
+        tracemalloc.start()
+
+    cluster = None
+    if args.site:
+        cluster = WarehouseCluster(args.site, args.dir)
+        cluster.load()
+
+    if args.memory_report:
+        if cluster is not None:
+            warehouses = cluster.shards
+        else:
+            warehouses = [Warehouse("Main Warehouse")]
+            warehouses[0].open_cold_store(cold_filename(SNAPSHOT_FILE))
+            warehouses[0].load_snapshot()
+        for warehouse in warehouses:
+            print(f"/=== {warehouse.name} ===/")
+            print(MemoryReport(warehouse).format() + "\n")
+            warehouse.close_cold_store()
+        return
+
+    app = QApplication(sys.argv[:1] + qt_args)
+    win = MainWindow(cluster)
     win.show()
     sys.exit(app.exec())
 
@@ -0,0 +1,194 @@
+import argparse
+import datetime
+import sys
+import tracemalloc
+from array import array
+from audit_log import setup_logging
+from products import Product
+from warehouse import SNAPSHOT_FILE, Warehouse
+
+TOP_LINES = 10
+
+
+def deep_size(obj, seen: set) -> int:
+    """ Bytes of obj and everything it references that is not already in seen. """
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (str, bytes, int, float, bool, array, datetime.date)) or obj is None:
+        return size
+    if isinstance(obj, dict):
+        size += sum(deep_size(k, seen) + deep_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_size(item, seen) for item in obj)
+    if hasattr(obj, "__dict__"):
+        size += deep_size(vars(obj), seen)
+    for name in getattr(type(obj), "__slots__", ()):
+        if hasattr(obj, name):
+            size += deep_size(getattr(obj, name), seen)
+    return size
+
+
+def _product_footprint(product, seen: set, row: dict):
+    row["count"] += 1
+    own = sys.getsizeof(product) + sys.getsizeof(vars(product))
+    seen.update((id(product), id(vars(product))))
+    row["bytes"] += own
+    attributes = row["attributes"]
+    for name, value in vars(product).items():
+        size = deep_size(value, seen)
+        attributes[name] = attributes.get(name, 0) + size
+        row["bytes"] += size
+
+
+def footprint(warehouse) -> dict:
+    """
+    Bytes held by the warehouse, split by product class (and per attribute), reservations,
+    detached reserved product copies and the lookup structures. Objects shared between
+    several owners are counted once, for the first owner met.
+    """
+    seen = set()
+    sections = {}
+    for product in warehouse.products:
+        row = sections.setdefault(type(product).__name__, {"count": 0, "bytes": 0, "attributes": {}})
+        _product_footprint(product, seen, row)
+
+    reservations = {"count": 0, "bytes": 0, "attributes": {}}
+    detached = {"count": 0, "bytes": 0, "attributes": {}}
+    for reservation in warehouse.reserved_products:
+        product = reservation["product"]
+        if isinstance(product, Product) and id(product) not in seen:
+            # A reserved product that is no longer stocked is only kept alive by the reservation
+            _product_footprint(product, seen, detached)
+        reservations["count"] += 1
+        reservations["bytes"] += sys.getsizeof(reservation)
+        seen.add(id(reservation))
+        for name, value in reservation.items():
+            size = deep_size(value, seen)
+            reservations["attributes"][name] = reservations["attributes"].get(name, 0) + size
+            reservations["bytes"] += size
+    sections["Reservations"] = reservations
+    if detached["count"]:
+        sections["Detached reserved products"] = detached
+
+    indexes = {"count": 0, "bytes": 0, "attributes": {}}
+    for name in ("_products", "_by_bar_code", "_by_identity", "_variants", "_reserved_units",
+                 "_reservations_by_bar_code", "_reserved_products", "legacy_bar_codes"):
+        size = deep_size(getattr(warehouse, name), seen)
+        indexes["attributes"][name] = size
+        indexes["bytes"] += size
+    parts = {
+        "stats": warehouse.stats,
+        "activity": warehouse.activity.last_seen,
+        "prices": warehouse.prices,
+        "low stock": warehouse.low_stock,
+        "sales ledger": warehouse.ledger.chunks,
+        "versions": [warehouse.versions._records, warehouse.versions._reservations],
+    }
+    if warehouse.cold is not None:
+        cold = warehouse.cold
+        parts["cold catalog"] = [cold.products, cold.aliases, cold.names, cold.identities, cold.stats]
+    for name, value in parts.items():
+        size = deep_size(value, seen)
+        indexes["attributes"][name] = size
+        indexes["bytes"] += size
+    sections["Indexes and caches"] = indexes
+    return sections
+
+
+class MemoryReport:
+    """ A footprint plus, while tracemalloc is tracing, a snapshot of where memory was allocated. """
+
+    def __init__(self, warehouse):
+        self.taken_at = datetime.datetime.now()
+        self.sections = footprint(warehouse)
+        self.snapshot = None
+        if tracemalloc.is_tracing():
+            # Leave out what the report itself allocates
+            self.snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, __file__),
+                tracemalloc.Filter(False, tracemalloc.__file__),
+            ))
+
+    @property
+    def total(self) -> int:
+        return sum(row["bytes"] for row in self.sections.values())
+
+    def growth(self, earlier) -> dict:
+        """ Byte difference per section and attribute since an earlier report. """
+        changes = {}
+        for name in self.sections.keys() | earlier.sections.keys():
+            mine = self.sections.get(name, {"count": 0, "bytes": 0, "attributes": {}})
+            theirs = earlier.sections.get(name, {"count": 0, "bytes": 0, "attributes": {}})
+            attributes = {attr: mine["attributes"].get(attr, 0) - theirs["attributes"].get(attr, 0)
+                          for attr in mine["attributes"].keys() | theirs["attributes"].keys()}
+            changes[name] = {
+                "count": mine["count"] - theirs["count"],
+                "bytes": mine["bytes"] - theirs["bytes"],
+                "attributes": {attr: delta for attr, delta in attributes.items() if delta},
+            }
+        return changes
+
+    def top_allocations(self, limit=TOP_LINES) -> list:
+        """ Source lines holding the most memory, as (bytes, traceback) pairs. """
+        if self.snapshot is None:
+            return []
+        return [(stat.size, stat.traceback) for stat in self.snapshot.statistics("lineno")[:limit]]
+
+    def top_growth(self, earlier, limit=TOP_LINES) -> list:
+        """ Source lines whose allocations grew the most since an earlier report, as (bytes, traceback). """
+        if self.snapshot is None or earlier.snapshot is None:
+            return []
+        stats = self.snapshot.compare_to(earlier.snapshot, "lineno")
+        return [(stat.size_diff, stat.traceback) for stat in stats[:limit]]
+
+    def format(self, earlier=None) -> str:
+        lines = [f"/=== Memory report {self.taken_at:%Y-%m-%d %H:%M:%S}: {_kib(self.total)} ===/"]
+        growth = self.growth(earlier) if earlier is not None else None
+        for name, row in sorted(self.sections.items(), key=lambda item: -item[1]["bytes"]):
+            line = f"{name:<28}{row['count']:>8} objects {_kib(row['bytes']):>12}"
+            if growth is not None:
+                line += f"  ({_signed_kib(growth[name]['bytes'])})"
+            lines.append(line)
+            for attr, size in sorted(row["attributes"].items(), key=lambda item: -item[1]):
+                line = f"    {attr:<24}{_kib(size):>21}"
+                if growth is not None and attr in growth[name]["attributes"]:
+                    line += f"  ({_signed_kib(growth[name]['attributes'][attr])})"
+                lines.append(line)
+
+        grown = self.top_growth(earlier) if earlier is not None else []
+        if grown:
+            lines.append("/=== Largest growth by source line ===/")
+            lines.extend(f"{_signed_kib(size):>12}  {where}" for size, where in grown)
+        elif self.snapshot is not None:
+            lines.append("/=== Largest allocations by source line ===/")
+            lines.extend(f"{_kib(size):>12}  {where}" for size, where in self.top_allocations())
+        else:
+            lines.append("(tracemalloc is not tracing; source lines are not available)")
+        return "\n".join(lines)
+
+
+def _kib(size: int) -> str:
+    return f"{size / 1024:.1f} KiB"
+
+
+def _signed_kib(size: int) -> str:
+    return f"{size / 1024:+.1f} KiB"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Memory footprint of a saved warehouse.")
+    parser.add_argument("snapshot", nargs="?", default=None, help="snapshot file (default: warehouse.pickle)")
+    args = parser.parse_args(argv)
+    setup_logging()
+
+    # Trace from before the load so allocations are attributed to the code that made them
+    tracemalloc.start()
+    warehouse = Warehouse("Main Warehouse")
+    warehouse.load_snapshot(args.snapshot or SNAPSHOT_FILE)
+    print(MemoryReport(warehouse).format())
+
+
+if __name__ == "__main__":
+    main()
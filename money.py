@@ -0,0 +1,63 @@
+from decimal import Decimal, ROUND_CEILING, ROUND_FLOOR, ROUND_HALF_UP
+from fractions import Fraction
+
+CENTS = 100
+
+
+class Money(int):
+    """
+    An exact amount of money in integer cents. It is an int, so sums and products with
+    quantities are plain integer arithmetic; format() and str() show it in units (12.34).
+    """
+    __slots__ = ()
+
+    @classmethod
+    def of(cls, amount, rounding=ROUND_HALF_UP) -> "Money":
+        """ Amount in units (int, float, str or Decimal), rounded to the cent (half up unless told otherwise). """
+        if isinstance(amount, Money):
+            return amount
+        if isinstance(amount, bool):
+            raise TypeError("Amount must be numeric.")
+        if isinstance(amount, int):
+            return cls(amount * CENTS)
+        # repr gives the shortest decimal that reads back as the float, so 0.1 becomes exactly 10 cents
+        exact = Decimal(repr(amount) if isinstance(amount, float) else amount)
+        if not exact.is_finite():
+            raise ValueError(f"Invalid amount: {amount}.")
+        return cls((exact * CENTS).quantize(Decimal(1), rounding=rounding))
+
+    @classmethod
+    def of_price(cls, amount) -> "Money":
+        """ Like of(), for a price: it must still be at least one cent once rounded. """
+        cents = cls.of(amount)
+        if cents <= 0:
+            raise ValueError("Price must be a positive value.")
+        return cents
+
+    @property
+    def units(self) -> float:
+        return int(self) / CENTS
+
+    def discounted(self, percent) -> "Money":
+        """ This amount less percent %, rounded half up to the cent. """
+        kept = Fraction(int(self)) * (CENTS - Fraction(str(percent))) / CENTS
+        return Money((kept * 2 + 1) // 2)
+
+    def __repr__(self):
+        return f"Money('{self}')"
+
+    def __str__(self):
+        sign = "-" if self < 0 else ""
+        whole, cents = divmod(abs(int(self)), CENTS)
+        return f"{sign}{whole}.{cents:02d}"
+
+    def __format__(self, spec):
+        if not spec:
+            return str(self)
+        # Decimal formats without going through a float, so large totals print exactly
+        return format(Decimal(int(self)).scaleb(-2), spec)
+
+
+def cents_bound(amount, upper: bool) -> int:
+    """ A price bound in units as cents, rounded inwards so the bound never admits a price past it. """
+    return Money.of(amount, ROUND_FLOOR if upper else ROUND_CEILING)
@@ -0,0 +1,137 @@
+import base64
+import json
+from bisect import bisect_left
+from typing import NamedTuple, Optional
+from events import (ProductAdded, ProductRemoved, ProductChanged, ProductPagedOut, ProductPagedIn, ReservationAdded,
+                    ReservationRemoved, ReservationsReloaded, StockReloaded)
+from price_index import SortedIndex
+
+PAGE_SIZE = 50
+
+
+class Page(NamedTuple):
+    items: list
+    # Pass back to get the next page; None on the last page
+    token: Optional[str]
+
+
+def encode_token(key: tuple, skip: int) -> str:
+    """ Opaque continuation token: the last key returned and how many entries with that key were returned. """
+    return base64.urlsafe_b64encode(json.dumps([list(key), skip]).encode("utf-8")).decode("ascii")
+
+
+def decode_token(token: str) -> tuple:
+    try:
+        key, skip = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+        return tuple(key), int(skip)
+    except (ValueError, TypeError, UnicodeError):
+        raise ValueError("Invalid page token.")
+
+
+class KeysetIndex(SortedIndex):
+    """ A SortedIndex that can be read one page at a time, resuming after the last key seen. """
+
+    def page(self, limit: int, token=None, prefix: tuple = ()) -> tuple:
+        """
+        Up to limit values in key order, restricted to keys starting with prefix, plus the token
+        for the next page (None when nothing follows). Costs O(log n + limit).
+        """
+        entries = self._entries
+        start = bisect_left(entries, (prefix,))
+        if token is not None:
+            last, skip = decode_token(token)
+            first_of_last = bisect_left(entries, (last,))
+            # Keys may repeat (two identical reservations); skip the ones already returned
+            stop_of_last = first_of_last
+            while stop_of_last < len(entries) and entries[stop_of_last][0] == last:
+                stop_of_last += 1
+            start = max(start, min(first_of_last + skip, stop_of_last))
+        page = []
+        position = start
+        while position < len(entries) and len(page) < limit:
+            key, value = entries[position]
+            if key[:len(prefix)] != prefix:
+                break
+            page.append(value)
+            position += 1
+        more = position < len(entries) and entries[position][0][:len(prefix)] == prefix
+        if not page or not more:
+            return page, None
+        last = entries[position - 1][0]
+        return page, encode_token(last, position - bisect_left(entries, (last,)))
+
+
+def product_key(product) -> tuple:
+    return (product.category, product.name, product.bar_code)
+
+
+def reservation_key(reservation) -> tuple:
+    product = reservation["product"]
+    return (product.category, product.name, product.bar_code, reservation["pickup_datetime"].isoformat())
+
+
+class ListingIndex:
+    """
+    Resident products and reservations in listing order (type, name, bar code; reservations
+    then by pickup time), kept up to date from a warehouse event bus so listings can be read
+    page by page without sorting or copying the whole catalog.
+    """
+
+    def __init__(self):
+        self.products = KeysetIndex()
+        self.reservations = KeysetIndex()
+        # bar code / id(reservation) -> key the entry is filed under
+        self._product_keys = {}
+        self._reservation_keys = {}
+
+    def attach(self, bus):
+        bus.subscribe(ProductAdded, lambda event: self.add(event.product))
+        bus.subscribe(ProductRemoved, lambda event: self.discard(event.product))
+        bus.subscribe(ProductPagedIn, lambda event: self.add(event.product))
+        bus.subscribe(ProductPagedOut, lambda event: self.discard(event.product))
+        bus.subscribe(ProductChanged, self._on_changed)
+        bus.subscribe(StockReloaded, self._on_reloaded)
+        bus.subscribe(ReservationAdded, lambda event: self.add_reservation(event.reservation))
+        bus.subscribe(ReservationRemoved, lambda event: self.discard_reservation(event.reservation))
+        bus.subscribe(ReservationsReloaded, self._on_reservations_reloaded)
+        return self
+
+    def _on_reloaded(self, event):
+        self.products = KeysetIndex()
+        self._product_keys = {}
+        for product in event.products:
+            self.add(product)
+
+    def _on_reservations_reloaded(self, event):
+        self.reservations = KeysetIndex()
+        self._reservation_keys = {}
+        for reservation in event.reservations:
+            self.add_reservation(reservation)
+
+    def _on_changed(self, event):
+        if event.field == "name" and event.product.bar_code in self._product_keys:
+            self.discard(event.product)
+            self.add(event.product)
+
+    def add(self, product):
+        key = product_key(product)
+        self._product_keys[product.bar_code] = key
+        self.products.add(key, product.bar_code)
+
+    def discard(self, product):
+        key = self._product_keys.pop(product.bar_code, None)
+        if key is not None:
+            self.products.discard(key, product.bar_code)
+
+    def add_reservation(self, reservation):
+        key = reservation_key(reservation)
+        self._reservation_keys[id(reservation)] = (key, reservation)
+        self.reservations.add(key, id(reservation))
+
+    def discard_reservation(self, reservation):
+        entry = self._reservation_keys.pop(id(reservation), None)
+        if entry is not None:
+            self.reservations.discard(entry[0], id(reservation))
+
+    def reservation_of(self, ref):
+        return self._reservation_keys[ref][1]
@@ -0,0 +1,192 @@
+from bisect import bisect_left, bisect_right, insort
+from math import inf
+from events import (ProductAdded, ProductRemoved, ProductChanged, LotsChanged, ProductPagedOut, ProductPagedIn,
+                    StockReloaded)
+from money import cents_bound
+from products import ClothingVariant, kind_of
+
+
+class SortedIndex:
+    """
+    (key, bar code) pairs kept sorted with bisect. Lookups cost O(log n) and a range
+    or top-n slice O(log n + k); bar codes break ties so every entry is unique.
+    """
+
+    def __init__(self):
+        self._entries = []
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, key, code):
+        insort(self._entries, (key, code))
+
+    def discard(self, key, code):
+        entries = self._entries
+        i = bisect_left(entries, (key, code))
+        if i < len(entries) and entries[i] == (key, code):
+            del entries[i]
+
+    def _span(self, low, high) -> tuple:
+        entries = self._entries
+        start = 0 if low is None else bisect_left(entries, (low,))
+        stop = len(entries) if high is None else bisect_right(entries, (high, inf))
+        return start, max(start, stop)
+
+    def between(self, low=None, high=None) -> list:
+        """ Bar codes with low <= key <= high (either bound may be None), smallest key first. """
+        start, stop = self._span(low, high)
+        return [code for _, code in self._entries[start:stop]]
+
+    def count(self, low=None, high=None) -> int:
+        """ How many entries between() would return, in O(log n). """
+        start, stop = self._span(low, high)
+        return stop - start
+
+    def smallest(self, n: int) -> list:
+        return [code for _, code in self._entries[:max(n, 0)]]
+
+    def largest(self, n: int) -> list:
+        if n <= 0:
+            return []
+        return [code for _, code in reversed(self._entries[-n:])]
+
+
+class PriceIndex:
+    """
+    Sorted indexes on unit price and on stock value (price * quantity) of the resident
+    products, overall and per category. Attached to a warehouse event bus it follows
+    inserts, removals, price changes, discounts and quantity changes.
+    Clothing styles are indexed as one entry; a sold variant re-keys its style.
+    Keys are exact integer cents; bounds are given in units.
+    """
+
+    def __init__(self):
+        self.by_price = {None: SortedIndex()}
+        self.by_value = {None: SortedIndex()}
+        # bar code -> (category, price key, value key) the product is filed under
+        self._keys = {}
+
+    def attach(self, bus):
+        bus.subscribe(ProductAdded, lambda event: self.add(event.product))
+        bus.subscribe(ProductRemoved, lambda event: self.discard(event.product))
+        bus.subscribe(ProductPagedIn, lambda event: self.add(event.product))
+        bus.subscribe(ProductPagedOut, lambda event: self.discard(event.product))
+        bus.subscribe(ProductChanged, self._on_changed)
+        bus.subscribe(StockReloaded, self._on_reloaded)
+        return self
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _on_reloaded(self, event):
+        self.__init__()
+        for product in event.products:
+            self.add(product)
+
+    def _on_changed(self, event):
+        if event.field not in ("price_cents", "quantity"):
+            return
+        product = event.product
+        if isinstance(product, ClothingVariant):
+            product = product.style
+        if product.bar_code in self._keys:
+            self.discard(product)
+            self.add(product)
+
+    def add(self, product):
+        code = product.bar_code
+        keys = (product.category, product.price_cents, product.total_cents())
+        self._keys[code] = keys
+        for indexes, key in ((self.by_price, keys[1]), (self.by_value, keys[2])):
+            indexes[None].add(key, code)
+            indexes.setdefault(keys[0], SortedIndex()).add(key, code)
+
+    def discard(self, product):
+        keys = self._keys.pop(product.bar_code, None)
+        if keys is None:
+            return
+        for indexes, key in ((self.by_price, keys[1]), (self.by_value, keys[2])):
+            indexes[None].discard(key, product.bar_code)
+            indexes[keys[0]].discard(key, product.bar_code)
+
+    @staticmethod
+    def _cents(low, high) -> tuple:
+        return (None if low is None else cents_bound(low, upper=False),
+                None if high is None else cents_bound(high, upper=True))
+
+    def price_range(self, low=None, high=None, category=None) -> list:
+        """ Bar codes priced between low and high inclusive, cheapest first. """
+        index = self.by_price.get(category)
+        return index.between(*self._cents(low, high)) if index is not None else []
+
+    def count_price_range(self, low=None, high=None, category=None) -> int:
+        index = self.by_price.get(category)
+        return index.count(*self._cents(low, high)) if index is not None else 0
+
+    def cheapest(self, n=1, category=None) -> list:
+        index = self.by_price.get(category)
+        return index.smallest(n) if index is not None else []
+
+    def top_by_value(self, n, category=None) -> list:
+        """ Bar codes of the n most valuable stock lines, most valuable first. """
+        index = self.by_value.get(category)
+        return index.largest(n) if index is not None else []
+
+
+class ExpiryIndex:
+    """
+    Resident products sorted on their expiration or warranty date (for food, the lot that
+    expires first); products without a date are not indexed.
+    """
+
+    def __init__(self):
+        self.by_date = SortedIndex()
+        self._keys = {}
+
+    def attach(self, bus):
+        bus.subscribe(ProductAdded, lambda event: self.update(event.product))
+        bus.subscribe(ProductRemoved, lambda event: self.discard(event.product))
+        bus.subscribe(ProductPagedIn, lambda event: self.update(event.product))
+        bus.subscribe(ProductPagedOut, lambda event: self.discard(event.product))
+        bus.subscribe(ProductChanged, self._on_changed)
+        # Selling or sweeping the first lot moves a food product's date
+        bus.subscribe(LotsChanged, lambda event: self._refresh(event.product))
+        bus.subscribe(StockReloaded, self._on_reloaded)
+        return self
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _on_reloaded(self, event):
+        self.__init__()
+        for product in event.products:
+            self.update(product)
+
+    def _on_changed(self, event):
+        if event.field in ("expiration_date", "warranty_date"):
+            self._refresh(event.product)
+
+    def _refresh(self, product):
+        # Only resident products are indexed; a detached reserved copy is left alone
+        if product.bar_code in self._keys:
+            self.update(product)
+
+    def update(self, product):
+        self.discard(product)
+        day = kind_of(product).expires(product)
+        if day is not None:
+            self._keys[product.bar_code] = day
+            self.by_date.add(day, product.bar_code)
+
+    def discard(self, product):
+        day = self._keys.pop(product.bar_code, None)
+        if day is not None:
+            self.by_date.discard(day, product.bar_code)
+
+    def between(self, low=None, high=None) -> list:
+        """ Bar codes dated between low and high inclusive, earliest first. """
+        return self.by_date.between(low, high)
+
+    def count(self, low=None, high=None) -> int:
+        return self.by_date.count(low, high)
@@ -1,9 +1,62 @@
 import datetime
-import uuid
+import heapq
+from array import array
 from abc import ABC, abstractmethod
+from operator import attrgetter
+from typing import NamedTuple
+from money import Money
+
+
+class ProductKind(NamedTuple):
+    """ What row-level code needs to know about a product class, resolved once per class. """
+    category: str
+    type_code: int
+    date_label: str
+    expires: object
+    sale_block: object
+
+
+# type(product) -> ProductKind; filled in as the product classes are defined
+PRODUCT_KINDS = {}
+
+
+def _no_date(product):
+    return None
+
+
+def register_kind(cls):
+    field = cls.date_field
+    PRODUCT_KINDS[cls] = ProductKind(cls.category, cls.type_code, cls.date_label,
+                                     attrgetter(field) if field else _no_date, cls.sale_block)
+    return cls
+
+
+def kind_of(product) -> ProductKind:
+    return PRODUCT_KINDS[type(product)]
+
+
+def date_header(category=None) -> str:
+    """ Column title for the dates the listed kinds carry, e.g. "Expires/Warranty" for every kind. """
+    labels = []
+    for kind in PRODUCT_KINDS.values():
+        if kind.date_label and kind.date_label not in labels and category in (None, kind.category):
+            labels.append(kind.date_label)
+    return "/".join(labels) or "Date"
 
 
 class Product(ABC):
+    # Subclasses declare these once; register_kind turns them into a ProductKind
+    category = "Product"
+    type_code = 0
+    date_field = None
+    date_label = ""
+    # Units at or below which the product should be reordered; None: not tracked
+    reorder_level = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        register_kind(cls)
+
     def __init__(self, name, price, quantity, description):
 
         if not isinstance(name, str):
@@ -17,17 +70,46 @@ class Product(ABC):
 
         if not name.strip():
             raise ValueError("Name field cannot be empty.")
-        if price <= 0:
-            raise ValueError("Price must be a positive value.")
+        # Checked once rounded to the cent, so 0.004 is refused rather than stored as zero
+        price_cents = Money.of_price(price)
         if quantity < 0:
             raise ValueError("Quantity cannot be a negative value.")
 
         self.name = name
-        self.price = float(price)
-        self.base_price =float(price)
+        # Exact integer cents; price and base_price are float views of them
+        self.price_cents = price_cents
+        self.base_price_cents = price_cents
         self.quantity = quantity
         self.description = description.strip()
-        self.bar_code = str(uuid.uuid4())
+        # Issued by the warehouse that stocks the product, see Warehouse.insert_product
+        self.bar_code = None
+
+    def __setstate__(self, state):
+        # Pickles from before prices were kept in cents carry float price and base_price
+        if "price" in state:
+            state["price_cents"] = Money.of(state.pop("price"))
+            state["base_price_cents"] = Money.of(state.pop("base_price", state["price_cents"].units))
+        self.__dict__.update(state)
+
+    @property
+    def price(self) -> float:
+        return self.price_cents.units
+
+    @price.setter
+    def price(self, value):
+        self.price_cents = Money.of(value)
+
+    @property
+    def base_price(self) -> float:
+        return self.base_price_cents.units
+
+    @base_price.setter
+    def base_price(self, value):
+        self.base_price_cents = Money.of(value)
+
+    def total_cents(self) -> int:
+        """ Exact stock value in cents. """
+        return self.price_cents * self.quantity
 
     def __repr__(self):
         return (f"<Product {self.name} | Price: {self.price}, "
@@ -41,31 +123,187 @@ class Product(ABC):
     def get_total_value(self):
         pass
 
+    def sale_block(self, today):
+        """ Why the product cannot be sold or reserved on the given day, or None when it can. """
+        return None
+
+    def take(self, quantity):
+        """ Remove units from stock; returns the (expiration date, units) lots they came from, if tracked. """
+        if quantity > self.quantity:
+            raise ValueError(f"Not enough in stock. Available: {self.quantity}")
+        self.quantity -= quantity
+        return []
+
+    def restock(self, quantity, expiration_date=None):
+        if quantity < 0:
+            raise ValueError("Quantity to add cannot be negative.")
+        self.quantity += quantity
+        return []
+
+    def identity(self):
+        """ Key under which an identical product is merged instead of stocked twice (None: never merged). """
+        return (self.category, self.name, self.price_cents)
+
+    def absorb(self, other):
+        """ Take over the stock of an identical product; returns the lots added, as restock() does. """
+        return self.restock(other.quantity)
+
+
+def _parse_expiration_date(expiration_date):
+    if isinstance(expiration_date, str):
+        try:
+            return datetime.datetime.strptime(expiration_date, "%Y-%m-%d").date()
+        except ValueError:
+            raise ValueError("Invalid date format. Use YYYY-MM-DD string.")
+    if isinstance(expiration_date, datetime.datetime):
+        return expiration_date.date()
+    if not isinstance(expiration_date, datetime.date):
+        raise TypeError("expiration_date must be str (YYYY-MM-DD), datetime.date, or datetime.datetime.")
+    return expiration_date
+
+
+def lot_expired(expiration_date, today) -> bool:
+    """ Food is good through its expiration date; every lot check uses this one boundary. """
+    return expiration_date < today
+
 
 class FoodProduct(Product):
+    """
+    Food stock is kept in lots, one per delivery, each with its own expiration date.
+    Lots live in a heap ordered by date so sales and reservations draw from the lot
+    that expires first (FEFO) in O(log lots); quantity is always the sum of the lots.
+    """
+    category = "Food"
+    type_code = 1
+    date_field = "expiration_date"
+    date_label = "Expires"
+
     def __init__(self, name, price, quantity, description, expiration_date):
         super().__init__(name, price, quantity, description)
 
-        if isinstance(expiration_date, str):
-            try:
-                expiration_date = datetime.datetime.strptime(expiration_date, "%Y-%m-%d").date()
-            except ValueError:
-                raise ValueError("Invalid date format. Use YYYY-MM-DD string.")
-        elif isinstance(expiration_date, datetime.datetime):
-            expiration_date = expiration_date.date()
-        elif not isinstance(expiration_date, datetime.date):
-            raise TypeError("expiration_date must be str (YYYY-MM-DD), datetime.date, or datetime.datetime.")
-
-        self.expiration_date = expiration_date
+        self.lots = []
+        self._lot_seq = 0
+        self.expiration_date = _parse_expiration_date(expiration_date)
 
-        if self.expiration_date < datetime.date.today():
+        if lot_expired(self.expiration_date, datetime.date.today()):
             raise ValueError(f"Expiration date {self.expiration_date} is in the past.")
 
+    @property
+    def expiration_date(self):
+        """ Date of the lot that expires first (the last known date once stock runs out). """
+        return self.lots[0][0] if self.lots else self._expiration_date
+
+    @expiration_date.setter
+    def expiration_date(self, value):
+        # Re-dates all stock as a single lot
+        self._expiration_date = value
+        self.lots = []
+        if self.quantity:
+            self._push_lot(value, self.quantity)
+
+    def __setstate__(self, state):
+        # Pickles from before lots were introduced carry a single plain expiration_date
+        if "lots" not in state:
+            expiration_date = state.pop("expiration_date")
+            state["_expiration_date"] = expiration_date
+            state["lots"] = [[expiration_date, 0, state["quantity"]]] if state["quantity"] else []
+            state["_lot_seq"] = 1
+        super().__setstate__(state)
+
+    def _push_lot(self, expiration_date, quantity):
+        # [date, seq, units]: seq keeps ordering stable and units are never compared
+        heapq.heappush(self.lots, [expiration_date, self._lot_seq, quantity])
+        self._lot_seq += 1
+
+    def lot_summary(self):
+        return sorted((lot[0], lot[2]) for lot in self.lots)
+
+    def take(self, quantity, today=None):
+        """ Draw from the lot that expires first among those still good; expired lots wait for the sweep. """
+        if today is None:
+            today = datetime.date.today()
+        # Expired lots sort first; set them aside so they are neither sold nor counted as available
+        expired = []
+        while self.lots and lot_expired(self.lots[0][0], today):
+            expired.append(heapq.heappop(self.lots))
+        try:
+            available = self.quantity - sum(lot[2] for lot in expired)
+            if quantity > available:
+                raise ValueError(f"Not enough in stock. Available: {available}")
+            taken = []
+            remaining = quantity
+            while remaining:
+                lot = self.lots[0]
+                used = min(lot[2], remaining)
+                lot[2] -= used
+                remaining -= used
+                taken.append((lot[0], used))
+                if lot[2] == 0:
+                    self._expiration_date = lot[0]
+                    heapq.heappop(self.lots)
+            self.quantity -= quantity
+            return taken
+        finally:
+            for lot in expired:
+                heapq.heappush(self.lots, lot)
+
+    def restock(self, quantity, expiration_date=None):
+        """ Add a lot; without a date the units join the earliest lot that is still good. """
+        if quantity < 0:
+            raise ValueError("Quantity to add cannot be negative.")
+        today = datetime.date.today()
+        if expiration_date is None:
+            good = [lot[0] for lot in self.lots if not lot_expired(lot[0], today)]
+            expiration_date = min(good) if good else self._expiration_date
+        else:
+            expiration_date = _parse_expiration_date(expiration_date)
+        if lot_expired(expiration_date, today):
+            raise ValueError(f"Expiration date {expiration_date} is in the past.")
+        if not quantity:
+            return []
+
+        self._add_to_lot(expiration_date, quantity)
+        return [(expiration_date, quantity)]
+
+    def _add_to_lot(self, expiration_date, quantity):
+        for lot in self.lots:
+            if lot[0] == expiration_date:
+                lot[2] += quantity
+                break
+        else:
+            self._push_lot(expiration_date, quantity)
+        self.quantity += quantity
+
+    def absorb(self, other):
+        # The expiration date is not part of the identity: every lot of the other product carries over as is
+        added = other.lot_summary()
+        for expiration_date, quantity in added:
+            self._add_to_lot(expiration_date, quantity)
+        return added
+
+    def remove_expired_lots(self, today=None):
+        """ Drop every lot past its date; returns the (expiration date, units) removed. """
+        if today is None:
+            today = datetime.date.today()
+        removed = []
+        while self.lots and lot_expired(self.lots[0][0], today):
+            expiration_date, _, units = heapq.heappop(self.lots)
+            self._expiration_date = expiration_date
+            removed.append((expiration_date, units))
+        self.quantity -= sum(units for _, units in removed)
+        return removed
+
     def get_total_value(self):
-        return self.price * self.quantity
+        return self.total_cents() / 100
 
     def is_expired(self):
-        return datetime.date.today() > self.expiration_date
+        """ The earliest lot is past its date (the sweep has something to remove). """
+        return lot_expired(self.expiration_date, datetime.date.today())
+
+    def sale_block(self, today):
+        # Blocked only once no lot is left that is still good
+        latest = max(lot[0] for lot in self.lots) if self.lots else self._expiration_date
+        return "expired" if lot_expired(latest, today) else None
 
     def __repr__(self):
         return (f"<FoodProduct {self.name} | Price: {self.price}, Quantity: {self.quantity}, "
@@ -77,6 +315,11 @@ class FoodProduct(Product):
 
 
 class ElectronicProduct(Product):
+    category = "Electronic"
+    type_code = 2
+    date_field = "warranty_date"
+    date_label = "Warranty"
+
     def __init__(self, name, price, quantity, description, warranty_date):
         super().__init__(name, price, quantity, description)
 
@@ -95,12 +338,18 @@ class ElectronicProduct(Product):
         if self.warranty_date < datetime.date.today():
             raise ValueError(f"Warranty date {self.warranty_date} is already out of warranty.")
 
+    def identity(self):
+        return super().identity() + (self.warranty_date,)
+
     def get_total_value(self):
-        return self.price * self.quantity
+        return self.total_cents() / 100
 
     def is_under_warranty(self):
         return datetime.date.today() <= self.warranty_date
 
+    def sale_block(self, today):
+        return "out of warranty" if self.warranty_date < today else None
+
     def __repr__(self):
         return (f"<ElectronicProduct {self.name} | Price: {self.price}, Quantity: {self.quantity}, "
                 f"Warranty until: {self.warranty_date}, Description: {self.description}, "
@@ -111,6 +360,9 @@ class ElectronicProduct(Product):
 
 
 class ClothingProduct(Product):
+    category = "Clothing"
+    type_code = 3
+
     def __init__(self, name, price, quantity, description, size, color, material=None):
         super().__init__(name, price, quantity, description)
 
@@ -123,8 +375,11 @@ class ClothingProduct(Product):
         self.color = color
         self.material = material if material else "Unknown"
 
+    def identity(self):
+        return super().identity() + (self.size, self.color, self.material)
+
     def get_total_value(self):
-        return self.price * self.quantity
+        return self.total_cents() / 100
 
     def __repr__(self):
         return (f"<ClothingProduct {self.name} | Price: {self.price}, Quantity: {self.quantity}, "
@@ -133,3 +388,166 @@ class ClothingProduct(Product):
 
     def __str__(self):
         return f"{self.name} ({self.size}, {self.color}, {self.quantity} pcs)"
+
+
+class ClothingStyle(Product):
+    """
+    One garment line sold in several sizes and colors. Name, price and description are
+    stored once; stock is a flat size x color matrix of counters, and every cell gets its
+    own bar code. quantity is the total over all cells.
+    """
+    category = "Clothing"
+    type_code = 3
+
+    def __init__(self, name, price, description, sizes, colors, material=None, stock=None):
+        super().__init__(name, price, 0, description)
+
+        sizes = [s.strip() for s in sizes]
+        colors = [c.strip() for c in colors]
+        if not sizes or not all(sizes):
+            raise ValueError("Size cannot be empty.")
+        if not colors or not all(colors):
+            raise ValueError("Color cannot be empty.")
+        if len(set(sizes)) != len(sizes) or len(set(colors)) != len(colors):
+            raise ValueError("Sizes and colors must not repeat.")
+
+        self.sizes = tuple(sizes)
+        self.colors = tuple(colors)
+        self.material = material if material else "Unknown"
+        self.stock = array("q", bytes(8 * len(sizes) * len(colors)))
+        # 0 marks a cell whose bar code the warehouse has not issued yet
+        self.variant_bar_codes = array("q", bytes(8 * len(sizes) * len(colors)))
+
+        for (size, color), quantity in (stock or {}).items():
+            if not isinstance(quantity, int) or quantity < 0:
+                raise ValueError("Quantity cannot be a negative value.")
+            self.stock[self.cell(size, color)] = quantity
+        self.quantity = sum(self.stock)
+
+    def cell(self, size, color) -> int:
+        try:
+            return self.sizes.index(size) * len(self.colors) + self.colors.index(color)
+        except ValueError:
+            raise ValueError(f"{self.name} does not come in {size}/{color}.")
+
+    def variant(self, size, color):
+        return ClothingVariant(self, self.cell(size, color))
+
+    def variants(self):
+        return [ClothingVariant(self, index) for index in range(len(self.stock))]
+
+    def get_total_value(self):
+        return self.total_cents() / 100
+
+    def take(self, quantity):
+        raise ValueError(f"Choose a size and color of {self.name}.")
+
+    def restock(self, quantity, expiration_date=None):
+        raise ValueError(f"Choose a size and color of {self.name}.")
+
+    def identity(self):
+        # Every variant has its own printed bar code, so styles are never merged
+        return None
+
+    def __repr__(self):
+        return (f"<ClothingStyle {self.name} | Price: {self.price}, Quantity: {self.quantity}, "
+                f"Sizes: {', '.join(self.sizes)}, Colors: {', '.join(self.colors)}, Material: {self.material}, "
+                f"Description: {self.description}, Bar Code: {self.bar_code}>")
+
+    def __str__(self):
+        return f"{self.name} ({len(self.sizes)} sizes x {len(self.colors)} colors, {self.quantity} pcs)"
+
+
+class ClothingVariant:
+    """ Lightweight view of one size/color cell of a ClothingStyle; holds no data of its own. """
+    __slots__ = ("style", "index")
+    category = "Clothing"
+    type_code = 3
+    date_field = None
+    date_label = ""
+
+    def __init__(self, style: ClothingStyle, index: int):
+        self.style = style
+        self.index = index
+
+    def __eq__(self, other):
+        return isinstance(other, ClothingVariant) and other.style is self.style and other.index == self.index
+
+    def __hash__(self):
+        return hash((id(self.style), self.index))
+
+    def sale_block(self, today):
+        return None
+
+    @property
+    def size(self):
+        return self.style.sizes[self.index // len(self.style.colors)]
+
+    @property
+    def color(self):
+        return self.style.colors[self.index % len(self.style.colors)]
+
+    @property
+    def name(self):
+        return f"{self.style.name} ({self.size}/{self.color})"
+
+    @property
+    def bar_code(self):
+        return self.style.variant_bar_codes[self.index] or None
+
+    @property
+    def quantity(self):
+        return self.style.stock[self.index]
+
+    @property
+    def price_cents(self):
+        return self.style.price_cents
+
+    @property
+    def base_price_cents(self):
+        return self.style.base_price_cents
+
+    @property
+    def price(self):
+        return self.style.price
+
+    @property
+    def base_price(self):
+        return self.style.base_price
+
+    def total_cents(self) -> int:
+        return self.style.price_cents * self.quantity
+
+    @property
+    def description(self):
+        return self.style.description
+
+    @property
+    def material(self):
+        return self.style.material
+
+    def get_total_value(self):
+        return self.total_cents() / 100
+
+    def take(self, quantity):
+        if quantity > self.quantity:
+            raise ValueError(f"Not enough in stock. Available: {self.quantity}")
+        self.style.stock[self.index] -= quantity
+        self.style.quantity -= quantity
+        return []
+
+    def restock(self, quantity, expiration_date=None):
+        if quantity < 0:
+            raise ValueError("Quantity to add cannot be negative.")
+        self.style.stock[self.index] += quantity
+        self.style.quantity += quantity
+        return []
+
+    def __repr__(self):
+        return f"<ClothingVariant {self.name} | Quantity: {self.quantity}, Bar Code: {self.bar_code}>"
+
+    def __str__(self):
+        return f"{self.name} ({self.quantity} pcs)"
+
+
+register_kind(ClothingVariant)
@@ -0,0 +1,196 @@
+import datetime
+import operator
+import re
+from typing import NamedTuple, Optional
+from products import PRODUCT_KINDS, kind_of
+
+CATEGORIES = {kind.category.lower(): kind.category for kind in PRODUCT_KINDS.values()}
+
+_CONDITION = re.compile(r"""\s*(?P<field>[A-Za-z_]+)\s*(?P<op><=|>=|!=|=|<|>|~)\s*
+                            (?P<value>"[^"]*"|'[^']*'|[^\s"']+)\s*""", re.VERBOSE)
+_AND = re.compile(r"and\b\s*", re.IGNORECASE)
+_OPERATORS = {"=": operator.eq, "!=": operator.ne, "<": operator.lt, "<=": operator.le, ">": operator.gt,
+              ">=": operator.ge}
+
+
+def _expires(product):
+    return kind_of(product).expires(product)
+
+
+def _value(product):
+    return product.get_total_value()
+
+
+def _parse_category(text: str) -> str:
+    try:
+        return CATEGORIES[text.lower()]
+    except KeyError:
+        raise ValueError(f"Unknown type '{text}'. Use one of: {', '.join(sorted(CATEGORIES.values()))}.")
+
+
+def _parse_date(text: str) -> datetime.date:
+    try:
+        return datetime.datetime.strptime(text, "%Y-%m-%d").date()
+    except ValueError:
+        raise ValueError(f"Invalid date '{text}'. Use YYYY-MM-DD.")
+
+
+def _parse_number(text: str) -> float:
+    try:
+        return float(text)
+    except ValueError:
+        raise ValueError(f"Invalid number '{text}'.")
+
+
+# name in the language -> (canonical name, getter, value parser, allowed operators)
+FIELDS = {
+    "type": ("type", operator.attrgetter("category"), _parse_category, ("=", "!=")),
+    "name": ("name", operator.attrgetter("name"), str, ("=", "!=", "~")),
+    "price": ("price", operator.attrgetter("price"), _parse_number, tuple(_OPERATORS)),
+    "qty": ("qty", operator.attrgetter("quantity"), _parse_number, tuple(_OPERATORS)),
+    "value": ("value", _value, _parse_number, tuple(_OPERATORS)),
+    "expires": ("expires", _expires, _parse_date, tuple(_OPERATORS)),
+}
+FIELDS["category"] = FIELDS["type"]
+FIELDS["quantity"] = FIELDS["qty"]
+FIELDS["warranty"] = FIELDS["expires"]
+
+
+class Condition(NamedTuple):
+    field: str
+    op: str
+    value: object
+
+
+class Plan(NamedTuple):
+    """ The access path a query runs on and how many products it has to check. """
+    path: str
+    candidates: int
+    total: int
+
+    def describe(self) -> str:
+        return f"{self.path}: {self.candidates} of {self.total} product(s) checked"
+
+
+class QueryResult(NamedTuple):
+    products: list
+    plan: Plan
+
+
+def looks_like_query(text: str) -> bool:
+    """ Bar codes never contain an operator, so input that does is a filter expression. """
+    return any(op in text for op in "=<>~")
+
+
+def _check(condition: Condition):
+    getter = FIELDS[condition.field][1]
+    value = condition.value
+    if condition.op == "~":
+        needle = value.lower()
+        return lambda product: needle in getter(product).lower()
+    compare = _OPERATORS[condition.op]
+    if condition.field == "name":
+        value = value.lower()
+        return lambda product: compare(getter(product).lower(), value)
+
+    def check(product):
+        actual = getter(product)
+        # Products without a date never match a date condition
+        return actual is not None and compare(actual, value)
+    return check
+
+
+def _bounds(conditions, field: str) -> tuple:
+    """ Tightest inclusive (low, high) implied by the conditions on field; None where unbounded. """
+    low = high = None
+    for condition in conditions:
+        if condition.field != field:
+            continue
+        if condition.op in (">", ">=", "="):
+            low = condition.value if low is None else max(low, condition.value)
+        if condition.op in ("<", "<=", "="):
+            high = condition.value if high is None else min(high, condition.value)
+    return low, high
+
+
+class Query:
+    """
+    A filter expression such as ``type=Food and expires<2026-11-01 and qty<10``, compiled once.
+    Conditions are ``field op value`` joined by ``and``; fields are type, name, price, qty,
+    value and expires; operators are = != < <= > >= and ~ (name contains). Values with spaces
+    are quoted.
+    """
+
+    def __init__(self, text: str):
+        self.text = text.strip()
+        self.conditions = self._parse(self.text)
+        checks = [_check(condition) for condition in self.conditions]
+        self.predicate = lambda product: all(check(product) for check in checks)
+
+    def __repr__(self):
+        return f"Query({self.text!r})"
+
+    @staticmethod
+    def _parse(text: str) -> list:
+        if not text:
+            raise ValueError("Empty filter.")
+        conditions = []
+        position = 0
+        while True:
+            match = _CONDITION.match(text, position)
+            if match is None:
+                raise ValueError(f"Expected 'field op value' at: {text[position:]!r}")
+            name = match["field"].lower()
+            if name not in FIELDS:
+                raise ValueError(f"Unknown field '{match['field']}'. "
+                                 f"Use one of: type, name, price, qty, value, expires.")
+            field, _, parse, allowed = FIELDS[name]
+            if match["op"] not in allowed:
+                raise ValueError(f"Operator '{match['op']}' cannot be used with {field}.")
+            raw = match["value"]
+            if raw[0] in "\"'":
+                raw = raw[1:-1]
+            conditions.append(Condition(field, match["op"], parse(raw)))
+            position = match.end()
+            if position == len(text):
+                return conditions
+            joined = _AND.match(text, position)
+            if joined is None:
+                raise ValueError(f"Expected 'and' at: {text[position:]!r}")
+            position = joined.end()
+
+    def category(self) -> Optional[str]:
+        for condition in self.conditions:
+            if condition.field == "type" and condition.op == "=":
+                return condition.value
+        return None
+
+    def plan(self, warehouse, category=None) -> tuple:
+        """
+        Pick the access path that leaves the fewest products to check: the price index,
+        the date index, the type partition, or a full scan. Estimates are O(log n) counts.
+        Returns (plan, function returning the candidate bar codes).
+        """
+        category = category or self.category()
+        total = len(warehouse.products)
+        options = []
+        price_low, price_high = _bounds(self.conditions, "price")
+        if price_low is not None or price_high is not None:
+            label = f"price index{f' ({category})' if category else ''}"
+            options.append((warehouse.prices.count_price_range(price_low, price_high, category), label,
+                            lambda: warehouse.prices.price_range(price_low, price_high, category)))
+        day_low, day_high = _bounds(self.conditions, "expires")
+        if day_low is not None or day_high is not None:
+            options.append((warehouse.expiry.count(day_low, day_high), "date index",
+                            lambda: warehouse.expiry.between(day_low, day_high)))
+        if category is not None:
+            options.append((warehouse.prices.count_price_range(category=category), f"type partition ({category})",
+                            lambda: warehouse.prices.price_range(category=category)))
+        options.append((total, "full scan", lambda: [p.bar_code for p in warehouse.products]))
+        # Stable on ties, so an index wins over the scan it would equal
+        candidates, path, codes = min(options, key=operator.itemgetter(0))
+        return Plan(path, candidates, total), codes
+
+
+def compile_query(query) -> Query:
+    return query if isinstance(query, Query) else Query(query)
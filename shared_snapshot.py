@@ -0,0 +1,244 @@
+import argparse
+import csv
+import datetime
+import operator
+import struct
+import sys
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from itertools import compress
+from multiprocessing import resource_tracker, shared_memory
+from money import CENTS, Money
+from products import PRODUCT_KINDS
+
+# 02: prices are int64 cents instead of float64 units
+MAGIC = b"WHSNAP02"
+# magic, rows, bytes of packed names, publish time (epoch seconds), version
+HEADER = struct.Struct("<8sQQdQ")
+CATEGORY_NAMES = {kind.type_code: kind.category for kind in PRODUCT_KINDS.values()}
+
+
+def _aligned(size: int) -> int:
+    return (size + 7) & ~7
+
+
+def _layout(rows: int, names_size: int) -> dict:
+    """ Byte offset of every column; each column starts on an 8-byte boundary. """
+    offsets = {}
+    position = _aligned(HEADER.size)
+    for column, width in (("bar_codes", 8), ("prices", 8), ("quantities", 8), ("expires", 4),
+                          ("categories", 1), ("name_offsets", 8)):
+        offsets[column] = position
+        count = rows + 1 if column == "name_offsets" else rows
+        position = _aligned(position + count * width)
+    offsets["names"] = position
+    offsets["end"] = position + names_size
+    return offsets
+
+
+def _columns(warehouse):
+    bar_codes, prices, quantities = array("q"), array("q"), array("q")
+    expires, categories = array("i"), array("b")
+    name_offsets, names = array("q", [0]), bytearray()
+    kinds = PRODUCT_KINDS
+    for item in warehouse.sellable_items():
+        kind = kinds[type(item)]
+        bar_codes.append(item.bar_code)
+        prices.append(item.price_cents)
+        quantities.append(item.quantity)
+        day = kind.expires(item)
+        expires.append(day.toordinal() if day else 0)
+        categories.append(kind.type_code)
+        names += item.name.encode("utf-8")
+        name_offsets.append(len(names))
+    return {
+        "bar_codes": bar_codes, "prices": prices, "quantities": quantities, "expires": expires,
+        "categories": categories, "name_offsets": name_offsets, "names": names,
+    }
+
+
+def publish(warehouse) -> shared_memory.SharedMemory:
+    """
+    Copy the sellable stock of a warehouse into a new shared memory segment as columns.
+    The caller owns the returned segment and must close() and unlink() it.
+    """
+    columns = _columns(warehouse)
+    rows = len(columns["bar_codes"])
+    offsets = _layout(rows, len(columns["names"]))
+    segment = shared_memory.SharedMemory(create=True, size=max(offsets["end"], 1))
+    HEADER.pack_into(segment.buf, 0, MAGIC, rows, len(columns["names"]), time.time(), 0)
+    for column, data in columns.items():
+        raw = data.tobytes() if isinstance(data, array) else bytes(data)
+        segment.buf[offsets[column]:offsets[column] + len(raw)] = raw
+    return segment
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """
+    Open a published segment without taking ownership of it. Before Python 3.13 attaching
+    registers the segment with this process's resource tracker, which unlinks it when the
+    process exits; a report run on its own would destroy the segment the GUI published.
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    # A tracker already running here is shared with the publisher (a worker process, or the publisher itself);
+    # its registration of the segment is the publisher's and must stay
+    shared_tracker = resource_tracker._resource_tracker._fd is not None
+    segment = shared_memory.SharedMemory(name=name)
+    if not shared_tracker:
+        resource_tracker.unregister(segment._name, "shared_memory")
+    return segment
+
+
+class SnapshotReader:
+    """
+    Read-only, zero-copy view of a published snapshot. Column attributes are memoryviews
+    straight into the shared segment; nothing is unpickled.
+    """
+
+    def __init__(self, name: str):
+        self._segment = _attach(name)
+        buf = self._segment.buf
+        magic, self.rows, names_size, self.published_at, _ = HEADER.unpack_from(buf, 0)
+        if magic != MAGIC:
+            self._segment.close()
+            raise ValueError(f"Shared memory '{name}' does not hold a warehouse snapshot.")
+        offsets = _layout(self.rows, names_size)
+        rows = self.rows
+        self.bar_codes = buf[offsets["bar_codes"]:offsets["bar_codes"] + 8 * rows].cast("q")
+        # Unit prices in cents
+        self.prices = buf[offsets["prices"]:offsets["prices"] + 8 * rows].cast("q")
+        self.quantities = buf[offsets["quantities"]:offsets["quantities"] + 8 * rows].cast("q")
+        self.expires = buf[offsets["expires"]:offsets["expires"] + 4 * rows].cast("i")
+        self.categories = buf[offsets["categories"]:offsets["categories"] + rows].cast("b")
+        self.name_offsets = buf[offsets["name_offsets"]:offsets["name_offsets"] + 8 * (rows + 1)].cast("q")
+        self.names = buf[offsets["names"]:offsets["names"] + names_size]
+
+    def name(self, row: int) -> str:
+        return bytes(self.names[self.name_offsets[row]:self.name_offsets[row + 1]]).decode("utf-8")
+
+    def category(self, row: int) -> str:
+        return CATEGORY_NAMES.get(self.categories[row], "Product")
+
+    def expires_on(self, row: int):
+        ordinal = self.expires[row]
+        return datetime.date.fromordinal(ordinal) if ordinal else None
+
+    def close(self):
+        # Views into the buffer must be released before the mapping can be closed
+        for column in ("bar_codes", "prices", "quantities", "expires", "categories", "name_offsets", "names"):
+            getattr(self, column).release()
+        self._segment.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def valuation(name: str) -> dict:
+    """ Stock value overall and per category, summed exactly in integer cents over whole columns. """
+    with SnapshotReader(name) as snap:
+        values = list(map(operator.mul, snap.prices, snap.quantities))
+        cents_by_category = {}
+        for code in set(snap.categories):
+            in_category = map(code.__eq__, snap.categories)
+            cents_by_category[CATEGORY_NAMES.get(code, "Product")] = sum(compress(values, in_category))
+        total_cents = sum(values)
+        return {"total_cents": total_cents, "total_value": total_cents / CENTS,
+                "cents_by_category": cents_by_category,
+                "value_by_category": {category: cents / CENTS for category, cents in cents_by_category.items()}}
+
+
+def search(name: str, text: str) -> list:
+    """ Bar codes of the rows whose name contains text (case-insensitive). """
+    needle = text.lower()
+    with SnapshotReader(name) as snap:
+        return [snap.bar_codes[row] for row in range(snap.rows) if needle in snap.name(row).lower()]
+
+
+def export_csv(name: str, path: str) -> int:
+    with SnapshotReader(name) as snap, open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["bar_code", "type", "name", "price", "quantity", "exp_warranty"])
+        for row in range(snap.rows):
+            expires = snap.expires_on(row)
+            writer.writerow([f"{snap.bar_codes[row]:013d}", snap.category(row), snap.name(row),
+                             Money(snap.prices[row]), snap.quantities[row], expires or "-"])
+        return snap.rows
+
+
+def run_reports(name: str, jobs, max_workers=None) -> list:
+    """
+    Run (function, *args) jobs against the snapshot in worker processes.
+    Only the segment name crosses the process boundary.
+    """
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(func, name, *args) for func, *args in jobs]
+        return [future.result() for future in futures]
+
+
+class SnapshotPublisher:
+    """ Keeps the latest snapshot of a warehouse published, replacing it when the stock changed. """
+
+    def __init__(self, warehouse):
+        self.warehouse = warehouse
+        self.segment = None
+        self.dirty = True
+        warehouse.events.subscribe_all(self._on_event)
+
+    def _on_event(self, event):
+        self.dirty = True
+
+    @property
+    def name(self):
+        return self.segment.name if self.segment is not None else None
+
+    def publish(self, force=False):
+        if not (self.dirty or force):
+            return self.name
+        segment = publish(self.warehouse)
+        self.dirty = False
+        # Readers still attached to the old segment keep their mapping until they close it
+        self._release()
+        self.segment = segment
+        return segment.name
+
+    def _release(self):
+        if self.segment is not None:
+            self.segment.close()
+            self.segment.unlink()
+            self.segment = None
+
+    def close(self):
+        self.warehouse.events.unsubscribe_all(self._on_event)
+        self._release()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reports over a warehouse snapshot published in shared memory.")
+    parser.add_argument("segment", help="shared memory name shown in the GUI status bar")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("valuation")
+    search_parser = sub.add_parser("search")
+    search_parser.add_argument("text")
+    export_parser = sub.add_parser("export")
+    export_parser.add_argument("path")
+    args = parser.parse_args(argv)
+
+    if args.command == "valuation":
+        report = valuation(args.segment)
+        for category, cents in sorted(report["cents_by_category"].items()):
+            print(f"/=== {category}: {Money(cents)} ===/")
+        print(f"/=== Total: {Money(report['total_cents'])} ===/")
+    elif args.command == "search":
+        for code in search(args.segment, args.text):
+            print(f"{code:013d}")
+    else:
+        print(f"/=== Exported {export_csv(args.segment, args.path)} rows to '{args.path}' ===/")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import os
+import logging
+import tempfile
+import unittest
+import datetime
+from unittest import mock
+from audit_log import setup_logging, shutdown_logging
+from products import ElectronicProduct, FoodProduct
+from warehouse import Warehouse
+
+
+class TestAuditLog(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "warehouse.log")
+        self.wh = Warehouse("Test Warehouse")
+        today = datetime.date.today()
+        stale = [FoodProduct(f"Milk {i}", 2.0, 3, "", today) for i in range(50)]
+        for product in stale:
+            product.expiration_date = today - datetime.timedelta(days=1)
+        self.wh.products = stale + [ElectronicProduct("Radio", 30.0, 2, "", today)]
+
+    def tearDown(self):
+        shutdown_logging()
+        self.tmp.cleanup()
+
+    def _lines(self):
+        shutdown_logging()
+        with open(self.path, encoding="utf-8") as f:
+            return f.read().splitlines()
+
+    def test_sweep_logs_one_summary(self):
+        setup_logging(self.path, console=False)
+        self.wh.remove_expired()
+        lines = self._lines()
+        self.assertEqual(len(lines), 1)
+        self.assertIn("INFO sweep.expired", lines[0])
+        self.assertIn("products=50 units=150", lines[0])
+        self.assertIn("Removed 150 expired unit(s) of 50 product(s) from Test Warehouse in ", lines[0])
+
+    def test_item_records_are_not_built_below_debug(self):
+        setup_logging(self.path, console=False)
+        with mock.patch("warehouse.log") as log:
+            self.wh.remove_expired()
+            self.wh.remove_out_of_warranty()
+        self.assertEqual([c.args[1] for c in log.call_args_list if c.args[1].endswith(".item")], [])
+
+    def test_debug_level_adds_item_lines(self):
+        setup_logging(self.path, level=logging.DEBUG, console=False)
+        self.wh.remove_expired()
+        lines = self._lines()
+        self.assertEqual(sum("sweep.expired.item" in line for line in lines), 50)
+
+    def test_errors_are_logged(self):
+        setup_logging(self.path, console=False)
+        self.wh.save_snapshot(os.path.join(self.tmp.name, "missing", "warehouse.pickle"))
+        [line] = self._lines()
+        self.assertIn("ERROR store.save_snapshot", line)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+import datetime
+from unittest import mock
+from autosave import Autosaver
+from cluster import WarehouseCluster
+from products import ClothingProduct, FoodProduct
+from warehouse import Warehouse
+
+
+class TestAutosave(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "warehouse.pickle")
+        self.wh = Warehouse("Test Warehouse")
+        self.apple = FoodProduct("Apple", 1.0, 10, "", datetime.date.today() + datetime.timedelta(days=5))
+        self.wh.products = [self.apple]
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _wait_for(self, condition, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            self.assertLess(time.monotonic(), deadline, "timed out")
+            time.sleep(0.01)
+
+    def test_changes_mark_the_warehouse_dirty_until_saved_or_loaded(self):
+        self.assertTrue(self.wh.dirty)
+        self.assertTrue(self.wh.save_snapshot(self.path))
+        self.assertFalse(self.wh.dirty)
+        self.wh.sell(self.apple, 1)
+        self.assertTrue(self.wh.dirty)
+        loaded = Warehouse("Loaded")
+        loaded.load_snapshot(self.path)
+        self.assertFalse(loaded.dirty)
+
+    def test_failed_save_keeps_the_previous_snapshot(self):
+        self.wh.save_snapshot(self.path)
+        self.wh.sell(self.apple, 4)
+        with mock.patch("warehouse.os.fsync", side_effect=OSError("disk full")):
+            self.assertFalse(self.wh.save_snapshot(self.path))
+        self.assertTrue(self.wh.dirty)
+        self.assertEqual(os.listdir(self.tmp.name), ["warehouse.pickle"])
+        loaded = Warehouse("Loaded")
+        loaded.load_snapshot(self.path)
+        self.assertEqual(loaded.find_by_name("Apple").quantity, 10)
+
+    def test_writes_once_changes_settle(self):
+        saver = Autosaver(self.wh, self.path, delay=0.05).start()
+        self.wh.sell(self.apple, 3)
+        self.wh.insert_product(ClothingProduct("T-Shirt", 20.0, 15, "", "M", "red"))
+        self._wait_for(lambda: saver.poll() or (saver.saves == 1 and not self.wh.dirty))
+        saver.close()
+        self.assertEqual(saver.saves, 1)
+        loaded = Warehouse("Loaded")
+        loaded.load_snapshot(self.path)
+        self.assertEqual(loaded.find_by_name("Apple").quantity, 7)
+        self.assertIsNotNone(loaded.find_by_name("T-Shirt"))
+
+    def test_flush_writes_only_what_is_pending(self):
+        saver = Autosaver(self.wh, self.path, delay=60)
+        self.assertTrue(saver.flush())
+        self.assertEqual(saver.saves, 1)
+        self.assertTrue(saver.flush())
+        self.assertEqual(saver.saves, 1)
+        self.wh.sell(self.apple, 1)
+        self.assertTrue(saver.close())
+        self.assertEqual(saver.saves, 2)
+
+    def test_state_is_pickled_on_the_polling_thread_with_the_cold_store_synced(self):
+        saver = Autosaver(self.wh, self.path, delay=0).start()
+        self.wh.open_cold_store(os.path.join(self.tmp.name, "warehouse_cold"))
+        try:
+            threads = []
+            snapshot_bytes = self.wh.snapshot_bytes
+
+            def recording_snapshot():
+                threads.append(threading.current_thread())
+                return snapshot_bytes()
+            self.wh.snapshot_bytes = recording_snapshot
+            with mock.patch.object(self.wh.cold, "sync", wraps=self.wh.cold.sync) as sync:
+                self.assertTrue(saver.poll())
+                self.assertFalse(saver.poll())
+                self._wait_for(lambda: saver.saves == 1)
+            self.assertEqual(threads, [threading.current_thread()])
+            sync.assert_called_once_with()
+            self.assertFalse(self.wh.dirty)
+        finally:
+            saver.close(flush=False)
+            self.wh.close_cold_store()
+
+    def test_relative_paths_are_fixed_when_the_saver_is_created(self):
+        cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        try:
+            saver = Autosaver(self.wh, "warehouse.pickle", delay=60)
+        finally:
+            os.chdir(cwd)
+        self.assertTrue(saver.close())
+        self.assertTrue(os.path.exists(self.path))
+        self.assertFalse(os.path.exists(os.path.join(cwd, "warehouse.pickle")))
+
+    def test_unreadable_snapshots_are_reported_and_left_alone(self):
+        with open(self.path, "wb") as f:
+            f.write(b"not a pickle")
+        loaded = Warehouse("Loaded")
+        self.assertFalse(loaded.load_snapshot(self.path))
+        self.assertEqual(loaded.products, [])
+        with open(self.path, "wb") as f:
+            f.write(b"")
+        self.assertFalse(loaded.load_snapshot(self.path))
+        self.assertTrue(self.wh.save_snapshot(self.path))
+        self.assertTrue(loaded.load_snapshot(self.path))
+
+        cluster = WarehouseCluster(["North", "South"], self.tmp.name)
+        with open(cluster.path_of(cluster.shards[1]), "wb") as f:
+            f.write(b"not a pickle")
+        cluster.load()
+        try:
+            self.assertEqual(cluster.unreadable, [cluster.shards[1]])
+        finally:
+            cluster.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
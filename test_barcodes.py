@@ -0,0 +1,56 @@
+import unittest
+import uuid
+from barcodes import (BarCodeAllocator, make_ean13, is_valid_ean13, parse_bar_code, format_bar_code,
+                      is_legacy_bar_code, migrate_bar_codes, serial_of)
+from products import ClothingProduct
+
+
+class TestBarCodes(unittest.TestCase):
+
+    def test_known_check_digit(self):
+        # 4006381333931 is the textbook EAN-13 example
+        self.assertTrue(is_valid_ean13(4006381333931))
+        self.assertFalse(is_valid_ean13(4006381333932))
+
+    def test_allocator_is_monotonic(self):
+        allocator = BarCodeAllocator()
+        codes = [allocator.allocate() for _ in range(5)]
+        self.assertEqual(codes, sorted(codes))
+        self.assertEqual(len(set(codes)), 5)
+        self.assertTrue(all(is_valid_ean13(c) for c in codes))
+
+    def test_observe_skips_issued_codes(self):
+        allocator = BarCodeAllocator()
+        allocator.observe(make_ean13(41))
+        self.assertEqual(serial_of(allocator.allocate()), 42)
+
+    def test_parse_round_trip(self):
+        code = make_ean13(7)
+        self.assertEqual(parse_bar_code(format_bar_code(code)), code)
+        with self.assertRaises(ValueError):
+            parse_bar_code("not-a-code")
+        with self.assertRaises(ValueError):
+            parse_bar_code(format_bar_code(code + 1))
+
+    def test_migrate_legacy_uuids(self):
+        legacy = ClothingProduct("Shirt", 10.0, 1, "", "M", "red")
+        legacy.bar_code = str(uuid.uuid4())
+        current = ClothingProduct("Hat", 5.0, 1, "", "L", "blue")
+        current.bar_code = make_ean13(10)
+        unlabelled = ClothingProduct("Scarf", 8.0, 1, "", "S", "green")
+        unlabelled.bar_code = None
+
+        allocator = BarCodeAllocator()
+        old_code = legacy.bar_code
+        self.assertTrue(is_legacy_bar_code(old_code))
+        self.assertFalse(is_legacy_bar_code(current.bar_code))
+        mapping = migrate_bar_codes([legacy, current, unlabelled], allocator)
+
+        self.assertEqual(mapping, {old_code: legacy.bar_code})
+        self.assertEqual(serial_of(legacy.bar_code), 11)
+        self.assertEqual(serial_of(unlabelled.bar_code), 12)
+        self.assertEqual(current.bar_code, make_ean13(10))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import os
+import unittest
+import datetime
+import tempfile
+from cluster import WarehouseCluster, shard_filename
+from barcodes import format_bar_code
+from products import FoodProduct, ElectronicProduct, ClothingProduct
+
+
+class TestWarehouseCluster(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cluster = WarehouseCluster(["North", "South", "East"], self.tmp.name)
+
+    def tearDown(self):
+        self.cluster.close()
+        self.tmp.cleanup()
+
+    def test_bar_codes_route_to_issuing_shard(self):
+        placed = []
+        for name in self.cluster.names * 3:
+            product = ClothingProduct(f"Shirt {len(placed)}", 10.0, 1, "", "M", "red")
+            self.cluster.insert_product(product, name)
+            placed.append((name, product))
+
+        codes = [p.bar_code for _, p in placed]
+        self.assertEqual(len(set(codes)), len(codes))
+        for name, product in placed:
+            self.assertEqual(self.cluster.shard_for(product.bar_code).name, name)
+            self.assertIs(self.cluster.find_by_bar_code(format_bar_code(product.bar_code)), product)
+
+    def test_shards_persist_to_their_own_files(self):
+        self.cluster.insert_product(ClothingProduct("Hat", 5.0, 2, "", "L", "blue"), "South")
+        self.cluster.save()
+        self.assertNotEqual(shard_filename("North", self.tmp.name), shard_filename("South", self.tmp.name))
+
+        reloaded = WarehouseCluster(["North", "South", "East"], self.tmp.name)
+        reloaded.load()
+        self.assertEqual([p.name for p in reloaded.shard("South").products], ["Hat"])
+        new_code = reloaded.insert_product(ClothingProduct("Cap", 4.0, 1, "", "S", "grey"), "South").bar_code
+        self.assertEqual(reloaded.shard_for(new_code).name, "South")
+        reloaded.close()
+
+    def test_sweep_and_report_fan_out(self):
+        today = datetime.date.today()
+        stale = FoodProduct("Milk", 2.0, 3, "", today)
+        stale.expiration_date = today - datetime.timedelta(days=1)
+        self.cluster.insert_product(stale, "North")
+        self.cluster.insert_product(FoodProduct("Bread", 1.5, 4, "", today), "North")
+        self.cluster.insert_product(ElectronicProduct("Radio", 30.0, 2, "", today), "East")
+
+        results = {r["name"]: r for r in self.cluster.sweep(max_workers=2)}
+        self.assertEqual(results["North"]["expired"], 1)
+        self.assertEqual([p.name for p in self.cluster.shard("North").products], ["Bread"])
+
+        report = self.cluster.valuation_report()
+        self.assertAlmostEqual(report["total_value"], 4 * 1.5 + 2 * 30.0)
+        self.assertEqual(report["total_units"], 6)
+
+    def test_files_are_only_rewritten_for_shards_that_changed(self):
+        self.cluster.insert_product(ElectronicProduct("Radio", 30.0, 2, "", datetime.date.today()), "East")
+        self.cluster.sweep(max_workers=2)
+        east = shard_filename("East", self.tmp.name)
+        written = os.stat(east).st_ino
+        self.cluster.valuation_report()
+        results = self.cluster.sweep(max_workers=2)
+        self.assertFalse(any(r["changed"] for r in results))
+        self.assertEqual(os.stat(east).st_ino, written)
+        self.assertFalse(self.cluster.shard("East").dirty)
+        self.assertEqual([p.name for p in self.cluster.shard("East").products], ["Radio"])
+
+
+if __name__ == "__main__":
+    unittest.main()
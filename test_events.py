@@ -0,0 +1,68 @@
+import unittest
+import datetime
+from events import (EventBus, ProductAdded, ProductChanged, ProductRemoved, LotsChanged, ReservationAdded,
+                    ReservationRemoved)
+from products import ClothingProduct, FoodProduct
+from warehouse import Warehouse
+
+
+class TestEventBus(unittest.TestCase):
+
+    def test_dispatch_by_type(self):
+        bus = EventBus()
+        added, everything = [], []
+        bus.subscribe(ProductAdded, added.append)
+        bus.subscribe_all(everything.append)
+
+        bus.publish(ProductAdded("a"))
+        bus.publish(ProductRemoved("a"))
+
+        self.assertEqual(added, [ProductAdded("a")])
+        self.assertEqual(len(everything), 2)
+        self.assertTrue(bus.has_subscribers(ProductChanged))
+
+    def test_unsubscribe(self):
+        bus = EventBus()
+        seen = []
+        bus.subscribe(ProductAdded, seen.append)
+        bus.unsubscribe(ProductAdded, seen.append)
+        bus.publish(ProductAdded("a"))
+        self.assertEqual(seen, [])
+        self.assertFalse(bus.has_subscribers(ProductAdded))
+
+
+class TestWarehouseEvents(unittest.TestCase):
+
+    def setUp(self):
+        self.wh = Warehouse("Events")
+        self.seen = []
+        self.wh.events.subscribe_all(self.seen.append)
+        self.shirt = self.wh.insert_product(ClothingProduct("Shirt", 10.0, 5, "", "M", "red"))
+
+    def test_mutations_publish_before_and_after(self):
+        self.wh.add_stock(self.shirt, 3)
+        self.wh.set_price(self.shirt, 12.0)
+        self.wh.sell(self.shirt, 2)
+
+        changes = [(e.field, e.before, e.after) for e in self.seen if isinstance(e, ProductChanged)]
+        self.assertEqual(changes, [
+            ("quantity", 5, 8),
+            ("base_price_cents", 1000, 1200),
+            ("price_cents", 1000, 1200),
+            ("quantity", 8, 6),
+        ])
+
+    def test_product_and_reservation_lifecycle(self):
+        apple = self.wh.insert_product(FoodProduct("Apple", 1.0, 4, "", datetime.date.today()))
+        reservation = self.wh.add_reservation(apple, 1, datetime.datetime.now() - datetime.timedelta(minutes=1))
+        self.wh.expire_reservations()
+        self.wh.remove_product(apple)
+
+        kinds = [type(e) for e in self.seen]
+        self.assertEqual(kinds, [ProductAdded, ProductAdded, LotsChanged, ProductChanged, ReservationAdded,
+                                 ReservationRemoved, ProductRemoved])
+        self.assertIs(self.seen[5].reservation, reservation)
+
+
+if __name__ == "__main__":
+    unittest.main()
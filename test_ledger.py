@@ -0,0 +1,102 @@
+import csv
+import os
+import tempfile
+import unittest
+import datetime
+from unittest import mock
+from ledger import SalesLedger, reorder_quantity
+from low_stock import export_reorder_list
+from products import ClothingStyle, ElectronicProduct, FoodProduct
+from warehouse import Warehouse
+
+
+class TestSalesLedger(unittest.TestCase):
+
+    def setUp(self):
+        self.now = datetime.datetime(2026, 10, 19, 12, 0)
+        self.ledger = SalesLedger()
+        # Code 1 sells 2 units a day for 60 days, code 2 once 40 days ago
+        for days_ago in range(59, -1, -1):
+            if days_ago == 40:
+                self.ledger.record(2, 7, 500, 2, self.now - datetime.timedelta(days=40))
+            self.ledger.record(1, 2, 150, 1, self.now - datetime.timedelta(days=days_ago))
+
+    def test_demand_over_a_rolling_window(self):
+        self.assertEqual(self.ledger.demand(28, self.now), {1: 56})
+        self.assertEqual(self.ledger.demand(45, self.now), {1: 90, 2: 7})
+        self.assertEqual(self.ledger.demand_by_category(45, self.now), {"Food": 90, "Electronic": 7})
+        self.assertEqual(self.ledger.revenue_by_category(45, self.now), {"Food": 13500, "Electronic": 3500})
+
+    def test_daily_units(self):
+        self.assertEqual(self.ledger.daily_units(3, self.now), [2, 2, 2])
+        self.assertEqual(self.ledger.daily_units(41, self.now, bar_code=2), [7] + [0] * 40)
+
+    def test_rows_span_chunks(self):
+        with mock.patch("ledger.CHUNK_ROWS", 8):
+            ledger = SalesLedger()
+            for day in range(20):
+                ledger.record(1, day, 100, 1, self.now - datetime.timedelta(days=19 - day))
+        self.assertEqual(len(ledger.chunks), 3)
+        self.assertEqual(ledger.demand(5, self.now), {1: 15 + 16 + 17 + 18 + 19})
+
+    def test_a_clock_stepping_back_keeps_time_order(self):
+        self.ledger.record(3, 1, 100, 1, self.now - datetime.timedelta(days=90))
+        self.assertEqual(self.ledger.demand(1, self.now)[3], 1)
+
+    def test_reopened_file_holds_every_sale(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "sales.bin")
+            ledger = SalesLedger()
+            ledger.open(path)
+            ledger.record(1, 4, 150, 1, self.now)
+            ledger.close()
+            # A crash mid-append leaves part of a row behind
+            with open(path, "ab") as f:
+                f.write(b"\x01\x02\x03")
+            ledger.open(path)
+            ledger.record(2, 1, 500, 2, self.now)
+            ledger.close()
+            ledger.open(path)
+            self.assertEqual(ledger.demand(1, self.now), {1: 4, 2: 1})
+            ledger.close()
+
+    def test_reorder_quantity(self):
+        self.assertEqual(reorder_quantity(56, 28, 10), 32)
+        self.assertEqual(reorder_quantity(56, 28, 50), 0)
+
+
+class TestWarehouseSales(unittest.TestCase):
+
+    def setUp(self):
+        self.wh = Warehouse("Test Warehouse")
+        self.apple = FoodProduct("Apple", 1.5, 100, "", datetime.date.today() + datetime.timedelta(days=30))
+        self.phone = ElectronicProduct("Phone", 500.0, 5, "", datetime.date.today() + datetime.timedelta(days=365))
+        self.wh.products = [self.apple, self.phone]
+
+    def test_sales_are_recorded_and_suggest_orders(self):
+        now = datetime.datetime.now()
+        for days_ago in range(14, 0, -1):
+            self.wh.sell(self.apple, 5, now - datetime.timedelta(days=days_ago))
+        self.wh.add_reservation(self.phone, 1, now + datetime.timedelta(days=1))
+        self.assertEqual(len(self.wh.ledger), 14)
+        # 70 units in 28 days cover 21 days with 53; 30 are left
+        self.assertEqual(self.wh.reorder_suggestions(now=now), [(self.apple, 23)])
+
+    def test_variant_sales_count_for_their_style_in_the_export(self):
+        style = ClothingStyle("Hoodie", 40.0, "", ["S", "M"], ["black"], stock={("S", "black"): 6, ("M", "black"): 6})
+        self.wh.insert_product(style)
+        self.wh.set_reorder_level(style, 8)
+        self.wh.sell(style.variant("S", "black"), 3)
+        self.wh.sell(style.variant("M", "black"), 2)
+        suggestions = self.wh.reorder_suggestions(days=1)
+        self.assertEqual(sorted(units for _, units in suggestions), [38, 60])
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "reorder.csv")
+            export_reorder_list(self.wh.low_stock_items(), path, suggestions)
+            with open(path, newline="", encoding="utf-8") as f:
+                rows = list(csv.reader(f))
+        self.assertEqual(rows[1][1:], ["Clothing", "Hoodie", "7", "8", "1", "98"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import csv
+import os
+import tempfile
+import unittest
+import datetime
+from low_stock import export_reorder_list
+from products import ClothingProduct, ClothingStyle, ElectronicProduct, FoodProduct
+from tiering import cold_filename
+from warehouse import Warehouse
+
+
+class TestLowStock(unittest.TestCase):
+
+    def setUp(self):
+        self.wh = Warehouse("Test Warehouse")
+        self.apple = FoodProduct("Apple", 1.0, 10, "", datetime.date.today() + datetime.timedelta(days=5))
+        self.phone = ElectronicProduct("Phone", 500.0, 5, "", datetime.date.today() + datetime.timedelta(days=365))
+        self.shirt = ClothingProduct("T-Shirt", 20.0, 15, "", "M", "red")
+        self.wh.products = [self.apple, self.phone, self.shirt]
+
+    def test_untracked_products_are_never_low(self):
+        self.wh.sell(self.phone, 5)
+        self.assertEqual(self.wh.low_stock_items(), [])
+
+    def test_quantity_changes_move_products_in_and_out(self):
+        self.wh.set_reorder_level(self.apple, 5)
+        self.wh.set_reorder_level(self.phone, 4)
+        self.assertEqual(self.wh.low_stock_items(), [])
+
+        self.wh.sell(self.apple, 5)
+        self.wh.add_reservation(self.phone, 2, datetime.datetime.now() + datetime.timedelta(days=1))
+        self.assertEqual(self.wh.low_stock_items(), [self.phone, self.apple])
+        self.assertEqual(self.wh.low_stock_items(1), [self.phone])
+
+        self.wh.add_stock(self.phone, 10)
+        self.assertEqual(self.wh.low_stock_items(), [self.apple])
+        self.wh.set_reorder_level(self.apple, None)
+        self.assertEqual(self.wh.low_stock_items(), [])
+
+    def test_variant_sales_count_against_their_style(self):
+        style = ClothingStyle("Hoodie", 40.0, "", ["S", "M"], ["black"], stock={("S", "black"): 3, ("M", "black"): 3})
+        self.wh.insert_product(style)
+        self.wh.set_reorder_level(style.variant("S", "black"), 4)
+        self.assertEqual(self.wh.low_stock_items(), [])
+        self.wh.sell(style.variant("M", "black"), 2)
+        self.assertEqual(self.wh.low_stock_items(), [style])
+
+    def test_reorder_levels_survive_a_snapshot_and_block_page_out(self):
+        self.wh.set_reorder_level(self.shirt, 20)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "warehouse.pickle")
+            self.wh.save_snapshot(path)
+            loaded = Warehouse("Loaded")
+            loaded.open_cold_store(cold_filename(path))
+            loaded.load_snapshot(path)
+            shirt = loaded.find_by_name("T-Shirt")
+            self.assertEqual(loaded.low_stock_items(), [shirt])
+            loaded.sell(shirt, 15)
+            self.assertEqual(loaded.page_out(), [])
+            loaded.close_cold_store()
+
+    def test_export_reorder_list(self):
+        self.wh.set_reorder_level(self.shirt, 20)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "reorder.csv")
+            self.assertEqual(export_reorder_list(self.wh.low_stock_items(), path), 1)
+            with open(path, newline="", encoding="utf-8") as f:
+                rows = list(csv.reader(f))
+        self.assertEqual(rows[1][1:], ["Clothing", "T-Shirt", "15", "20", "5", "5"])
+
+
+if __name__ == "__main__":
+    unittest.main()
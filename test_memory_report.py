@@ -0,0 +1,63 @@
+import unittest
+import datetime
+import tracemalloc
+from memory_report import MemoryReport, deep_size, footprint
+from products import ClothingProduct, ElectronicProduct, FoodProduct
+from warehouse import Warehouse
+
+
+class TestMemoryReport(unittest.TestCase):
+
+    def setUp(self):
+        self.wh = Warehouse("Test Warehouse")
+        self.food = FoodProduct("Apple", 1.0, 10, "Fresh apples" * 50, datetime.date.today() +
+                                datetime.timedelta(days=5))
+        self.phone = ElectronicProduct("Phone", 500.0, 5, "Smartphone",
+                                       datetime.date.today() + datetime.timedelta(days=365))
+        self.shirt = ClothingProduct("T-Shirt", 20.0, 15, "Cotton t-shirt", "M", "red")
+        self.wh.products = [self.food, self.phone, self.shirt]
+
+    def test_deep_size_counts_shared_objects_once(self):
+        text = "x" * 1000
+        seen = set()
+        first = deep_size([text], seen)
+        self.assertGreater(first, 1000)
+        self.assertLess(deep_size([text], seen), 1000)
+
+    def test_footprint_by_type_and_attribute(self):
+        sections = footprint(self.wh)
+        self.assertEqual(sections["FoodProduct"]["count"], 1)
+        self.assertEqual(sections["ElectronicProduct"]["count"], 1)
+        self.assertEqual(sections["ClothingProduct"]["count"], 1)
+        food_attrs = sections["FoodProduct"]["attributes"]
+        self.assertEqual(max(food_attrs, key=food_attrs.get), "description")
+        self.assertIn("_by_bar_code", sections["Indexes and caches"]["attributes"])
+
+    def test_reservations_and_detached_copies(self):
+        self.wh.add_reservation(self.phone, 2, datetime.datetime.now() + datetime.timedelta(days=1))
+        self.wh.remove_product(self.phone)
+        sections = footprint(self.wh)
+        self.assertEqual(sections["Reservations"]["count"], 1)
+        self.assertEqual(sections["Detached reserved products"]["count"], 1)
+        self.assertNotIn("ElectronicProduct", sections)
+
+    def test_growth_between_reports(self):
+        tracemalloc.start()
+        try:
+            before = MemoryReport(self.wh)
+            for i in range(50):
+                self.wh.insert_product(ClothingProduct(f"Shirt {i}", 10.0, 1, "Generated " * 20, "S", "blue"))
+            after = MemoryReport(self.wh)
+        finally:
+            tracemalloc.stop()
+
+        growth = after.growth(before)
+        self.assertEqual(growth["ClothingProduct"]["count"], 50)
+        self.assertGreater(growth["ClothingProduct"]["attributes"]["description"], 0)
+        self.assertNotIn("FoodProduct", {name for name, row in growth.items() if row["bytes"]})
+        self.assertTrue(after.top_growth(before))
+        self.assertIn("Largest growth by source line", after.format(before))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+import datetime
+from money import Money
+from products import ElectronicProduct, FoodProduct
+from warehouse import Warehouse
+
+
+class TestMoney(unittest.TestCase):
+
+    def test_amounts_round_half_up_to_the_cent(self):
+        self.assertEqual(Money.of(0.1), 10)
+        self.assertEqual(Money.of(1.005), 101)
+        self.assertEqual(Money.of("19.99"), 1999)
+        self.assertEqual(Money.of(3), 300)
+        with self.assertRaises(ValueError):
+            Money.of(float("nan"))
+        with self.assertRaises(TypeError):
+            Money.of(True)
+
+    def test_prices_must_be_a_cent_once_rounded(self):
+        self.assertEqual(Money.of_price(0.005), 1)
+        for amount in (0.004, 0, -1):
+            with self.assertRaises(ValueError):
+                Money.of_price(amount)
+
+    def test_discounts_round_half_up(self):
+        self.assertEqual(Money(999).discounted(15), 849)
+        self.assertEqual(Money(1).discounted(50), 1)
+        self.assertEqual(Money(1000).discounted(12.5), 875)
+
+    def test_formatting_is_exact(self):
+        self.assertEqual(f"{Money(123456789012345678):.2f}", "1234567890123456.78")
+        self.assertEqual(str(Money(-5)), "-0.05")
+
+
+class TestWarehouseMoney(unittest.TestCase):
+
+    def setUp(self):
+        self.wh = Warehouse("Test Warehouse")
+        soon = datetime.date.today() + datetime.timedelta(days=5)
+        self.cheap = [FoodProduct(f"Candy {i}", 0.1, 3, "", soon) for i in range(10)]
+        self.phone = ElectronicProduct("Phone", 499.99, 7, "", soon)
+        self.wh.products = self.cheap + [self.phone]
+
+    def test_prices_that_round_to_zero_are_refused(self):
+        with self.assertRaises(ValueError):
+            ElectronicProduct("Sticker", 0.004, 1, "", datetime.date.today())
+        with self.assertRaises(ValueError):
+            self.wh.set_price(self.phone, 0.001)
+        self.assertEqual(self.phone.price, 499.99)
+
+    def test_totals_stay_exact_through_discounts(self):
+        self.assertEqual(self.wh.stats.total_cents, 10 * 30 + 7 * 49999)
+        for percent in (15, 33, 7, 0):
+            self.wh.apply_discount(self.phone, percent)
+        for product in self.cheap:
+            self.wh.apply_discount(product, 33)
+            self.wh.set_price(product, 0.1)
+        self.assertEqual(self.wh.stats.total_cents, 300 + 7 * 49999)
+        self.assertEqual(self.wh.stats.total_value, 3502.93)
+        self.assertEqual(self.wh.check_aggregates(), [])
+        self.assertEqual(self.wh.sell(self.phone, 3), 1499.97)
+
+    def test_price_bounds_never_admit_a_price_past_them(self):
+        self.assertEqual(self.wh.price_range(high=0.104), self.cheap)
+        self.assertEqual(self.wh.price_range(low=0.101), [self.phone])
+
+    def test_float_prices_from_old_pickles_become_cents(self):
+        state = dict(vars(self.phone))
+        del state["price_cents"], state["base_price_cents"]
+        state.update(price=19.99, base_price=24.99)
+        old = ElectronicProduct.__new__(ElectronicProduct)
+        old.__setstate__(state)
+        self.assertEqual((old.price_cents, old.base_price_cents), (1999, 2499))
+        self.assertEqual(old.price, 19.99)
+
+
+if __name__ == "__main__":
+    unittest.main()
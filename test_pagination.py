@@ -0,0 +1,82 @@
+import os
+import tempfile
+import unittest
+import datetime
+from pagination import KeysetIndex, decode_token, encode_token
+from products import ClothingProduct, ElectronicProduct, FoodProduct
+from warehouse import Warehouse
+
+
+class TestKeysetIndex(unittest.TestCase):
+
+    def test_repeated_keys_are_not_lost_between_pages(self):
+        index = KeysetIndex()
+        for value, key in enumerate([("a",), ("b",), ("b",), ("b",), ("c",)]):
+            index.add(key, value)
+        seen, token = [], None
+        while True:
+            page, token = index.page(2, token)
+            seen.extend(page)
+            if token is None:
+                break
+        self.assertEqual(seen, [0, 1, 2, 3, 4])
+
+    def test_token_round_trip_and_garbage(self):
+        self.assertEqual(decode_token(encode_token(("Food", "Apple", 7), 1)), (("Food", "Apple", 7), 1))
+        with self.assertRaises(ValueError):
+            decode_token("not a token")
+
+
+class TestWarehousePages(unittest.TestCase):
+
+    def setUp(self):
+        self.wh = Warehouse("Test Warehouse")
+        soon = datetime.date.today() + datetime.timedelta(days=5)
+        later = datetime.date.today() + datetime.timedelta(days=365)
+        self.products = [FoodProduct(f"Food {i:02d}", 1.0, 5, "", soon) for i in range(7)]
+        self.products += [ElectronicProduct(f"Gadget {i:02d}", 50.0, 2, "", later) for i in range(3)]
+        self.products.append(ClothingProduct("T-Shirt", 20.0, 15, "", "M", "red"))
+        self.wh.products = list(reversed(self.products))
+
+    def _all_pages(self, fetch, size, category=None):
+        names, token = [], None
+        while True:
+            page = fetch(size, token, category)
+            names.extend(r.name for r in page.items)
+            if page.token is None:
+                return names
+            token = page.token
+
+    def test_pages_follow_type_name_order(self):
+        gadgets = [f"Gadget {i:02d}" for i in range(3)]
+        self.assertEqual(self._all_pages(self.wh.page_products, 3),
+                         ["T-Shirt"] + gadgets + [f"Food {i:02d}" for i in range(7)])
+        self.assertEqual(self._all_pages(self.wh.page_products, 4, "Electronic"), gadgets)
+
+    def test_pages_stay_stable_while_stock_changes(self):
+        page = self.wh.page_products(5)
+        names = [r.name for r in page.items]
+        self.wh.remove_product(self.products[0])
+        self.wh.set_price(self.products[5], 9.0)
+        while page.token is not None:
+            page = self.wh.page_products(5, page.token)
+            names.extend(r.name for r in page.items)
+        self.assertEqual(names, ["T-Shirt", "Gadget 00", "Gadget 01", "Gadget 02"] +
+                         [f"Food {i:02d}" for i in range(7)])
+
+    def test_reservations_are_paged_after_a_reload(self):
+        pickup = datetime.datetime.now() + datetime.timedelta(days=1)
+        for product in self.products[:4]:
+            self.wh.add_reservation(product, 1, pickup)
+        self.wh.add_reservation(self.products[0], 1, pickup)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "warehouse.pickle")
+            self.wh.save_snapshot(path)
+            loaded = Warehouse("Loaded")
+            loaded.load_snapshot(path)
+        names = self._all_pages(loaded.page_reservations, 2)
+        self.assertEqual(names, ["Food 00", "Food 00", "Food 01", "Food 02", "Food 03"])
+
+
+if __name__ == "__main__":
+    unittest.main()
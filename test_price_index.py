@@ -0,0 +1,65 @@
+import unittest
+import datetime
+from price_index import SortedIndex
+from products import ClothingProduct, ClothingStyle, ElectronicProduct, FoodProduct
+from warehouse import Warehouse
+
+
+class TestSortedIndex(unittest.TestCase):
+
+    def test_between_and_ends(self):
+        index = SortedIndex()
+        for code, key in enumerate([5.0, 1.0, 3.0, 3.0, 9.0]):
+            index.add(key, code)
+        self.assertEqual(index.between(3.0, 5.0), [2, 3, 0])
+        self.assertEqual(index.between(None, 2.0), [1])
+        self.assertEqual(index.between(6.0, None), [4])
+        self.assertEqual(index.smallest(2), [1, 2])
+        self.assertEqual(index.largest(2), [4, 0])
+        index.discard(3.0, 2)
+        index.discard(4.0, 2)
+        self.assertEqual(index.between(3.0, 3.0), [3])
+
+
+class TestWarehousePriceIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.wh = Warehouse("Test Warehouse")
+        later = datetime.date.today() + datetime.timedelta(days=365)
+        self.apple = FoodProduct("Apple", 1.0, 100, "", datetime.date.today() + datetime.timedelta(days=5))
+        self.phone = ElectronicProduct("Phone", 500.0, 5, "", later)
+        self.radio = ElectronicProduct("Radio", 120.0, 2, "", later)
+        self.cable = ElectronicProduct("Cable", 8.0, 40, "", later)
+        self.shirt = ClothingProduct("T-Shirt", 20.0, 15, "", "M", "red")
+        self.wh.products = [self.apple, self.phone, self.radio, self.cable, self.shirt]
+
+    def test_range_and_top_queries(self):
+        self.assertEqual(self.wh.price_range(100, 500, "Electronic"), [self.radio, self.phone])
+        self.assertEqual(self.wh.cheapest(1, "Food"), [self.apple])
+        self.assertEqual(self.wh.top_by_value(2), [self.phone, self.cable])
+
+    def test_indexes_follow_price_and_quantity_changes(self):
+        self.wh.apply_discount(self.phone, 90)
+        self.assertEqual(self.wh.price_range(100, 500, "Electronic"), [self.radio])
+        self.wh.sell(self.cable, 39)
+        self.wh.set_price(self.shirt, 200.0)
+        self.assertEqual(self.wh.top_by_value(3), [self.shirt, self.phone, self.radio])
+
+        self.wh.remove_product(self.radio)
+        self.assertEqual(self.wh.price_range(100, None), [self.shirt])
+        food = FoodProduct("Bread", 3.0, 1, "", datetime.date.today() + datetime.timedelta(days=2))
+        self.wh.insert_product(food)
+        self.assertEqual(self.wh.cheapest(2, "Food"), [self.apple, food])
+
+    def test_selling_a_variant_rekeys_its_style(self):
+        style = ClothingStyle("Hoodie", 40.0, "", ["S", "M"], ["black"], stock={("S", "black"): 4, ("M", "black"): 4})
+        self.wh.insert_product(style)
+        self.assertEqual(self.wh.top_by_value(1, "Clothing"), [style])
+        self.wh.sell(style.variant("M", "black"), 3)
+        self.assertEqual(self.wh.top_by_value(2, "Clothing"), [self.shirt, style])
+        self.wh.set_price(style.variant("S", "black"), 100.0)
+        self.assertEqual(self.wh.price_range(50, 150), [style, self.radio])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+import datetime
+from unittest import mock
+from products import ClothingProduct, ElectronicProduct, FoodProduct
+from query import Query, looks_like_query
+from warehouse import Warehouse
+
+
+class TestQuery(unittest.TestCase):
+
+    def setUp(self):
+        self.wh = Warehouse("Test Warehouse")
+        today = datetime.date.today()
+        self.soon = today + datetime.timedelta(days=3)
+        self.foods = [FoodProduct(f"Milk {i}", 2.0, i, "", self.soon if i % 2 else today + datetime.timedelta(days=60))
+                      for i in range(1, 21)]
+        self.phone = ElectronicProduct("Phone", 500.0, 5, "", today + datetime.timedelta(days=365))
+        self.radio = ElectronicProduct("Old Radio", 120.0, 2, "", today + datetime.timedelta(days=2))
+        self.shirt = ClothingProduct("T-Shirt", 20.0, 15, "", "M", "red")
+        self.wh.products = self.foods + [self.phone, self.radio, self.shirt]
+
+    def test_parse_errors(self):
+        for text in ("", "colour=red", "price~10", "type=Toys", "expires<tomorrow", "qty<10 or qty>20",
+                     "price<"):
+            with self.assertRaises(ValueError, msg=text):
+                Query(text)
+
+    def test_example_expression(self):
+        limit = (self.soon + datetime.timedelta(days=1)).isoformat()
+        result = self.wh.query(f"type=Food and expires<{limit} and qty<10")
+        self.assertEqual([p.name for p in result.products], ["Milk 1", "Milk 3", "Milk 5", "Milk 7", "Milk 9"])
+
+    def test_planner_picks_the_narrowest_path(self):
+        self.assertEqual(self.wh.query("price>=100 and price<=500").plan.path, "price index")
+        self.assertEqual(self.wh.query("type=Electronic and name~radio").plan.path, "type partition (Electronic)")
+        limit = (datetime.date.today() + datetime.timedelta(days=2)).isoformat()
+        result = self.wh.query(f"expires<={limit}")
+        self.assertEqual(result.plan.path, "date index")
+        self.assertEqual(result.plan.candidates, 1)
+        self.assertEqual(result.products, [self.radio])
+        self.assertEqual(self.wh.query("qty>10").plan.path, "full scan")
+
+    def test_indexes_follow_changes(self):
+        self.wh.apply_discount(self.phone, 90)
+        self.assertEqual(self.wh.query("price>=100").products, [self.radio])
+        self.wh.sell(self.foods[0], 1)
+        self.wh.add_stock(self.foods[0], 4, self.soon + datetime.timedelta(days=30))
+        self.assertNotIn(self.foods[0], self.wh.query(f"expires<={self.soon.isoformat()}").products)
+
+    def test_bulk_discount_and_removal(self):
+        discounted = self.wh.discount_where("type=Electronic and price>100", 10)
+        self.assertEqual(sorted(p.price for p in discounted), [108.0, 450.0])
+        removed = self.wh.remove_where("name='T-Shirt'")
+        self.assertEqual(removed, [self.shirt])
+        self.assertNotIn(self.shirt, self.wh.products)
+        self.assertEqual(self.wh.check_aggregates(), [])
+
+    def test_console_asks_before_changing_matches(self):
+        with mock.patch("builtins.input", side_effect=["type=Electronic", "n"]), mock.patch("builtins.print"):
+            Warehouse.delete_product.__wrapped__(self.wh)
+        self.assertIn(self.phone, self.wh.products)
+        with mock.patch("builtins.input", side_effect=["type=Electronic", "50", "y"]) as answers, \
+                mock.patch("builtins.print"):
+            Warehouse.add_discount.__wrapped__(self.wh)
+        self.assertEqual(answers.call_args.args[0],
+                         "Apply a 50% discount to 2 product(s) matching 'type=Electronic'? (y/N): ")
+        self.assertEqual(self.phone.price, 250.0)
+        with mock.patch("builtins.input", side_effect=["type=Electronic", "y"]), mock.patch("builtins.print"):
+            Warehouse.delete_product.__wrapped__(self.wh)
+        self.assertNotIn(self.phone, self.wh.products)
+        self.assertNotIn(self.radio, self.wh.products)
+
+    def test_looks_like_query(self):
+        self.assertTrue(looks_like_query("qty<10"))
+        self.assertFalse(looks_like_query("2000000000015"))
+
+
+if __name__ == "__main__":
+    unittest.main()
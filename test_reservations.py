@@ -0,0 +1,200 @@
+import os
+import pickle
+import tempfile
+import unittest
+import datetime
+from cluster import WarehouseCluster
+from products import ElectronicProduct, FoodProduct
+from warehouse import Warehouse, format_reservation_id, parse_reservation_id
+
+
+class TestReservationIds(unittest.TestCase):
+
+    def test_ids_print_in_base_36_and_read_back(self):
+        self.assertEqual(format_reservation_id(1), "R1")
+        self.assertEqual(format_reservation_id(35), "RZ")
+        self.assertEqual(format_reservation_id(1295), "RZZ")
+        for number in (1, 36, 46655, 10 ** 9):
+            self.assertEqual(parse_reservation_id(format_reservation_id(number)), number)
+        self.assertEqual(parse_reservation_id(" r1f "), 51)
+        self.assertEqual(parse_reservation_id(51), 51)
+        for bad in ("", "R", "R-1", "X12", "Alice"):
+            with self.assertRaises(ValueError):
+                parse_reservation_id(bad)
+
+
+class TestReservationPickup(unittest.TestCase):
+
+    def setUp(self):
+        self.wh = Warehouse("Test Warehouse")
+        today = datetime.date.today()
+        self.apple = FoodProduct("Apple", 1.5, 10, "", today + datetime.timedelta(days=5))
+        self.phone = ElectronicProduct("Phone", 500.0, 5, "", today + datetime.timedelta(days=365))
+        self.wh.products = [self.apple, self.phone]
+        self.pickup = datetime.datetime.now() + datetime.timedelta(days=1)
+
+    def test_reservations_are_found_by_id(self):
+        self.wh.add_stock(self.apple, 30)
+        reservations = [self.wh.add_reservation(self.apple, 1, self.pickup) for _ in range(40)]
+        self.assertEqual([r["id"] for r in reservations], list(range(1, 41)))
+        self.assertIs(self.wh.reservation("R14"), reservations[39])
+        self.assertIs(self.wh.reservation(7), reservations[6])
+        self.assertIsNone(self.wh.reservation("R99"))
+
+    def test_pickup_records_a_sale_without_touching_stock(self):
+        reservation = self.wh.add_reservation(self.phone, 2, self.pickup, "Alice")
+        self.wh.set_price(self.phone, 450.0)
+        self.assertEqual(self.wh.pickup_reservation(format_reservation_id(reservation["id"])), 900.0)
+        self.assertEqual(self.phone.quantity, 3)
+        self.assertEqual(self.wh.reserved_products, [])
+        self.assertEqual(self.wh.reservations_of("Alice"), [])
+        self.assertEqual(self.wh.ledger.demand(1), {self.phone.bar_code: 2})
+        self.assertEqual(self.wh.check_aggregates(), [])
+        with self.assertRaises(KeyError):
+            self.wh.pickup_reservation(reservation["id"])
+
+    def test_cancel_returns_units_to_their_lots(self):
+        today = datetime.date.today()
+        self.wh.add_stock(self.apple, 4, today + datetime.timedelta(days=9))
+        reservation = self.wh.add_reservation(self.apple, 12, self.pickup)
+        self.assertEqual(self.apple.quantity, 2)
+        self.wh.cancel_reservation(reservation["id"])
+        self.assertEqual(self.apple.lot_summary(), [(today + datetime.timedelta(days=5), 10),
+                                                    (today + datetime.timedelta(days=9), 4)])
+        self.assertEqual(len(self.wh.ledger), 0)
+        self.assertEqual(self.wh.check_aggregates(), [])
+
+    def test_cancel_writes_off_lots_that_expired_while_reserved(self):
+        today = datetime.date.today()
+        reservation = self.wh.add_reservation(self.apple, 3, self.pickup)
+        reservation["lots"] = [(today - datetime.timedelta(days=1), 1), (today + datetime.timedelta(days=5), 2)]
+        self.assertEqual(self.wh.cancel_reservation(reservation["id"]), 1)
+        self.assertEqual(self.apple.quantity, 9)
+        self.assertIsNone(self.wh.reservation(reservation["id"]))
+        self.assertEqual(self.wh.check_aggregates(), [])
+
+    def test_cancel_keeps_the_reservation_when_units_cannot_be_restocked(self):
+        reservation = self.wh.add_reservation(self.apple, 10, self.pickup)
+        # A reservation saved before lots were recorded, of food whose date has since passed
+        del reservation["lots"]
+        self.apple._expiration_date = datetime.date.today() - datetime.timedelta(days=1)
+        with self.assertRaises(ValueError):
+            self.wh.cancel_reservation(reservation["id"])
+        self.assertIs(self.wh.reservation(reservation["id"]), reservation)
+        self.assertEqual(self.wh.reserved_quantity(self.apple.bar_code), 10)
+
+    def test_cancel_brings_back_a_product_deleted_while_reserved(self):
+        reservation = self.wh.add_reservation(self.phone, 5, self.pickup)
+        self.wh.remove_product(self.phone)
+        self.wh.cancel_reservation(reservation["id"])
+        self.assertEqual(self.wh.find_by_bar_code(self.phone.bar_code).quantity, 5)
+
+    def test_customer_lookup_ignores_case_and_spacing(self):
+        first = self.wh.add_reservation(self.apple, 1, self.pickup, "  Ana   María ")
+        self.wh.add_reservation(self.phone, 1, self.pickup, "Bob")
+        second = self.wh.add_reservation(self.phone, 1, self.pickup, "ana maría")
+        self.assertEqual(first["customer"], "Ana María")
+        self.assertEqual(self.wh.reservations_of("ANA MARÍA"), [first, second])
+        self.wh.cancel_reservation(first["id"])
+        self.assertEqual(self.wh.reservations_of("Ana María"), [second])
+
+    def test_ids_and_customers_survive_a_reload(self):
+        self.wh.add_reservation(self.apple, 1, self.pickup)
+        kept = self.wh.add_reservation(self.phone, 1, self.pickup, "Alice")
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "warehouse.pickle")
+            self.wh.save_snapshot(path)
+            loaded = Warehouse("Loaded")
+            loaded.load_snapshot(path)
+        self.assertEqual(loaded.reservations_of("alice")[0]["id"], kept["id"])
+        self.assertEqual(loaded.add_reservation(loaded.find_by_name("Apple"), 1, self.pickup)["id"], 3)
+
+    def test_reservations_without_ids_are_numbered(self):
+        self.wh.next_reservation_id = 5
+        self.wh.reserved_products = [{"product": self.apple, "quantity": 1, "pickup_datetime": self.pickup},
+                                     {"id": 9, "product": self.phone, "quantity": 1, "pickup_datetime": self.pickup}]
+        self.assertEqual([r["id"] for r in self.wh.reserved_products], [5, 9])
+        self.assertEqual(self.wh.add_reservation(self.apple, 1, self.pickup)["id"], 10)
+
+
+class TestClusterReservations(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cluster = WarehouseCluster(["North", "South", "East"], self.tmp.name)
+        self.pickup = datetime.datetime.now() + datetime.timedelta(days=1)
+        for shard in self.cluster.shards:
+            shard.insert_product(ElectronicProduct("Phone", 500.0, 5, "", datetime.date.today()))
+
+    def tearDown(self):
+        self.cluster.close()
+        self.tmp.cleanup()
+
+    def test_ids_route_to_the_site_that_issued_them(self):
+        for shard in self.cluster.shards:
+            for _ in range(3):
+                reservation = shard.add_reservation(shard.find_by_name("Phone"), 1, self.pickup, "Alice")
+                self.assertIs(self.cluster.shard_for_reservation(format_reservation_id(reservation["id"])), shard)
+        found = self.cluster.reservations_of("alice")
+        self.assertEqual(len(found), 9)
+        self.assertEqual(len({r["id"] for _, r in found}), 9)
+
+    def test_reloaded_sites_keep_their_lanes(self):
+        north = self.cluster.shards[0]
+        north.add_reservation(north.find_by_name("Phone"), 1, self.pickup)
+        self.cluster.save()
+        reloaded = WarehouseCluster(["North", "South", "East"], self.tmp.name)
+        reloaded.load()
+        try:
+            shard = reloaded.shards[0]
+            reservation = shard.add_reservation(shard.find_by_name("Phone"), 1, self.pickup)
+            self.assertEqual(reservation["id"], 4)
+            self.assertIs(reloaded.shard_for_reservation(reservation["id"]), shard)
+        finally:
+            reloaded.close()
+
+    def test_snapshots_without_ids_are_numbered_on_each_sites_lane(self):
+        for shard in self.cluster.shards:
+            shard.add_reservation(shard.find_by_name("Phone"), 1, self.pickup)
+            state = shard._snapshot_state()
+            # As written before reservations had IDs: no ID counter, and references end after the lots
+            del state["next_reservation_id"], state["reservation_id_step"]
+            state["reservations"] = [reference[:4] for reference in state["reservations"]]
+            with open(self.cluster.path_of(shard), "wb") as f:
+                pickle.dump(state, f)
+        reloaded = WarehouseCluster(["North", "South", "East"], self.tmp.name)
+        reloaded.load()
+        try:
+            found = [(shard, r) for shard in reloaded.shards for r in shard.reserved_products]
+            self.assertEqual(sorted(r["id"] for _, r in found), [1, 2, 3])
+            for shard, reservation in found:
+                self.assertIs(reloaded.shard_for_reservation(reservation["id"]), shard)
+                self.assertIs(shard.reservation(reservation["id"]), reservation)
+            north = reloaded.shards[0]
+            self.assertEqual(north.add_reservation(north.find_by_name("Phone"), 1, self.pickup)["id"], 4)
+        finally:
+            reloaded.close()
+
+    def test_issued_ids_are_kept_when_a_site_is_added(self):
+        north = self.cluster.shards[0]
+        issued = [north.add_reservation(north.find_by_name("Phone"), 1, self.pickup)["id"] for _ in range(2)]
+        self.assertEqual(issued, [1, 4])
+        self.cluster.save()
+        grown = WarehouseCluster(["North", "South", "East", "West"], self.tmp.name)
+        grown.load()
+        try:
+            north = grown.shards[0]
+            self.assertEqual([r["id"] for r in north.reserved_products], issued)
+            for number in issued:
+                self.assertIs(grown.shard_for_reservation(format_reservation_id(number)), north)
+            grown.shards[3].insert_product(ElectronicProduct("Phone", 500.0, 5, "", datetime.date.today()))
+            new = [shard.add_reservation(shard.find_by_name("Phone"), 1, self.pickup)["id"] for shard in grown.shards]
+            self.assertTrue(all(number > max(issued) for number in new))
+            for shard, number in zip(grown.shards, new):
+                self.assertIs(grown.shard_for_reservation(number), shard)
+        finally:
+            grown.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
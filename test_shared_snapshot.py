@@ -0,0 +1,70 @@
+import os
+import subprocess
+import sys
+import unittest
+import datetime
+import tempfile
+from products import FoodProduct, ElectronicProduct, ClothingStyle
+from shared_snapshot import SnapshotPublisher, SnapshotReader, valuation, search, export_csv, run_reports
+from warehouse import Warehouse
+
+
+class TestSharedSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.wh = Warehouse("Shared")
+        self.expiry = datetime.date.today() + datetime.timedelta(days=3)
+        self.wh.insert_product(FoodProduct("Cheese", 4.0, 10, "", self.expiry))
+        self.wh.insert_product(ElectronicProduct("Kettle", 25.0, 2, "", self.expiry))
+        self.wh.insert_product(ClothingStyle("Socks", 3.0, "", ["S", "L"], ["white"], stock={("L", "white"): 5}))
+        self.publisher = SnapshotPublisher(self.wh)
+
+    def tearDown(self):
+        self.publisher.close()
+
+    def test_columns_match_the_warehouse(self):
+        name = self.publisher.publish()
+        with SnapshotReader(name) as snap:
+            self.assertEqual(snap.rows, 4)
+            self.assertEqual([snap.name(r) for r in range(snap.rows)],
+                             ["Cheese", "Kettle", "Socks (S/white)", "Socks (L/white)"])
+            self.assertEqual(list(snap.quantities), [10, 2, 0, 5])
+            self.assertEqual(snap.expires_on(0), self.expiry)
+            self.assertEqual(snap.category(3), "Clothing")
+
+    def test_republish_only_after_changes(self):
+        first = self.publisher.publish()
+        self.assertEqual(self.publisher.publish(), first)
+        self.wh.sell(self.wh.find_by_name("Cheese"), 4)
+        second = self.publisher.publish()
+        self.assertNotEqual(second, first)
+        self.assertEqual(valuation(second)["total_value"], 6 * 4.0 + 2 * 25.0 + 5 * 3.0)
+
+    def test_reports_in_worker_processes(self):
+        name = self.publisher.publish()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "stock.csv")
+            value, hits, exported = run_reports(name, [(valuation,), (search, "sock"), (export_csv, path)],
+                                                max_workers=2)
+            with open(path, encoding="utf-8") as f:
+                lines = f.read().splitlines()
+
+        self.assertAlmostEqual(value["value_by_category"]["Food"], 40.0)
+        self.assertEqual(len(hits), 2)
+        self.assertEqual(exported, 4)
+        self.assertEqual(len(lines), 5)
+
+    def test_segment_survives_separate_reader_processes(self):
+        name = self.publisher.publish()
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "shared_snapshot.py")
+        for _ in range(2):
+            done = subprocess.run([sys.executable, script, name, "valuation"], capture_output=True, text=True)
+            self.assertEqual(done.returncode, 0, done.stderr)
+            self.assertIn("/=== Total: 105.00 ===/", done.stdout)
+            self.assertNotIn("leaked", done.stderr)
+        with SnapshotReader(name) as snap:
+            self.assertEqual(snap.rows, 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+import os
+import tempfile
+import unittest
+import datetime
+from barcodes import format_bar_code
+from products import ClothingProduct, ClothingStyle, ElectronicProduct, FoodProduct
+from warehouse import Warehouse
+
+
+class TestTiering(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cold_path = os.path.join(self.tmp.name, "cold")
+        self.wh = Warehouse("Test Warehouse")
+        self.wh.open_cold_store(self.cold_path)
+        self.food = FoodProduct("Apple", 1.0, 10, "Fresh apples", datetime.date.today() +
+                                datetime.timedelta(days=5))
+        self.sold_out = ElectronicProduct("Phone", 500.0, 0, "Smartphone",
+                                          datetime.date.today() + datetime.timedelta(days=365))
+        self.shirt = ClothingProduct("T-Shirt", 20.0, 15, "Cotton t-shirt", "M", "red")
+        self.wh.products = [self.food, self.sold_out, self.shirt]
+
+    def tearDown(self):
+        self.wh.close_cold_store()
+        self.tmp.cleanup()
+
+    def test_sold_out_products_are_paged_out_and_faulted_back(self):
+        self.assertEqual(self.wh.page_out(), [self.sold_out])
+        self.assertNotIn(self.sold_out, self.wh.products)
+        self.assertEqual(len(self.wh.cold), 1)
+
+        found = self.wh.find_by_bar_code(format_bar_code(self.sold_out.bar_code))
+        self.assertEqual(found.name, "Phone")
+        self.assertIn(found, self.wh.products)
+        self.assertEqual(len(self.wh.cold), 0)
+
+    def test_changes_to_a_paged_out_copy_do_not_fault_it_in(self):
+        self.wh.page_out()
+        self.wh.set_price(self.sold_out, 450.0)
+        self.assertEqual(len(self.wh.cold), 1)
+        self.assertNotIn(self.sold_out, self.wh.products)
+
+    def test_reorder_suggestions_read_paged_out_items_in_place(self):
+        style = ClothingStyle("Hoodie", 40.0, "", ["S", "M"], ["black"], stock={("S", "black"): 2})
+        self.wh.insert_product(style)
+        self.wh.sell(style.variant("S", "black"), 2)
+        self.wh.add_stock(self.sold_out, 1)
+        self.wh.sell(self.sold_out, 1)
+        self.wh.page_out()
+        self.wh.saved_change_count = self.wh.change_count
+        suggestions = self.wh.reorder_suggestions(days=1)
+        self.assertEqual(sorted((item.name, item.quantity) for item, _ in suggestions),
+                         [("Hoodie (S/black)", 0), ("Phone", 0)])
+        self.assertEqual(len(self.wh.cold), 2)
+        self.assertFalse(self.wh.dirty)
+
+    def test_identical_product_merges_into_a_paged_out_one(self):
+        self.wh.page_out()
+        again = ElectronicProduct("Phone", 500.0, 3, "", self.sold_out.warranty_date)
+        merged = self.wh.insert_product(again)
+        self.assertEqual(merged.bar_code, self.sold_out.bar_code)
+        self.assertEqual(merged.quantity, 3)
+        self.assertEqual(len(self.wh.cold), 0)
+        self.assertEqual(self.wh.check_aggregates(), [])
+
+    def test_identity_keys_survive_reopening_the_cold_store(self):
+        self.wh.page_out()
+        self.wh.close_cold_store()
+        self.wh.open_cold_store(self.cold_path)
+        again = ElectronicProduct("Phone", 500.0, 1, "", self.sold_out.warranty_date)
+        self.assertEqual(self.wh.find_identical(again).bar_code, self.sold_out.bar_code)
+
+    def test_idle_products_are_paged_out(self):
+        now = datetime.datetime.now()
+        self.wh.activity.touch(self.shirt, now - datetime.timedelta(days=100))
+        self.wh.sell(self.food, 1)
+        paged = self.wh.page_out(idle_days=90, now=now)
+        self.assertEqual(sorted(p.name for p in paged), ["Phone", "T-Shirt"])
+        self.assertEqual(self.wh.find_by_name("T-Shirt").quantity, 15)
+
+    def test_reserved_products_stay_resident(self):
+        self.wh.add_reservation(self.shirt, 15, datetime.datetime.now() + datetime.timedelta(days=1))
+        self.assertEqual(self.wh.page_out(), [self.sold_out])
+        self.assertIn(self.shirt, self.wh.products)
+
+    def test_totals_cover_cold_stock(self):
+        now = datetime.datetime.now()
+        total = self.wh.stats.total_value
+        self.wh.activity.touch(self.shirt, now - datetime.timedelta(days=100))
+        self.wh.page_out(idle_days=90, now=now)
+        self.assertAlmostEqual(self.wh.stats.total_value, total)
+        self.assertEqual(self.wh.check_aggregates(), [])
+
+    def test_cold_store_survives_a_restart(self):
+        style = ClothingStyle("Jeans", 40.0, "Denim", ["S", "M"], ["blue"])
+        self.wh.insert_product(style)
+        self.wh.page_out()
+        snapshot = os.path.join(self.tmp.name, "warehouse.pickle")
+        self.wh.save_snapshot(snapshot)
+        self.wh.close_cold_store()
+
+        reopened = Warehouse("Test Warehouse")
+        reopened.open_cold_store(self.cold_path)
+        reopened.load_snapshot(snapshot)
+        self.assertEqual(sorted(p.name for p in reopened.products), ["Apple", "T-Shirt"])
+        self.assertEqual(reopened.check_aggregates(), [])
+        variant = reopened.find_by_bar_code(style.variant("M", "blue").bar_code)
+        self.assertEqual(variant.name, "Jeans (M/blue)")
+        self.assertEqual(reopened.find_by_name("Phone").price, 500.0)
+        reopened.close_cold_store()
+
+    def test_sweeps_fault_in_due_products(self):
+        self.wh.page_out()
+        phone = self.wh.cold.take(self.sold_out.bar_code)
+        phone.warranty_date = datetime.date.today() - datetime.timedelta(days=1)
+        self.wh.cold.put(phone)
+        removed = self.wh.remove_out_of_warranty()
+        self.assertEqual([p.name for p in removed], ["Phone"])
+        self.assertEqual(len(self.wh.cold), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
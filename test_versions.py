@@ -0,0 +1,94 @@
+import unittest
+import datetime
+from products import ClothingStyle, ElectronicProduct, FoodProduct
+from warehouse import Warehouse
+
+
+class TestVersionedStore(unittest.TestCase):
+
+    def setUp(self):
+        self.wh = Warehouse("Test Warehouse")
+        self.food = FoodProduct("Apple", 1.0, 10, "Fresh apples", datetime.date.today() +
+                                datetime.timedelta(days=5))
+        self.phone = ElectronicProduct("Phone", 500.0, 5, "Smartphone",
+                                       datetime.date.today() + datetime.timedelta(days=365))
+        self.wh.products = [self.food, self.phone]
+
+    def test_view_is_stable_while_writers_continue(self):
+        with self.wh.view() as view:
+            self.wh.sell(self.food, 4)
+            self.wh.set_price(self.phone, 450.0)
+            self.wh.remove_product(self.phone)
+
+            self.assertEqual(view.record(self.food.bar_code).quantity, 10)
+            self.assertEqual(view.record(self.phone.bar_code).price, 500.0)
+            self.assertEqual(len(view), 2)
+
+        with self.wh.view() as later:
+            self.assertEqual(later.record(self.food.bar_code).quantity, 6)
+            self.assertIsNone(later.record(self.phone.bar_code))
+
+    def test_versions_are_reclaimed_when_readers_release(self):
+        store = self.wh.versions
+        first = self.wh.view()
+        second = self.wh.view()
+        self.wh.sell(self.food, 1)
+        third = self.wh.view()
+        self.assertEqual(store.live_versions(), {first.version: 2, third.version: 1})
+        self.assertGreater(third.version, first.version)
+
+        first.release()
+        first.release()
+        second.release()
+        third.release()
+        self.assertEqual(store.live_versions(), {})
+
+    def test_writes_without_readers_do_not_copy(self):
+        version = self.wh.versions.version
+        self.wh.sell(self.food, 1)
+        self.wh.sell(self.food, 1)
+        self.assertEqual(self.wh.versions.version, version)
+
+    def test_writes_stop_copying_once_every_view_is_released(self):
+        store = self.wh.versions
+        with self.wh.view() as view:
+            self.assertEqual(view.record(self.food.bar_code).quantity, 10)
+        version, records = store.version, store._records
+        self.wh.sell(self.food, 1)
+        self.wh.set_price(self.phone, 450.0)
+        self.assertEqual(store.version, version)
+        self.assertIs(store._records, records)
+
+    def test_reservations_and_held_units(self):
+        pickup = datetime.datetime.now() + datetime.timedelta(days=1)
+        reservation = self.wh.add_reservation(self.food, 3, pickup)
+        with self.wh.view() as view:
+            [record] = view.reservations()
+            self.assertEqual((record.name, record.quantity, record.pickup_datetime), ("Apple", 3, pickup))
+            self.assertEqual(view.record(self.food.bar_code).held, 3)
+            self.wh.drop_reservation(reservation)
+            self.assertEqual(len(list(view.reservations())), 1)
+        with self.wh.view() as view:
+            self.assertEqual(list(view.reservations()), [])
+            self.assertEqual(view.record(self.food.bar_code).held, 0)
+
+    def test_style_records_carry_their_variants(self):
+        style = ClothingStyle("Jeans", 40.0, "Denim", ["S", "M"], ["blue"], stock={("M", "blue"): 4})
+        self.wh.insert_product(style)
+        self.wh.sell(style.variant("M", "blue"), 1)
+        with self.wh.view() as view:
+            record = view.record(style.bar_code)
+            self.assertEqual([(v.name, v.quantity) for v in record.variants],
+                             [("Jeans (S/blue)", 0), ("Jeans (M/blue)", 3)])
+            self.assertEqual(len(list(view.items())), 4)
+
+    def test_reload_starts_a_fresh_version(self):
+        with self.wh.view() as view:
+            self.wh.products = [self.phone]
+            self.assertEqual(len(view), 2)
+        with self.wh.view() as view:
+            self.assertEqual([r.name for r in view.products()], ["Phone"])
+
+
+if __name__ == "__main__":
+    unittest.main()
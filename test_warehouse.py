@@ -1,7 +1,13 @@
+import copy
+import os
+import pickle
+import tempfile
 import unittest
+import uuid
 import datetime
+from barcodes import format_bar_code, is_valid_ean13
 from warehouse import Warehouse
-from products import FoodProduct, ElectronicProduct, ClothingProduct
+from products import FoodProduct, ElectronicProduct, ClothingProduct, ClothingStyle, date_header, kind_of
 from decorators import execute_only_at_night_time
 
 class TestWarehouse(unittest.TestCase):
@@ -55,5 +61,341 @@ class TestWarehouse(unittest.TestCase):
         product.price = product.price * (1 - discount_percent / 100)
         self.assertEqual(product.price, original_price * 0.9)
 
+    def test_products_get_integer_bar_codes(self):
+        codes = [p.bar_code for p in self.wh.products]
+        self.assertTrue(all(isinstance(c, int) and is_valid_ean13(c) for c in codes))
+        self.assertEqual(len(set(codes)), len(codes))
+
+    def test_find_by_bar_code(self):
+        self.assertIs(self.wh.find_by_bar_code(self.food.bar_code), self.food)
+        self.assertIs(self.wh.find_by_bar_code(format_bar_code(self.electronic.bar_code)), self.electronic)
+        self.assertIsNone(self.wh.find_by_bar_code("garbage"))
+
+    def test_load_legacy_uuid_file(self):
+        old_code = str(uuid.uuid4())
+        self.clothing.bar_code = old_code
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "legacy.pickle")
+            with open(path, "wb") as f:
+                pickle.dump([self.clothing], f)
+            wh = Warehouse("Legacy")
+            wh.load_products(path)
+
+        migrated = wh.products[0]
+        self.assertIsInstance(migrated.bar_code, int)
+        self.assertIs(wh.find_by_bar_code(old_code), migrated)
+
+    def test_allocator_persists_with_products(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "products.pickle")
+            self.wh.save_products(path)
+            wh = Warehouse("Reloaded")
+            wh.load_products(path)
+        new_product = wh.insert_product(ClothingProduct("Socks", 2.0, 3, "", "S", "black"))
+        self.assertNotIn(new_product.bar_code, [p.bar_code for p in self.wh.products])
+
+    def _reserve(self, product, quantity, days=1):
+        pickup = datetime.datetime.now() + datetime.timedelta(days=days)
+        return self.wh.add_reservation(product, quantity, pickup)
+
+    def test_reserved_quantity_counters(self):
+        first = self._reserve(self.food, 2)
+        self._reserve(self.food, 3)
+        self.assertEqual(self.food.quantity, 5)
+        self.assertEqual(self.wh.reserved_quantity(self.food.bar_code), 5)
+        self.assertEqual(len(self.wh.reservations_for(self.food.bar_code)), 2)
+
+        self.wh.drop_reservation(first)
+        self.assertEqual(self.wh.reserved_quantity(self.food.bar_code), 3)
+        self.assertEqual(self.wh.reserved_quantity(self.electronic.bar_code), 0)
+
+    def test_expire_reservations_updates_counters(self):
+        self._reserve(self.clothing, 4, days=-1)
+        kept = self._reserve(self.clothing, 1)
+        expired = self.wh.expire_reservations()
+        self.assertEqual(len(expired), 1)
+        self.assertEqual(self.wh.reserved_products, [kept])
+        self.assertEqual(self.wh.reserved_quantity(self.clothing.bar_code), 1)
+
+    def test_snapshot_relinks_reservations_to_live_products(self):
+        self._reserve(self.food, 2)
+        self._reserve(self.food, 3)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "warehouse.pickle")
+            self.wh.save_snapshot(path)
+            wh = Warehouse("Reloaded")
+            wh.load_snapshot(path)
+
+        apple = wh.find_by_bar_code(self.food.bar_code)
+        self.assertEqual([r["quantity"] for r in wh.reserved_products], [2, 3])
+        self.assertEqual(wh.reserved_quantity(apple.bar_code), 5)
+        self.assertTrue(all(r["product"] is apple for r in wh.reserved_products))
+
+    def test_snapshot_keeps_reservations_of_deleted_products(self):
+        self._reserve(self.electronic, 1)
+        self._reserve(self.electronic, 1)
+        self.wh.remove_product(self.electronic)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "warehouse.pickle")
+            self.wh.save_snapshot(path)
+            wh = Warehouse("Reloaded")
+            wh.load_snapshot(path)
+
+        self.assertIsNone(wh.find_by_bar_code(self.electronic.bar_code))
+        first, second = wh.reserved_products
+        self.assertIs(first["product"], second["product"])
+        self.assertEqual(first["product"].bar_code, self.electronic.bar_code)
+
+    def test_legacy_reservation_file_is_deduplicated(self):
+        self._reserve(self.food, 1)
+        with tempfile.TemporaryDirectory() as tmp:
+            cwd = os.getcwd()
+            os.chdir(tmp)
+            try:
+                self.wh.save_products()
+                self.wh.save_reservation()
+                wh = Warehouse("Reloaded")
+                wh.load_snapshot()
+            finally:
+                os.chdir(cwd)
+
+        self.assertIs(wh.reserved_products[0]["product"], wh.find_by_bar_code(self.food.bar_code))
+
+    def test_baseline_files_load_and_accept_new_reservations(self):
+        old_code = str(uuid.uuid4())
+        self.food.bar_code = old_code
+        reserved_copy = copy.deepcopy(self.food)
+        pickup = datetime.datetime.now() + datetime.timedelta(days=1)
+        with tempfile.TemporaryDirectory() as tmp:
+            cwd = os.getcwd()
+            os.chdir(tmp)
+            try:
+                with open("warehouse_products.pickle", "wb") as f:
+                    pickle.dump([self.food], f)
+                with open("reserved_products.pickle", "wb") as f:
+                    pickle.dump([{"product": reserved_copy, "quantity": 2, "pickup_datetime": pickup}], f)
+                wh = Warehouse("Baseline")
+                wh.load_snapshot()
+            finally:
+                os.chdir(cwd)
+
+        apple = wh.find_by_bar_code(old_code)
+        self.assertIs(wh.reserved_products[0]["product"], apple)
+        wh.add_reservation(apple, 3, pickup)
+        with wh.view() as view:
+            self.assertEqual(view.record(apple.bar_code).held, 5)
+            self.assertEqual({r.bar_code for r in view.reservations()}, {apple.bar_code})
+        self.assertEqual(len(wh.page_reservations().items), 2)
+
+    def test_aggregates_follow_every_mutation(self):
+        stats = self.wh.stats
+        self.assertAlmostEqual(stats.total_value, 10 * 1.0 + 5 * 500.0 + 15 * 20.0)
+        self.assertEqual(stats.units_expiring_within(7), 10)
+
+        self.wh.set_price(self.clothing, 30.0)
+        self.wh.add_stock(self.electronic, 2)
+        self.wh.apply_discount(self.electronic, 10)
+        self.assertAlmostEqual(self.wh.sell(self.food, 4), 4.0)
+        self._reserve(self.food, 1)
+        self.wh.insert_product(ClothingProduct("Scarf", 8.0, 2, "", "U", "grey"))
+        self.wh.remove_product(self.clothing)
+
+        self.assertAlmostEqual(stats.total_value, 5 * 1.0 + 7 * 450.0 + 2 * 8.0)
+        self.assertEqual(stats.units_by_category, {"Food": 5, "Electronic": 7, "Clothing": 2})
+        self.assertEqual(stats.units_expiring_within(7), 5)
+        self.assertEqual(stats.units_expiring_within(2), 0)
+        self.assertEqual(self.wh.check_aggregates(), [])
+
+    def test_check_aggregates_reports_drift(self):
+        self.clothing.quantity = 99
+        self.assertTrue(self.wh.check_aggregates())
+
+    def test_food_lots_are_allocated_first_expiry_first_out(self):
+        today = datetime.date.today()
+        self.wh.add_stock(self.food, 5, today + datetime.timedelta(days=2))
+        self.wh.add_stock(self.food, 4, today + datetime.timedelta(days=9))
+        self.assertEqual(self.food.quantity, 19)
+        self.assertEqual(self.food.expiration_date, today + datetime.timedelta(days=2))
+
+        self.wh.sell(self.food, 7)
+        reservation = self._reserve(self.food, 4)
+        self.assertEqual(reservation["lots"], [(today + datetime.timedelta(days=5), 4)])
+        self.assertEqual(self.food.lot_summary(), [(today + datetime.timedelta(days=5), 4),
+                                                   (today + datetime.timedelta(days=9), 4)])
+        self.assertEqual(self.wh.check_aggregates(), [])
+
+    def test_expiry_sweep_removes_only_expired_lots(self):
+        today = datetime.date.today()
+        self.wh.add_stock(self.food, 3, today + datetime.timedelta(days=30))
+        self.food.lots[0][0] = today - datetime.timedelta(days=1)
+        self.wh.products = self.wh.products
+
+        swept = self.wh.remove_expired()
+        self.assertEqual(swept, [(self.food, 10)])
+        self.assertIn(self.food, self.wh.products)
+        self.assertEqual(self.food.quantity, 3)
+        self.assertEqual(self.wh.check_aggregates(), [])
+
+    def test_an_expired_lot_does_not_block_the_fresh_ones(self):
+        today = datetime.date.today()
+        self.wh.add_stock(self.food, 50, today + datetime.timedelta(days=30))
+        self.food.lots[0][0] = today - datetime.timedelta(days=1)
+        self.wh.products = self.wh.products
+        self.assertIsNone(kind_of(self.food).sale_block(self.food, today))
+        with self.assertRaisesRegex(ValueError, "Available: 50"):
+            self.wh.sell(self.food, 51)
+        self.wh.sell(self.food, 20)
+        self.wh.add_stock(self.food, 5)
+        self.assertEqual(self.food.lot_summary(), [(today - datetime.timedelta(days=1), 10),
+                                                   (today + datetime.timedelta(days=30), 35)])
+        self.assertEqual(self.wh.check_aggregates(), [])
+
+    def test_pickled_food_without_lots_is_upgraded(self):
+        state = dict(self.food.__dict__)
+        for key in ("lots", "_lot_seq", "_expiration_date"):
+            state.pop(key)
+        state["expiration_date"] = datetime.date.today()
+        old = FoodProduct.__new__(FoodProduct)
+        old.__setstate__(state)
+        self.assertEqual(old.lot_summary(), [(datetime.date.today(), 10)])
+        self.assertEqual(old.take(4), [(datetime.date.today(), 4)])
+
+    def _add_style(self):
+        style = ClothingStyle("Hoodie", 40.0, "Fleece", ["S", "M", "L"], ["black", "grey"],
+                              stock={("M", "black"): 4, ("L", "grey"): 2})
+        return self.wh.insert_product(style)
+
+    def test_style_variants_have_their_own_bar_codes(self):
+        style = self._add_style()
+        variants = style.variants()
+        codes = [v.bar_code for v in variants]
+        self.assertEqual(len(set(codes + [style.bar_code])), 7)
+        for variant in variants:
+            self.assertEqual(self.wh.find_by_bar_code(format_bar_code(variant.bar_code)), variant)
+        self.assertEqual(style.quantity, 6)
+
+    def test_selling_a_variant_updates_the_matrix(self):
+        style = self._add_style()
+        medium_black = self.wh.find_by_name("Hoodie (M/black)")
+        self.assertEqual(self.wh.sell(medium_black, 3), 120.0)
+        self._reserve(style.variant("L", "grey"), 2)
+        self.wh.add_stock(style.variant("S", "grey"), 5)
+
+        self.assertEqual(list(style.stock), [0, 5, 1, 0, 0, 0])
+        self.assertEqual(style.quantity, 6)
+        self.assertEqual(self.wh.reserved_quantity(style.bar_code), 2)
+        self.assertEqual(self.wh.check_aggregates(), [])
+        with self.assertRaises(ValueError):
+            self.wh.sell(style, 1)
+        with self.assertRaises(ValueError):
+            self.wh.remove_product(medium_black)
+
+    def test_style_snapshot_round_trip(self):
+        style = self._add_style()
+        variant = style.variant("M", "black")
+        self._reserve(variant, 1)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "warehouse.pickle")
+            self.wh.save_snapshot(path)
+            wh = Warehouse("Reloaded")
+            wh.load_snapshot(path)
+
+        reloaded = wh.find_by_bar_code(variant.bar_code)
+        self.assertEqual(reloaded.name, "Hoodie (M/black)")
+        self.assertEqual(wh.reserved_products[0]["product"], reloaded)
+        self.assertEqual(wh.reserved_quantity(variant.bar_code), 1)
+
+    def test_receive_scans_applies_a_batch(self):
+        style = self._add_style()
+        small_black = style.variant("S", "black")
+        batch = {
+            format_bar_code(self.electronic.bar_code): 3,
+            format_bar_code(small_black.bar_code): 2,
+            format_bar_code(style.bar_code): 1,
+            "0000000000000": 1,
+        }
+        received, unknown = self.wh.receive_scans(batch)
+
+        self.assertEqual(received, [(self.electronic, 3), (small_black, 2)])
+        self.assertEqual(unknown, [format_bar_code(style.bar_code), "0000000000000"])
+        self.assertEqual(self.electronic.quantity, 8)
+        self.assertEqual(small_black.quantity, 2)
+        self.assertEqual(self.wh.check_aggregates(), [])
+
+    def test_identical_insert_merges_quantity(self):
+        same = ClothingProduct("T-Shirt", 20.0, 5, "Another delivery", "M", "red")
+        stocked = self.wh.insert_product(same)
+        self.assertIs(stocked, self.clothing)
+        self.assertEqual(self.clothing.quantity, 20)
+        self.assertEqual(len(self.wh.products), 3)
+
+        separate = self.wh.insert_product(ClothingProduct("T-Shirt", 20.0, 1, "", "M", "red"), merge=False)
+        self.assertIs(separate, self.wh.products[-1])
+        self.assertIsNot(self.wh.insert_product(ClothingProduct("T-Shirt", 20.0, 1, "", "L", "red")), self.clothing)
+        self.assertEqual(self.wh.check_aggregates(), [])
+
+    def test_identical_food_adds_a_lot(self):
+        later = datetime.date.today() + datetime.timedelta(days=9)
+        self.wh.insert_product(FoodProduct("Apple", 1.0, 4, "Fresh apples", later))
+        self.assertEqual(self.food.quantity, 14)
+        self.assertEqual(self.food.lot_summary()[-1], (later, 4))
+        self.assertEqual(self.wh.check_aggregates(), [])
+
+    def test_repricing_moves_the_identity_key(self):
+        self.wh.set_price(self.clothing, 25.0)
+        self.assertIsNone(self.wh.find_identical(ClothingProduct("T-Shirt", 20.0, 1, "", "M", "red")))
+        self.assertIs(self.wh.find_identical(ClothingProduct("T-Shirt", 25.0, 1, "", "M", "red")), self.clothing)
+
+    def test_merge_duplicates(self):
+        duplicate = ClothingProduct("T-Shirt", 20.0, 3, "", "M", "red")
+        self.wh.insert_product(duplicate, merge=False)
+        reservation = self._reserve(duplicate, 2)
+        old_code = format_bar_code(duplicate.bar_code)
+
+        self.assertEqual(self.wh.merge_duplicates(), [(self.clothing, duplicate)])
+        self.assertEqual(self.clothing.quantity, 16)
+        self.assertNotIn(duplicate, self.wh.products)
+        self.assertIs(reservation["product"], self.clothing)
+        self.assertEqual(self.wh.reserved_quantity(self.clothing.bar_code), 2)
+        self.assertIs(self.wh.find_by_bar_code(old_code), self.clothing)
+        self.assertEqual(self.wh.check_aggregates(), [])
+        with self.wh.view() as view:
+            self.assertEqual([r.bar_code for r in view.reservations()], [self.clothing.bar_code])
+            self.assertEqual(view.record(self.clothing.bar_code).held, 2)
+
+    def test_merged_migrated_products_keep_every_old_label_scanning(self):
+        first = ElectronicProduct("Radio", 40.0, 2, "", self.electronic.warranty_date)
+        second = ElectronicProduct("Radio", 40.0, 3, "", self.electronic.warranty_date)
+        first.bar_code, second.bar_code = str(uuid.uuid4()), str(uuid.uuid4())
+        labels = [first.bar_code, second.bar_code]
+        self.wh.products = [first, second]
+        second_code = format_bar_code(second.bar_code)
+
+        self.assertEqual(self.wh.merge_duplicates(), [(first, second)])
+        for label in labels + [second_code]:
+            self.assertIs(self.wh.find_by_bar_code(label), first)
+        self.assertEqual(first.quantity, 5)
+
+    def test_product_kinds_dispatch_per_class(self):
+        today = datetime.date.today()
+        style = self._add_style()
+        kinds = [kind_of(p) for p in (self.food, self.electronic, self.clothing, style, style.variants()[0])]
+        self.assertEqual([k.type_code for k in kinds], [1, 2, 3, 3, 3])
+        self.assertEqual(kinds[0].expires(self.food), self.food.expiration_date)
+        self.assertEqual(kinds[1].expires(self.electronic), self.electronic.warranty_date)
+        self.assertIsNone(kinds[4].expires(style.variants()[0]))
+        self.assertEqual([k.date_label for k in kinds[:3]], ["Expires", "Warranty", ""])
+        self.assertEqual(date_header(), "Expires/Warranty")
+        self.assertEqual((date_header("Food"), date_header("Clothing")), ("Expires", "Date"))
+
+        self.assertIsNone(kinds[0].sale_block(self.food, today))
+        self.assertIsNone(kinds[0].sale_block(self.food, self.food.expiration_date))
+        self.assertEqual(kinds[0].sale_block(self.food, self.food.expiration_date + datetime.timedelta(days=1)),
+                         "expired")
+        late = self.electronic.warranty_date + datetime.timedelta(days=1)
+        self.assertEqual(kinds[1].sale_block(self.electronic, late), "out of warranty")
+        self.assertIsNone(kinds[4].sale_block(style.variants()[0], late))
+
+
 if __name__ == "__main__":
     unittest.main()
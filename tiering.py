@@ -0,0 +1,165 @@
+import datetime
+import shelve
+from aggregates import InventoryAggregates
+from events import (ProductAdded, ProductRemoved, ProductChanged, LotsChanged, ProductPagedOut, ProductPagedIn,
+                    ReservationAdded, StockReloaded)
+from products import ClothingStyle, ClothingVariant, kind_of
+
+CATALOG_KEY = "__catalog__"
+# Products untouched for this long are paged out by the nightly sweep and by menu option 12
+IDLE_DAYS = 90
+
+
+def cold_filename(snapshot_file: str) -> str:
+    """ The cold store lives next to the snapshot it belongs to. """
+    base = snapshot_file[:-len(".pickle")] if snapshot_file.endswith(".pickle") else snapshot_file
+    return base + "_cold"
+
+
+class ActivityTracker:
+    """ When each resident product was last added, restocked, sold, repriced or reserved. """
+
+    def __init__(self):
+        self.last_seen = {}
+
+    def attach(self, bus):
+        bus.subscribe(ProductAdded, lambda event: self.touch(event.product))
+        bus.subscribe(ProductPagedIn, lambda event: self.touch(event.product))
+        bus.subscribe(ProductChanged, lambda event: self.touch(event.product))
+        bus.subscribe(LotsChanged, lambda event: self.touch(event.product))
+        bus.subscribe(ReservationAdded, lambda event: self.touch(event.reservation["product"]))
+        bus.subscribe(ProductRemoved, lambda event: self.last_seen.pop(event.product.bar_code, None))
+        bus.subscribe(ProductPagedOut, lambda event: self.last_seen.pop(event.product.bar_code, None))
+        bus.subscribe(StockReloaded, self._on_reloaded)
+        return self
+
+    def touch(self, product, now=None):
+        if isinstance(product, ClothingVariant):
+            product = product.style
+        self.last_seen[product.bar_code] = now or datetime.datetime.now()
+
+    def _on_reloaded(self, event):
+        # Products without a saved timestamp count as active from the moment they were loaded
+        now = datetime.datetime.now()
+        self.last_seen = {p.bar_code: self.last_seen.get(p.bar_code, now) for p in event.products}
+
+    def idle_since(self, cutoff) -> set:
+        return {code for code, seen in self.last_seen.items() if seen < cutoff}
+
+
+class ColdStore:
+    """
+    Products paged out of memory, pickled one per key in a shelve file.
+
+    Only a small catalog stays resident: (category, name, expiry) per product plus
+    the names, variant codes and identity key that lead back to it, and the running
+    totals of the cold stock so warehouse valuation still covers it.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._shelf = shelve.open(path)
+        catalog = self._shelf.get(CATALOG_KEY)
+        # Catalogs written before identity keys were kept are rebuilt as well
+        if catalog is None or len(catalog["products"]) != len(self._shelf) - 1 or "identities" not in catalog:
+            catalog = self._rebuild_catalog()
+        self.products = catalog["products"]
+        self.aliases = catalog["aliases"]
+        self.names = catalog["names"]
+        self.identities = catalog["identities"]
+        self.stats = catalog["stats"]
+        self._dirty = False
+
+    def _rebuild_catalog(self) -> dict:
+        # The catalog is written on sync(); after a crash it is recovered from the products themselves
+        self.products, self.aliases, self.names, self.identities = {}, {}, {}, {}
+        self.stats = InventoryAggregates()
+        for key in list(self._shelf.keys()):
+            if key != CATALOG_KEY:
+                self._catalog_add(self._shelf[key])
+        return self._catalog()
+
+    def _catalog(self) -> dict:
+        return {"products": self.products, "aliases": self.aliases, "names": self.names,
+                "identities": self.identities, "stats": self.stats}
+
+    def __len__(self):
+        return len(self.products)
+
+    def resolve(self, bar_code):
+        """ Bar code of the stored product answering to bar_code (a variant code leads to its style). """
+        if bar_code in self.products:
+            return bar_code
+        return self.aliases.get(bar_code)
+
+    def code_for_name(self, name: str):
+        return self.names.get(name)
+
+    def code_for_identity(self, key):
+        """ Bar code of a stored product an identical new one would be merged into, see Product.identity. """
+        return self.identities.get(key)
+
+    def due(self, category: str, today) -> list:
+        """ Stored products of a category whose expiration/warranty date is before today. """
+        return [code for code, (cat, _, expires) in self.products.items()
+                if cat == category and expires is not None and expires < today]
+
+    def _catalog_add(self, product):
+        expires = kind_of(product).expires(product)
+        self.products[product.bar_code] = (product.category, product.name, expires)
+        self.names[product.name] = product.bar_code
+        key = product.identity()
+        if key is not None:
+            self.identities.setdefault(key, product.bar_code)
+        if isinstance(product, ClothingStyle):
+            for variant in product.variants():
+                self.aliases[variant.bar_code] = product.bar_code
+                self.names[variant.name] = product.bar_code
+        self.stats.add(product)
+
+    def _catalog_discard(self, product):
+        del self.products[product.bar_code]
+        self.names.pop(product.name, None)
+        key = product.identity()
+        if key is not None and self.identities.get(key) == product.bar_code:
+            del self.identities[key]
+        if isinstance(product, ClothingStyle):
+            for variant in product.variants():
+                self.aliases.pop(variant.bar_code, None)
+                self.names.pop(variant.name, None)
+        self.stats.discard(product)
+
+    def peek(self, bar_code):
+        """ A detached copy of the product (or variant) answering to bar_code, left in the store; or None. """
+        code = self.resolve(bar_code)
+        if code is None:
+            return None
+        product = self._shelf[str(code)]
+        if code != bar_code:
+            return ClothingVariant(product, product.variant_bar_codes.index(bar_code))
+        return product
+
+    def put(self, product):
+        self._shelf[str(product.bar_code)] = product
+        self._catalog_add(product)
+        self._dirty = True
+
+    def take(self, bar_code):
+        """ Remove and return the product answering to bar_code, or None. """
+        code = self.resolve(bar_code)
+        if code is None:
+            return None
+        product = self._shelf.pop(str(code))
+        self._catalog_discard(product)
+        self._dirty = True
+        return product
+
+    def sync(self):
+        if self._dirty:
+            self._shelf[CATALOG_KEY] = self._catalog()
+            self._dirty = False
+        self._shelf.sync()
+
+    def close(self):
+        self.sync()
+        self._shelf.close()
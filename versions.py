@@ -0,0 +1,205 @@
+import threading
+from typing import NamedTuple, Optional
+from events import (ProductAdded, ProductRemoved, ProductChanged, LotsChanged, ProductPagedOut, ProductPagedIn,
+                    ReservationAdded, ReservationRemoved, ReservationsReloaded, StockReloaded)
+from products import ClothingStyle, ClothingVariant, kind_of
+
+
+class ProductRecord(NamedTuple):
+    bar_code: int
+    category: str
+    name: str
+    price: float
+    quantity: int
+    description: str
+    expires: Optional[object]
+    lots: int
+    held: int
+    variants: tuple = ()
+
+
+class ReservationRecord(NamedTuple):
+    bar_code: int
+    category: str
+    name: str
+    price: float
+    quantity: int
+    description: str
+    expires: Optional[object]
+    pickup_datetime: object
+    reservation_id: int = 0
+    customer: Optional[str] = None
+
+
+def _expires(product):
+    return kind_of(product).expires(product)
+
+
+def _reservation_record(reservation) -> ReservationRecord:
+    product = reservation["product"]
+    return ReservationRecord(
+        product.bar_code, product.category, product.name, product.price, reservation["quantity"],
+        product.description, _expires(product), reservation["pickup_datetime"], reservation["id"],
+        reservation.get("customer"),
+    )
+
+
+class ReadView:
+    """ A point-in-time view of the warehouse; nothing in it changes after it is taken. """
+
+    def __init__(self, store, version, records, reservations):
+        self._store = store
+        self.version = version
+        self._records = records
+        self._reservations = reservations
+        self._released = False
+
+    def products(self):
+        return self._records.values()
+
+    def items(self):
+        """ Like Warehouse.sellable_items(): clothing styles expanded into their variants. """
+        for record in self._records.values():
+            if record.variants:
+                yield from record.variants
+            else:
+                yield record
+
+    def record(self, bar_code):
+        return self._records.get(bar_code)
+
+    def reservations(self):
+        return self._reservations.values()
+
+    def reservation(self, reservation):
+        """ The record of a live reservation dict, if it existed when the view was taken. """
+        return self._reservations.get(id(reservation))
+
+    def __len__(self):
+        return len(self._records)
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._store._unpin(self.version)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class VersionedStore:
+    """
+    Copy-on-write, versioned records of the warehouse, kept up to date from its event bus.
+
+    Readers call read() and get an immutable view in O(1). Writers never wait for
+    readers: the first write while a view is held copies the record dicts, and the
+    copy becomes the next version. Old versions are reclaimed as soon as the last view
+    on them is released (the dicts are simply no longer referenced).
+    """
+
+    def __init__(self, warehouse):
+        self._warehouse = warehouse
+        self._lock = threading.Lock()
+        self.version = 0
+        self._records = {}
+        self._reservations = {}
+        self._shared = False
+        self._pins = {}
+        self._rebuild()
+
+        bus = warehouse.events
+        bus.subscribe(ProductAdded, lambda event: self._refresh(event.product))
+        bus.subscribe(ProductRemoved, self._on_removed)
+        bus.subscribe(ProductPagedIn, lambda event: self._refresh(event.product))
+        bus.subscribe(ProductPagedOut, self._on_removed)
+        bus.subscribe(ProductChanged, lambda event: self._refresh(event.product))
+        bus.subscribe(LotsChanged, lambda event: self._refresh(event.product))
+        bus.subscribe(ReservationAdded, self._on_reservation_added)
+        bus.subscribe(ReservationRemoved, self._on_reservation_removed)
+        bus.subscribe(StockReloaded, lambda event: self._rebuild())
+        bus.subscribe(ReservationsReloaded, lambda event: self._rebuild())
+
+    def read(self) -> ReadView:
+        with self._lock:
+            self._shared = True
+            self._pins[self.version] = self._pins.get(self.version, 0) + 1
+            return ReadView(self, self.version, self._records, self._reservations)
+
+    def live_versions(self) -> dict:
+        """ Versions still held by at least one reader, with their reader counts. """
+        with self._lock:
+            return dict(self._pins)
+
+    def _unpin(self, version):
+        with self._lock:
+            remaining = self._pins[version] - 1
+            if remaining:
+                self._pins[version] = remaining
+            else:
+                del self._pins[version]
+                if version == self.version:
+                    # No reader holds the current dicts any more; writes go in place again
+                    self._shared = False
+
+    def _write(self):
+        # Called with the lock held, before every modification; copies only while a reader holds the current dicts
+        if self._shared and self._pins.get(self.version):
+            self._records = dict(self._records)
+            self._reservations = dict(self._reservations)
+            self.version += 1
+        self._shared = False
+
+    def _record_of(self, product) -> ProductRecord:
+        warehouse = self._warehouse
+        variants = ()
+        if isinstance(product, ClothingStyle):
+            variants = tuple(self._record_of(v) for v in product.variants())
+        return ProductRecord(
+            product.bar_code, product.category, product.name, product.price, product.quantity,
+            product.description, _expires(product), len(getattr(product, "lots", ())),
+            warehouse.reserved_quantity(product.bar_code), variants,
+        )
+
+    def _refresh(self, product):
+        if isinstance(product, ClothingVariant):
+            product = product.style
+        # Only resident products have records; never fault one in from the cold store from inside a handler
+        if self._warehouse._lookup(product.bar_code) is not product:
+            return
+        record = self._record_of(product)
+        with self._lock:
+            self._write()
+            self._records[product.bar_code] = record
+
+    def _on_removed(self, event):
+        with self._lock:
+            self._write()
+            self._records.pop(event.product.bar_code, None)
+
+    def _on_reservation_added(self, event):
+        reservation = event.reservation
+        record = _reservation_record(reservation)
+        with self._lock:
+            self._write()
+            self._reservations[id(reservation)] = record
+        self._refresh(reservation["product"])
+
+    def _on_reservation_removed(self, event):
+        with self._lock:
+            self._write()
+            self._reservations.pop(id(event.reservation), None)
+        self._refresh(event.reservation["product"])
+
+    def _rebuild(self):
+        records = {p.bar_code: self._record_of(p) for p in self._warehouse.products}
+        reservations = {}
+        for reservation in self._warehouse.reserved_products:
+            reservations[id(reservation)] = _reservation_record(reservation)
+        with self._lock:
+            self._records = records
+            self._reservations = reservations
+            self._shared = False
+            self.version += 1
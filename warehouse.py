@@ -1,14 +1,738 @@
 import datetime
+import logging
+import os
 import pickle
+import tempfile
+import time
+from aggregates import InventoryAggregates
+from audit_log import log, log_batch, logger
+from barcodes import BarCodeAllocator, format_bar_code, is_legacy_bar_code, migrate_bar_codes, parse_bar_code
 from decorators import execute_only_at_night_time
-from products import FoodProduct, ElectronicProduct, ClothingProduct, Product
+from events import (EventBus, ProductAdded, ProductRemoved, ProductChanged, LotsChanged, ProductPagedOut,
+                    ProductPagedIn, ProductSold, ReservationAdded, ReservationRemoved, ReservationsReloaded,
+                    StockReloaded)
+from ledger import COVER_DAYS, DEMAND_DAYS, LEAD_DAYS, SalesLedger, reorder_quantity
+from low_stock import LowStockIndex
+from money import CENTS, Money
+from pagination import PAGE_SIZE, ListingIndex, Page
+from price_index import ExpiryIndex, PriceIndex
+from query import QueryResult, compile_query, looks_like_query
+from products import (FoodProduct, ElectronicProduct, ClothingProduct, ClothingStyle, ClothingVariant, Product,
+                      date_header, kind_of, lot_expired)
+from tiering import ActivityTracker, ColdStore
+from versions import VersionedStore, ReadView
+
+SNAPSHOT_FILE = "warehouse.pickle"
+SNAPSHOT_VERSION = 1
+# Changing one of these moves a product to another identity key, see Product.identity
+IDENTITY_FIELDS = ("name", "price_cents", "warranty_date", "size", "color", "material")
+
+
+RESERVATION_PREFIX = "R"
+_BASE36 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+
+def format_reservation_id(number: int) -> str:
+    """ Short code for the counter: R followed by the number in base 36 (R1, RZ, R10, ...). """
+    digits = ""
+    while True:
+        number, digit = divmod(number, 36)
+        digits = _BASE36[digit] + digits
+        if not number:
+            return RESERVATION_PREFIX + digits
+
+
+def parse_reservation_id(reservation_id) -> int:
+    """ Accepts the integer form or the printed code (case and surrounding spaces do not matter). """
+    if isinstance(reservation_id, int):
+        return reservation_id
+    text = str(reservation_id).strip().upper()
+    if text.startswith(RESERVATION_PREFIX) and len(text) > 1 and all(c in _BASE36 for c in text[1:]):
+        return int(text[1:], 36)
+    raise ValueError(f"Invalid reservation ID '{reservation_id}'. It looks like {format_reservation_id(1295)}.")
+
+
+def customer_key(customer: str) -> str:
+    return " ".join(customer.split()).casefold()
+
+
+def write_atomically(filename: str, data: bytes):
+    """ Write to a temporary file next to filename, then rename it over: readers see the old file or the new one. """
+    fd, temporary = tempfile.mkstemp(prefix=".", suffix=".tmp", dir=os.path.dirname(os.path.abspath(filename)))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, filename)
+    except BaseException:
+        try:
+            os.unlink(temporary)
+        except OSError:
+            pass
+        raise
 
 
 class Warehouse:
     def __init__(self, name):
         self.name = name
-        self.products = []
-        self.reserved_products = []
+        self.events = EventBus()
+        # Every published event is a change; a save records the count it covers
+        self.change_count = 0
+        self.saved_change_count = 0
+        self.events.subscribe_all(self._count_change)
+        self.bar_codes = BarCodeAllocator()
+        self.legacy_bar_codes = {}
+        self._by_bar_code = {}
+        self._by_identity = {}
+        self._variants = {}
+        self._products = []
+        self._reserved_units = {}
+        self._reservations_by_bar_code = {}
+        self._reservations_by_id = {}
+        self._reservations_by_customer = {}
+        self._reserved_products = []
+        # Reservation IDs, like bar codes, step through a lane so sites in a cluster never share one
+        self.next_reservation_id = 1
+        self.reservation_id_step = 1
+        self.stats = InventoryAggregates().attach(self.events)
+        self.activity = ActivityTracker().attach(self.events)
+        self.prices = PriceIndex().attach(self.events)
+        self.expiry = ExpiryIndex().attach(self.events)
+        self.low_stock = LowStockIndex().attach(self.events)
+        self.listing = ListingIndex().attach(self.events)
+        self.ledger = SalesLedger().attach(self.events)
+        self.cold = None
+        self.versions = VersionedStore(self)
+
+    def _count_change(self, event):
+        self.change_count += 1
+
+    @property
+    def dirty(self) -> bool:
+        """ Changed since the last save or load. """
+        return self.change_count != self.saved_change_count
+
+    def view(self) -> ReadView:
+        """ Consistent point-in-time records of the stock and reservations; release (or use with) when done. """
+        return self.versions.read()
+
+    @property
+    def products(self):
+        return self._products
+
+    @products.setter
+    def products(self, products):
+        self._products = list(products)
+        self._reindex()
+
+    @property
+    def reserved_products(self):
+        return self._reserved_products
+
+    @reserved_products.setter
+    def reserved_products(self, reservations):
+        self._reserved_products = list(reservations)
+        for reservation in self._reserved_products:
+            self._number_reservation(reservation)
+        self._reindex_reservations()
+        self.events.publish(ReservationsReloaded(self._reserved_products))
+
+    def _reindex(self):
+        self.legacy_bar_codes.update(migrate_bar_codes(self._products, self.bar_codes))
+        self._by_bar_code = {p.bar_code: p for p in self._products}
+        self._by_identity = {}
+        for product in self._products:
+            self._index_identity(product)
+        self._variants = {}
+        styles = [p for p in self._products if isinstance(p, ClothingStyle)]
+        for style in styles:
+            for code in style.variant_bar_codes:
+                if code:
+                    self.bar_codes.observe(code)
+        for style in styles:
+            self._index_variants(style)
+        if self.cold is not None:
+            # A snapshot saved before the last page-out still lists what was paged out since
+            for code in list(self._by_bar_code):
+                self.cold.take(code)
+        self.events.publish(StockReloaded(self._products))
+        if self.cold is not None:
+            self.stats.merge(self.cold.stats)
+
+    def _index_variants(self, style: ClothingStyle):
+        codes = style.variant_bar_codes
+        for index in range(len(codes)):
+            if not codes[index]:
+                codes[index] = self.bar_codes.allocate()
+            self._variants[codes[index]] = ClothingVariant(style, index)
+
+    def _unindex_variants(self, style: ClothingStyle):
+        for code in style.variant_bar_codes:
+            self._variants.pop(code, None)
+
+    def _index_identity(self, product: Product):
+        key = product.identity()
+        if key is not None:
+            self._by_identity.setdefault(key, product)
+
+    def _unindex_identity(self, product: Product):
+        key = product.identity()
+        if key is not None and self._by_identity.get(key) is product:
+            del self._by_identity[key]
+
+    def find_identical(self, product: Product):
+        """ The stocked product that product would be merged into, if any; one in the cold store is paged back in. """
+        key = product.identity()
+        if key is None:
+            return None
+        existing = self._by_identity.get(key)
+        if existing is None and self.cold is not None:
+            code = self.cold.code_for_identity(key)
+            if code is not None:
+                existing = self._fault_in(code)
+        return existing
+
+    def _lookup(self, code):
+        product = self._by_bar_code.get(code)
+        return product if product is not None else self._variants.get(code)
+
+    def _number_reservation(self, reservation):
+        """ Give a reservation without an ID (older data) the next one; make sure loaded IDs are never reissued. """
+        number = reservation.get("id")
+        if number is None:
+            reservation["id"] = number = self.next_reservation_id
+        if number >= self.next_reservation_id:
+            step = self.reservation_id_step
+            self.next_reservation_id += ((number - self.next_reservation_id) // step + 1) * step
+
+    def _reindex_reservations(self):
+        self._reserved_units = {}
+        self._reservations_by_bar_code = {}
+        self._reservations_by_id = {}
+        self._reservations_by_customer = {}
+        for reservation in self._reserved_products:
+            self._index_reservation(reservation)
+
+    def _index_reservation(self, reservation):
+        code = reservation["product"].bar_code
+        self._reserved_units[code] = self._reserved_units.get(code, 0) + reservation["quantity"]
+        self._reservations_by_bar_code.setdefault(code, []).append(reservation)
+        self._reservations_by_id[reservation["id"]] = reservation
+        if reservation.get("customer"):
+            self._reservations_by_customer.setdefault(customer_key(reservation["customer"]), []).append(reservation)
+
+    def _unindex_reservation(self, reservation):
+        del self._reservations_by_id[reservation["id"]]
+        if reservation.get("customer"):
+            key = customer_key(reservation["customer"])
+            mine = self._reservations_by_customer[key]
+            mine.remove(reservation)
+            if not mine:
+                del self._reservations_by_customer[key]
+        code = reservation["product"].bar_code
+        remaining = self._reserved_units[code] - reservation["quantity"]
+        held = self._reservations_by_bar_code[code]
+        held.remove(reservation)
+        if held:
+            self._reserved_units[code] = remaining
+        else:
+            del self._reserved_units[code]
+            del self._reservations_by_bar_code[code]
+
+    def reserved_quantity(self, bar_code) -> int:
+        """ Units of the product currently held by reservations (summed over the variants of a style). """
+        units = self._reserved_units.get(bar_code, 0)
+        style = self._by_bar_code.get(bar_code)
+        if isinstance(style, ClothingStyle):
+            units += sum(self._reserved_units.get(code, 0) for code in style.variant_bar_codes)
+        return units
+
+    def reservations_for(self, bar_code) -> list:
+        return list(self._reservations_by_bar_code.get(bar_code, ()))
+
+    def add_reservation(self, product: Product, quantity: int, pickup_datetime: datetime.datetime, customer=None):
+        """ Take the units out of stock and hold them; the reservation's "id" is what the customer quotes at pickup. """
+        customer = " ".join(customer.split()) if customer else None
+        lots = self._take(product, quantity)
+        reservation = {
+            "id": self.next_reservation_id,
+            "product": product,
+            "quantity": quantity,
+            "pickup_datetime": pickup_datetime
+        }
+        self.next_reservation_id += self.reservation_id_step
+        if customer:
+            reservation["customer"] = customer
+        if lots:
+            reservation["lots"] = lots
+        self._reserved_products.append(reservation)
+        self._index_reservation(reservation)
+        self.events.publish(ReservationAdded(reservation))
+        return reservation
+
+    def drop_reservation(self, reservation):
+        """ Forget a reservation (expired or collected); the reserved units do not go back to stock. """
+        self._reserved_products.remove(reservation)
+        self._unindex_reservation(reservation)
+        self.events.publish(ReservationRemoved(reservation))
+
+    def reservation(self, reservation_id):
+        """ The open reservation with this ID (integer or printed form), or None. """
+        return self._reservations_by_id.get(parse_reservation_id(reservation_id))
+
+    def reservations_of(self, customer: str) -> list:
+        """ Open reservations made under the customer's name (case and spacing do not matter), oldest first. """
+        return list(self._reservations_by_customer.get(customer_key(customer), ()))
+
+    def _open_reservation(self, reservation_id):
+        reservation = self.reservation(reservation_id)
+        if reservation is None:
+            raise KeyError(f"No open reservation {format_reservation_id(parse_reservation_id(reservation_id))}.")
+        return reservation
+
+    def pickup_reservation(self, reservation_id, now=None) -> float:
+        """
+        Hand a reservation over at the counter: it is closed and recorded as a sale at the current
+        price. The units already left stock when it was made. Returns the amount to pay.
+        """
+        reservation = self._open_reservation(reservation_id)
+        product, quantity = reservation["product"], reservation["quantity"]
+        self.drop_reservation(reservation)
+        unit_cents = product.price_cents
+        if self.events.has_subscribers(ProductSold):
+            self.events.publish(ProductSold(product, quantity, unit_cents, now or datetime.datetime.now()))
+        return unit_cents * quantity / CENTS
+
+    def cancel_reservation(self, reservation_id) -> int:
+        """
+        Close a reservation and put its units back in stock, food into the lots they were taken from.
+        Units of lots that expired while reserved are written off instead; returns how many.
+        The reservation stays open if the units cannot be restocked.
+        """
+        reservation = self._open_reservation(reservation_id)
+        product = reservation["product"]
+        today = datetime.date.today()
+        lots = reservation.get("lots") or [(None, reservation["quantity"])]
+        returned = [(day, units) for day, units in lots if day is None or not lot_expired(day, today)]
+        expired = reservation["quantity"] - sum(units for _, units in returned)
+        if self.find_by_bar_code(product.bar_code) == product:
+            for day, units in returned:
+                self.add_stock(product, units, day)
+        else:
+            # The product was deleted while reserved; the returned units stock it again
+            for day, units in returned:
+                product.restock(units, day)
+            if returned:
+                self.insert_product(product.style if isinstance(product, ClothingVariant) else product)
+        self.drop_reservation(reservation)
+        if expired:
+            log(logging.INFO, "reservations.cancel.expired",
+                f"Wrote off {expired} expired unit(s) of {product.name} held by a cancelled reservation",
+                bar_code=product.bar_code, units=expired)
+        return expired
+
+    def expire_reservations(self, now=None):
+        started = time.perf_counter()
+        if now is None:
+            now = datetime.datetime.now()
+        expired = [r for r in self._reserved_products if r["pickup_datetime"] <= now]
+        for reservation in expired:
+            self.drop_reservation(reservation)
+        if expired:
+            log_batch("reservations.expired", f"Expired {len(expired)} reservation(s)", started,
+                      reservations=len(expired), units=sum(r["quantity"] for r in expired))
+        return expired
+
+    def insert_product(self, product: Product, merge=True):
+        """
+        Stock a new product and return the stocked product. With merge, a product identical
+        to one already stocked (see Product.identity) only adds its units to that one.
+        """
+        if merge:
+            existing = self.find_identical(product)
+            if existing is not None:
+                self._merge(existing, product)
+                return existing
+        if product.bar_code is None:
+            product.bar_code = self.bar_codes.allocate()
+        self._attach(product)
+        self.events.publish(ProductAdded(product))
+        return product
+
+    def _merge(self, survivor: Product, duplicate: Product):
+        before = survivor.quantity
+        added = survivor.absorb(duplicate)
+        self._quantity_changed(survivor, before, added=added)
+        if isinstance(duplicate.bar_code, int):
+            # Labels already printed with the duplicate's code keep scanning, and so do its older codes
+            for old_code, code in self.legacy_bar_codes.items():
+                if code == duplicate.bar_code:
+                    self.legacy_bar_codes[old_code] = survivor.bar_code
+            self.legacy_bar_codes[format_bar_code(duplicate.bar_code)] = survivor.bar_code
+
+    def merge_duplicates(self) -> list:
+        """
+        One-shot clean-up of data saved before merge-on-insert: folds every product into the
+        first identical one, moving its reservations along. Returns (survivor, duplicate) pairs.
+        """
+        survivors = {}
+        merged = []
+        for product in list(self._products):
+            key = product.identity()
+            if key is None:
+                continue
+            survivor = survivors.setdefault(key, product)
+            if survivor is product:
+                continue
+            self._merge(survivor, product)
+            for reservation in self.reservations_for(product.bar_code):
+                reservation["product"] = survivor
+            self.remove_product(product)
+            merged.append((survivor, product))
+        if merged:
+            # Reassigning reindexes the moved reservations and tells subscribers they now point elsewhere
+            self.reserved_products = self._reserved_products
+        return merged
+
+    def _attach(self, product: Product):
+        self.bar_codes.observe(product.bar_code)
+        if isinstance(product, ClothingStyle):
+            for code in product.variant_bar_codes:
+                if code:
+                    self.bar_codes.observe(code)
+            self._index_variants(product)
+        self._products.append(product)
+        self._by_bar_code[product.bar_code] = product
+        self._index_identity(product)
+
+    def remove_product(self, product: Product):
+        if isinstance(product, ClothingVariant):
+            raise ValueError(f"{product.name} is one variant; delete the whole style by its own bar code.")
+        self._detach(product)
+        self.events.publish(ProductRemoved(product))
+
+    def _detach(self, product: Product):
+        self._products.remove(product)
+        self._by_bar_code.pop(product.bar_code, None)
+        self._unindex_identity(product)
+        if isinstance(product, ClothingStyle):
+            self._unindex_variants(product)
+
+    def open_cold_store(self, path: str) -> ColdStore:
+        """ Attach the on-disk tier that page_out() moves products to. """
+        self.close_cold_store()
+        self.cold = ColdStore(path)
+        # The running totals cover the whole inventory, resident or not
+        self.stats.merge(self.cold.stats)
+        return self.cold
+
+    def close_cold_store(self):
+        if self.cold is not None:
+            self.stats.merge(self.cold.stats, sign=-1)
+            self.cold.close()
+            self.cold = None
+
+    def page_out(self, idle_days=None, now=None) -> list:
+        """
+        Move sold-out products, and with idle_days also products untouched for that long,
+        to the cold store. Products held by a reservation or waiting to be reordered stay resident.
+        """
+        if self.cold is None:
+            raise ValueError("No cold store is attached to this warehouse.")
+        if now is None:
+            now = datetime.datetime.now()
+        idle = set()
+        if idle_days is not None:
+            idle = self.activity.idle_since(now - datetime.timedelta(days=idle_days))
+        with self.view() as view:
+            codes = [r.bar_code for r in view.products() if not r.held and r.bar_code not in self.low_stock
+                     and (r.quantity == 0 or r.bar_code in idle)]
+        paged = []
+        for code in codes:
+            product = self._by_bar_code[code]
+            self._detach(product)
+            self.cold.put(product)
+            self.events.publish(ProductPagedOut(product))
+            paged.append(product)
+        self.cold.sync()
+        return paged
+
+    def _fault_in(self, code):
+        if self.cold is None:
+            return None
+        product = self.cold.take(code)
+        if product is None:
+            return None
+        self._attach(product)
+        self.events.publish(ProductPagedIn(product))
+        return product
+
+    def _fault_in_due(self, category: str, today):
+        if self.cold is not None:
+            for code in self.cold.due(category, today):
+                self._fault_in(code)
+
+    def sellable_items(self):
+        """ Everything that can be bought or reserved on its own: products, with styles expanded to variants. """
+        for product in self._products:
+            if isinstance(product, ClothingStyle):
+                for code in product.variant_bar_codes:
+                    yield self._variants[code]
+            else:
+                yield product
+
+    def price_range(self, low=None, high=None, category=None) -> list:
+        """ Resident products priced between low and high inclusive, cheapest first. """
+        return [self._by_bar_code[code] for code in self.prices.price_range(low, high, category)]
+
+    def cheapest(self, n=1, category=None) -> list:
+        return [self._by_bar_code[code] for code in self.prices.cheapest(n, category)]
+
+    def top_by_value(self, n, category=None) -> list:
+        """ The n resident products holding the most stock value (price * quantity), largest first. """
+        return [self._by_bar_code[code] for code in self.prices.top_by_value(n, category)]
+
+    def query(self, query, category=None) -> QueryResult:
+        """
+        Resident products matching a filter expression (text or a compiled Query), optionally of one
+        category. The result carries the plan: which index or scan supplied the candidates.
+        """
+        query = compile_query(query)
+        plan, codes = query.plan(self, category)
+        predicate = query.predicate
+        products = [p for p in map(self._by_bar_code.get, codes())
+                    if p is not None and predicate(p) and (category is None or p.category == category)]
+        log(logging.DEBUG, "query", f"{query.text}: {len(products)} match(es) via {plan.describe()}",
+            path=plan.path, candidates=plan.candidates, matches=len(products))
+        return QueryResult(products, plan)
+
+    def discount_where(self, query, percent: int) -> list:
+        """ Apply a discount to every resident product matching the filter; returns them. """
+        products = self.query(query).products
+        for product in products:
+            self.apply_discount(product, percent)
+        return products
+
+    def remove_where(self, query) -> list:
+        """ Delete every resident product matching the filter from stock; reservations are kept. """
+        products = self.query(query).products
+        for product in products:
+            self.remove_product(product)
+        return products
+
+    def page_products(self, limit=PAGE_SIZE, token=None, category=None) -> Page:
+        """
+        One page of ProductRecords of the resident stock, ordered by type, name and bar code.
+        Pass the returned token back for the next page; only the page itself is materialized.
+        """
+        codes, token = self.listing.products.page(limit, token, (category,) if category else ())
+        with self.view() as view:
+            records = [view.record(code) for code in codes]
+        return Page([r for r in records if r is not None], token)
+
+    def page_reservations(self, limit=PAGE_SIZE, token=None, category=None) -> Page:
+        """ Like page_products, for ReservationRecords (then ordered by pickup time). """
+        refs, token = self.listing.reservations.page(limit, token, (category,) if category else ())
+        with self.view() as view:
+            records = [view.reservation(self.listing.reservation_of(ref)) for ref in refs]
+        return Page([r for r in records if r is not None], token)
+
+    def receive_scans(self, counts) -> tuple:
+        """
+        Apply a batch of scanned bar codes, each adding one unit per scan.
+        Returns ([(product, units added)], [unknown or unusable codes]).
+        """
+        received, unknown = [], []
+        for code, units in counts.items():
+            product = self.find_by_bar_code(code)
+            if product is None:
+                unknown.append(code)
+                continue
+            try:
+                self.add_stock(product, units)
+            except ValueError:
+                unknown.append(code)
+                continue
+            received.append((product, units))
+        return received, unknown
+
+    def find_by_name(self, name: str):
+        for item in self.sellable_items():
+            if item.name == name:
+                return item
+        if self.cold is not None:
+            code = self.cold.code_for_name(name)
+            if code is not None and self._fault_in(code) is not None:
+                return self.find_by_name(name)
+        return None
+
+    def _set(self, product: Product, field: str, value):
+        # Every change to a stocked product goes through here so subscribers see it
+        before = getattr(product, field)
+        if before == value:
+            return
+        rekey = field in IDENTITY_FIELDS and self._lookup(product.bar_code) is product
+        if rekey:
+            self._unindex_identity(product)
+        setattr(product, field, value)
+        if rekey:
+            self._index_identity(product)
+        if self.events.has_subscribers(ProductChanged):
+            self.events.publish(ProductChanged(product, field, before, value))
+
+    def set_price(self, product: Product, price):
+        """ Set the regular price, given in units; it is stored rounded half up to the cent and must not round to 0. """
+        cents = Money.of_price(price)
+        # Variants share the price of their style
+        if isinstance(product, ClothingVariant):
+            product = product.style
+        self._set(product, "base_price_cents", cents)
+        self._set(product, "price_cents", cents)
+
+    def set_reorder_level(self, product: Product, level):
+        """ Units at or below which the product is listed for reordering (None stops tracking it). """
+        if level is not None:
+            if not isinstance(level, int):
+                raise TypeError("Reorder level must be an integer.")
+            if level < 0:
+                raise ValueError("Reorder level cannot be negative.")
+        # Variants are reordered as part of their style
+        if isinstance(product, ClothingVariant):
+            product = product.style
+        self._set(product, "reorder_level", level)
+
+    def low_stock_items(self, n=None) -> list:
+        """ Resident products at or below their reorder level, most short first. """
+        return [self._by_bar_code[code] for code in self.low_stock.codes(n)]
+
+    def _quantity_changed(self, product: Product, before: int, removed=(), added=()):
+        if removed or added:
+            self.events.publish(LotsChanged(product, tuple(removed), tuple(added)))
+        if product.quantity != before and self.events.has_subscribers(ProductChanged):
+            self.events.publish(ProductChanged(product, "quantity", before, product.quantity))
+
+    def _take(self, product: Product, quantity: int) -> list:
+        before = product.quantity
+        lots = product.take(quantity)
+        self._quantity_changed(product, before, removed=lots)
+        return lots
+
+    def add_stock(self, product: Product, quantity: int, expiration_date=None):
+        """ Receive stock; for food the units form a lot with the given date (default: the earliest lot's). """
+        before = product.quantity
+        lots = product.restock(quantity, expiration_date)
+        self._quantity_changed(product, before, added=lots)
+
+    def apply_discount(self, product: Product, percent: int):
+        if isinstance(product, ClothingVariant):
+            product = product.style
+        # Discounts apply to the regular price, never on top of an earlier discount
+        self._set(product, "price_cents", product.base_price_cents.discounted(percent))
+
+    def sell(self, product: Product, quantity: int, now=None) -> float:
+        """ Take sold units out of stock, record the sale and return the amount to pay, computed in exact cents. """
+        unit_cents = product.price_cents
+        self._take(product, quantity)
+        if self.events.has_subscribers(ProductSold):
+            self.events.publish(ProductSold(product, quantity, unit_cents, now or datetime.datetime.now()))
+        return unit_cents * quantity / CENTS
+
+    def open_ledger(self, path: str):
+        """ Load the sales history kept in path and append every new sale to it. """
+        self.ledger.open(path)
+
+    def close_ledger(self):
+        self.ledger.close()
+
+    def reorder_suggestions(self, days=DEMAND_DAYS, lead_days=LEAD_DAYS, cover_days=COVER_DAYS, now=None) -> list:
+        """
+        (item, units to order) for everything sold in the last `days` days whose stock will not last
+        lead_days + cover_days at that rate of sale, largest order first.
+        """
+        suggestions = []
+        for code, units in self.ledger.demand(days, now).items():
+            item = self._lookup(code)
+            # Paged-out items are only read; faulting them in would mark the warehouse changed
+            if item is None and self.cold is not None:
+                item = self.cold.peek(code)
+            # Products removed since they were sold are not reordered
+            if item is None:
+                continue
+            order = reorder_quantity(units, days, item.quantity, lead_days, cover_days)
+            if order:
+                suggestions.append((item, order))
+        suggestions.sort(key=lambda pair: pair[1], reverse=True)
+        return suggestions
+
+    def remove_expired(self) -> list:
+        """
+        Drop the expired lots of every food product; a product left without any lot is
+        removed altogether. Returns (product, units removed) pairs.
+        """
+        started = time.perf_counter()
+        today = datetime.date.today()
+        swept = []
+        self._fault_in_due("Food", today)
+        with self.view() as view:
+            codes = [r.bar_code for r in view.products() if r.category == "Food" and r.expires and r.expires < today]
+        # Per-item records are only built when DEBUG is on; large sweeps skip the formatting entirely
+        detailed = logger.isEnabledFor(logging.DEBUG)
+        for product in [self._lookup(code) for code in codes]:
+            before = product.quantity
+            removed = product.remove_expired_lots(today)
+            self._quantity_changed(product, before, removed=removed)
+            if not product.lots:
+                self.remove_product(product)
+            units = before - product.quantity
+            swept.append((product, units))
+            if detailed:
+                log(logging.DEBUG, "sweep.expired.item", f"Removed {units} expired unit(s) of {product.name}",
+                    bar_code=product.bar_code, units=units)
+        units = sum(units for _, units in swept)
+        log_batch("sweep.expired", f"Removed {units} expired unit(s) of {len(swept)} product(s) from {self.name}",
+                  started, warehouse=self.name, products=len(swept), units=units)
+        return swept
+
+    def remove_out_of_warranty(self) -> list:
+        started = time.perf_counter()
+        today = datetime.date.today()
+        self._fault_in_due("Electronic", today)
+        with self.view() as view:
+            codes = [r.bar_code for r in view.products()
+                     if r.category == "Electronic" and r.expires and r.expires < today]
+        expired = [self._lookup(code) for code in codes]
+        detailed = logger.isEnabledFor(logging.DEBUG)
+        for product in expired:
+            self.remove_product(product)
+            if detailed:
+                log(logging.DEBUG, "sweep.warranty.item", f"Removed {product.name}", bar_code=product.bar_code)
+        log_batch("sweep.warranty", f"Removed {len(expired)} out of warranty product(s) from {self.name}", started,
+                  warehouse=self.name, products=len(expired))
+        return expired
+
+    def check_aggregates(self) -> list:
+        """ Recompute the running totals from scratch; returns the mismatches (empty when consistent). """
+        recount = InventoryAggregates.from_products(self._products)
+        if self.cold is not None:
+            recount.merge(self.cold.stats)
+        return self.stats.differences(recount)
+
+    def find_by_bar_code(self, code):
+        """ Accepts the integer form, a typed/scanned 13-digit string or a pre-migration UUID. """
+        if isinstance(code, str):
+            code = code.strip()
+            if code in self.legacy_bar_codes:
+                code = self.legacy_bar_codes[code]
+            else:
+                try:
+                    code = parse_bar_code(code)
+                except ValueError:
+                    return None
+        product = self._lookup(code)
+        if product is None and self._fault_in(code) is not None:
+            product = self._lookup(code)
+        return product
 
     @execute_only_at_night_time
     def add_product(self):
@@ -27,7 +751,7 @@ class Warehouse:
         while True:
             try:
                 product_price = float(input("Enter product price: "))
-                if product_price <= 0:
+                if Money.of(product_price) <= 0:
                     print("Price must be positive.")
                     continue
                 break
@@ -69,9 +793,27 @@ class Warehouse:
                                             warranty_date)
 
         else:
-            new_product = ClothingProduct(product_name, product_price, product_quantity, product_description)
+            size = input("Enter product size: ").strip()
+            color = input("Enter product color: ").strip()
+            material = input("Enter product material (optional): ").strip() or None
+            try:
+                new_product = ClothingProduct(product_name, product_price, product_quantity, product_description,
+                                              size, color, material)
+            except ValueError as e:
+                print(f"{e}\n")
+                return
 
-        self.products.append(new_product)
+        existing = self.find_identical(new_product)
+        if existing is not None:
+            answer = input(f"An identical product is already stocked (bar code {format_bar_code(existing.bar_code)}). "
+                           f"Add the quantity to it? (Y/n): ").strip().lower()
+            if answer in ("", "y", "yes"):
+                self.insert_product(new_product)
+                print(f"/=== {product_quantity} unit(s) added to {existing.name}, "
+                      f"now {existing.quantity} in stock ===/\n")
+                return
+
+        self.insert_product(new_product, merge=False)
         print(f"/=== {product_type.capitalize()} product {product_name} added successfully! ===/\n")
 
     @execute_only_at_night_time
@@ -81,71 +823,125 @@ class Warehouse:
             print("/=== No bar code entered. Operation cancelled ===/\n")
             return
 
-        for product in self.products:
-            if product.bar_code == bar_code_input:
-                print(f"Found product: {product.name} | Current price: {product.price}, Quantity: {product.quantity}")
-
-                while True:
-                    new_price_input = input("Enter the new price (or leave empty to keep current): ").strip()
-                    if new_price_input == "":
-                        break
-                    try:
-                        new_price = float(new_price_input)
-                        if new_price <= 0:
-                            print("Price must be positive.")
-                            continue
-                        product.price = new_price
-                        product.base_price = new_price
-                        break
-                    except ValueError:
-                        print("Invalid input. Enter a valid number.")
-
-                while True:
-                    new_quantity_input = input("Enter the quantity to add (or leave empty to keep current): ").strip()
-                    if new_quantity_input == "":
-                        break
-                    try:
-                        added_quantity = int(new_quantity_input)
-                        if added_quantity < 0:
-                            print("Quantity to add cannot be negative.")
-                            continue
-                        product.quantity += added_quantity
-                        break
-                    except ValueError:
-                        print("Invalid input. Enter a valid integer.")
-
-                print(f"/=== Product {product.name} successfully updated! New price: {product.price}, "
-                      f"Warehouse stock quantity: {product.quantity} ===/\n")
-                return
+        product = self.find_by_bar_code(bar_code_input)
+        if product is None:
+            print("/=== No product found with that bar code! ===/\n")
+            return
+
+        print(f"Found product: {product.name} | Current price: {product.price}, Quantity: {product.quantity}")
+
+        while True:
+            new_price_input = input("Enter the new price (or leave empty to keep current): ").strip()
+            if new_price_input == "":
+                break
+            try:
+                new_price = float(new_price_input)
+                if Money.of(new_price) <= 0:
+                    print("Price must be positive.")
+                    continue
+                self.set_price(product, new_price)
+                break
+            except ValueError:
+                print("Invalid input. Enter a valid number.")
+
+        while True:
+            new_quantity_input = input("Enter the quantity to add (or leave empty to keep current): ").strip()
+            if new_quantity_input == "":
+                break
+            try:
+                added_quantity = int(new_quantity_input)
+                if added_quantity < 0:
+                    print("Quantity to add cannot be negative.")
+                    continue
+            except ValueError:
+                print("Invalid input. Enter a valid integer.")
+                continue
 
-        print("/=== No product found with that bar code! ===/\n")
+            expiration_date = None
+            if isinstance(product, FoodProduct) and added_quantity:
+                expiration_input = input("Enter the expiration date of the new stock "
+                                         "(YYYY-MM-DD, leave empty to use the earliest lot): ").strip()
+                if expiration_input:
+                    expiration_date = expiration_input
+            try:
+                self.add_stock(product, added_quantity, expiration_date)
+                break
+            except ValueError as e:
+                print(e)
+
+        while True:
+            level_input = input("Enter the reorder level "
+                                "(or leave empty to keep current, '-' to stop tracking): ").strip()
+            if level_input == "":
+                break
+            try:
+                self.set_reorder_level(product, None if level_input == "-" else int(level_input))
+                break
+            except ValueError as e:
+                print(f"Invalid reorder level: {e}")
+
+        print(f"/=== Product {product.name} successfully updated! New price: {product.price}, "
+              f"Warehouse stock quantity: {product.quantity} ===/\n")
 
     def save_products(self, filename="warehouse_products.pickle"):
+        started = time.perf_counter()
         try:
             with open(filename, "wb") as data_file:
-                pickle.dump(self.products, data_file)
-            print(f"/=== Products successfully saved to '{filename}'! ===/\n")
+                pickle.dump({
+                    "products": self.products,
+                    "next_bar_code_serial": self.bar_codes.next_serial,
+                    "bar_code_step": self.bar_codes.step,
+                    "legacy_bar_codes": self.legacy_bar_codes,
+                }, data_file)
+            log_batch("store.save_products", f"Saved {len(self.products)} product(s) to '{filename}'", started,
+                      file=filename, products=len(self.products))
         except (OSError, pickle.PickleError) as e:
-            print(f"Error saving products: {e}")
+            log(logging.ERROR, "store.save_products", f"Error saving products: {e}", file=filename)
 
-    def print_products(self):
-        print("/=== Available Products ===/\n")
-        self._print_products_table(self.products, show_reserved=False)
+    def print_products(self, page_size=None):
+        """ With a page_size, stock and reservations are fetched and printed one page at a time. """
+        if page_size is not None:
+            print("/=== Available Products ===/\n")
+            if self._print_pages(self.page_products, page_size):
+                print("/=== Reserved Products ===/\n")
+                self._print_pages(self.page_reservations, page_size, show_reserved=True)
+            return
 
-        if self.reserved_products:
-            print("/=== Reserved Products ===/\n")
-            self._print_products_table(self.reserved_products, show_reserved=True)
-        else:
-            print("/=== No reserved products at the moment ===/\n")
+        with self.view() as view:
+            print("/=== Available Products ===/\n")
+            self._print_products_table(list(view.products()), show_reserved=False)
+
+            reservations = list(view.reservations())
+            if reservations:
+                print("/=== Reserved Products ===/\n")
+                self._print_products_table(reservations, show_reserved=True)
+            else:
+                print("/=== No reserved products at the moment ===/\n")
+
+    def _print_pages(self, fetch, page_size, show_reserved=False) -> bool:
+        """ Returns False when the user stopped paging. """
+        token = None
+        while True:
+            token = self.print_page(fetch(page_size, token), show_reserved)
+            if token is None:
+                return True
+            if input("Press Enter for the next page (q to stop): ").strip().lower() == "q":
+                return False
+
+    def print_page(self, page: Page, show_reserved=False):
+        """ Print one page from page_products/page_reservations; returns the token of the next page. """
+        self._print_products_table(page.items, show_reserved)
+        return page.token
 
     def _print_products_table(self, products_list, show_reserved=False):
+        """ Prints ProductRecord or ReservationRecord rows taken from a view(). """
         if not products_list:
             print("/=== No products found ===/\n")
             return
 
-        headers = ["Type", "Name", "Price", "Quantity", "Description", "Bar Code", "Exp/Warranty Date",
+        headers = ["Type", "Name", "Price", "Quantity", "Description", "Bar Code", date_header(),
                    "Reservation Date/Time"]
-        widths = [12, 20, 10, 10, 30, 36, 20, 20]
+        widths = [12, 20, 10, 10, 30, 13, 20, 20]
 
         line_sep = "+" + "+".join(["-" * w for w in widths]) + "+"
         header_row = "|" + "|".join([h.ljust(w) for h, w in zip(headers, widths)]) + "|"
@@ -154,33 +950,18 @@ class Warehouse:
         print(header_row)
         print(line_sep)
 
-        for item in products_list:
-            if show_reserved:
-                product = item["product"]
-                quantity = item["quantity"]
-                reservation_dt = item["pickup_datetime"].strftime("%Y-%m-%d %H:%M")
-            else:
-                product = item
-                quantity = product.quantity
-                reservation_dt = ""
-
-            if isinstance(product, FoodProduct):
-                type_name = "Food"
-                exp_warranty = str(product.expiration_date)
-            elif isinstance(product, ElectronicProduct):
-                type_name = "Electronic"
-                exp_warranty = str(product.warranty_date)
-            else:
-                type_name = "Clothing"
-                exp_warranty = "-"
+        for record in products_list:
+            reservation_dt = (f"{record.pickup_datetime:%Y-%m-%d %H:%M} {format_reservation_id(record.reservation_id)}"
+                              if show_reserved else "")
+            exp_warranty = str(record.expires) if record.expires else "-"
 
             row = [
-                type_name.ljust(widths[0]),
-                product.name.ljust(widths[1]),
-                f"{product.price:.2f}".rjust(widths[2]),
-                str(quantity).rjust(widths[3]),
-                product.description.ljust(widths[4]),
-                product.bar_code.ljust(widths[5]),
+                record.category.ljust(widths[0]),
+                record.name.ljust(widths[1]),
+                f"{record.price:.2f}".rjust(widths[2]),
+                str(record.quantity).rjust(widths[3]),
+                record.description.ljust(widths[4]),
+                format_bar_code(record.bar_code).ljust(widths[5]),
                 exp_warranty.ljust(widths[6]),
                 reservation_dt.ljust(widths[7])
             ]
@@ -188,62 +969,86 @@ class Warehouse:
         print(line_sep + "\n")
 
     def load_products(self, filename="warehouse_products.pickle"):
+        started = time.perf_counter()
         try:
             with open(filename, "rb") as data_file:
-                self.products = pickle.load(data_file)
-            print(f"/=== Products successfully loaded from '{filename}'! ===/\n")
+                data = pickle.load(data_file)
+            if isinstance(data, list):
+                # Files written before integer bar codes hold the bare product list
+                self.products = data
+            else:
+                self.bar_codes = BarCodeAllocator(data["next_bar_code_serial"], data.get("bar_code_step", 1))
+                self.legacy_bar_codes = dict(data.get("legacy_bar_codes", {}))
+                self.products = data["products"]
+            log_batch("store.load_products", f"Loaded {len(self.products)} product(s) from '{filename}'", started,
+                      file=filename, products=len(self.products))
         except FileNotFoundError:
-            print(f"/=== File '{filename}' not found. No products loaded. ===/\n")
+            log(logging.WARNING, "store.load_products", f"File '{filename}' not found. No products loaded.",
+                file=filename)
         except (OSError, pickle.PickleError) as e:
-            print(f"/=== Error loading products: {e} ===/\n")
+            log(logging.ERROR, "store.load_products", f"Error loading products: {e}", file=filename)
 
     @execute_only_at_night_time
     def remove_expired_products(self):
-        removed_any = False
-        for product in self.products[:]:
-            if isinstance(product, FoodProduct) and product.is_expired():
-                self.products.remove(product)
-                print(f"/=== The {product.name} has been removed from the Main Warehouse ===/\n")
-                removed_any = True
-        if not removed_any:
-            print("/=== There are no expired products to be removed ===/\n")
+        # remove_expired() logs one summary for the whole sweep
+        self.remove_expired()
 
     @execute_only_at_night_time
     def remove_out_of_warranty_products(self):
-        removed_any = False
-        for product in self.products[:]:
-            if isinstance(product, ElectronicProduct) and not product.is_under_warranty():
-                self.products.remove(product)
-                print(f"/=== The {product.name} has been removed from the Main Warehouse ===/\n")
-                removed_any = True
-        if not removed_any:
-            print("/=== There are no out of warranty products to be removed ===/\n")
+        self.remove_out_of_warranty()
+
+    def _confirm_matches(self, text, question) -> bool:
+        """ Show how many products a console filter matches and ask before changing them. """
+        try:
+            matches = self.query(text).products
+        except ValueError as e:
+            print(f"/=== Invalid filter: {e} ===/\n")
+            return False
+        if not matches:
+            print(f"/=== No product matches '{text}' ===/\n")
+            return False
+        answer = input(question.format(len(matches), text) + " (y/N): ").strip().lower()
+        if answer not in ("y", "yes"):
+            print("/=== Operation cancelled ===/\n")
+            return False
+        return True
 
     @execute_only_at_night_time
     def delete_product(self):
-        bar_code_input = input("Please enter the bar code of the product you want to delete: ").strip()
+        bar_code_input = input("Please enter the bar code of the product you want to delete "
+                               "(or a filter such as type=Food and qty<10): ").strip()
         if not bar_code_input:
             print("/=== No bar code entered. Operation cancelled ===/\n")
             return
 
-        for product in self.products:
-            if product.bar_code == bar_code_input:
-                reserved_count = sum(
-                    r["quantity"] for r in self.reserved_products if r["product"].bar_code == bar_code_input
-                )
-                if reserved_count > 0:
-                    print(f"/=== Warning: {reserved_count} unit(s) of this product are currently reserved. "
-                          f"Only warehouse stock will be deleted. ===/")
-
-                self.products.remove(product)
-                print(f"/=== Product {product.name} has been successfully deleted from the warehouse ===/\n")
+        if looks_like_query(bar_code_input):
+            if not self._confirm_matches(bar_code_input, "Delete {} product(s) matching '{}'?"):
                 return
+            removed = self.remove_where(bar_code_input)
+            print(f"/=== Deleted {len(removed)} product(s) matching '{bar_code_input}' from the warehouse ===/\n")
+            return
+
+        product = self.find_by_bar_code(bar_code_input)
+        if product is None:
+            print("/=== No product found with that bar code! ===/\n")
+            return
+
+        if isinstance(product, ClothingVariant):
+            print(f"/=== {product.name} is one variant; delete the whole style by its own bar code. ===/\n")
+            return
 
-        print("/=== No product found with that bar code! ===/\n")
+        reserved_count = self.reserved_quantity(product.bar_code)
+        if reserved_count > 0:
+            print(f"/=== Warning: {reserved_count} unit(s) of this product are currently reserved. "
+                  f"Only warehouse stock will be deleted. ===/")
+
+        self.remove_product(product)
+        print(f"/=== Product {product.name} has been successfully deleted from the warehouse ===/\n")
 
     @execute_only_at_night_time
     def add_discount(self):
-        bar_code_input = input("Please enter the bar code of the product you want to discount: ").strip()
+        bar_code_input = input("Please enter the bar code of the product you want to discount "
+                               "(or a filter such as type=Food and expires<2026-11-01): ").strip()
         if not bar_code_input:
             print("/=== No bar code entered. Operation cancelled ===/\n")
             return
@@ -258,40 +1063,39 @@ class Warehouse:
             print("This is not a valid discount percentage. Please enter a value between 1 and 100.\n")
             return
 
-        for product in self.products:
-            if bar_code_input == product.bar_code:
-                old_price = product.pricez
-                product.price = product.base_price * (1 - discount_percent / 100)
-                print(f"/=== Discount of {discount_percent}% applied successfully to product {product.name}. "
-                      f"Old price: {old_price:.2f}, New price: {product.price:.2f} ===/\n")
+        if looks_like_query(bar_code_input):
+            if not self._confirm_matches(bar_code_input,
+                                         f"Apply a {discount_percent}% discount to {{}} product(s) matching '{{}}'?"):
                 return
+            discounted = self.discount_where(bar_code_input, discount_percent)
+            print(f"/=== Discount of {discount_percent}% applied to {len(discounted)} product(s) "
+                  f"matching '{bar_code_input}' ===/\n")
+            return
 
-        print("/=== No product found with that bar code! ===/\n")
+        product = self.find_by_bar_code(bar_code_input)
+        if product is None:
+            print("/=== No product found with that bar code! ===/\n")
+            return
+
+        old_price = product.price
+        self.apply_discount(product, discount_percent)
+        print(f"/=== Discount of {discount_percent}% applied successfully to product {product.name}. "
+              f"Old price: {old_price:.2f}, New price: {product.price:.2f} ===/\n")
 
     def reserve_product(self):
         now = datetime.datetime.now()
-        for reservation in self.reserved_products[:]:
-            if reservation["pickup_datetime"] <= now:
-                print(
-                    f"/=== Reservation for {reservation['quantity']} {reservation['product'].name} has expired and is removed ===/")
-                self.reserved_products.remove(reservation)
+        self.expire_reservations(now)
 
         product_name_input = input("Please enter the product name: ").strip()
-        found_product = None
-        for product in self.products:
-            if product.name == product_name_input:
-                found_product = product
-                break
+        found_product = self.find_by_name(product_name_input)
 
         if not found_product:
             print("No product found with this name.\n")
             return
 
-        if isinstance(found_product, FoodProduct) and found_product.expiration_date <= now:
-            print(f"Cannot reserve {found_product.name}: product has expired.\n")
-            return
-        if isinstance(found_product, ElectronicProduct) and found_product.warranty_date <= now:
-            print(f"Cannot reserve {found_product.name}: product is out of warranty.\n")
+        reason = kind_of(found_product).sale_block(found_product, now.date())
+        if reason:
+            print(f"Cannot reserve {found_product.name}: product is {reason}.\n")
             return
 
         while True:
@@ -319,60 +1123,217 @@ class Warehouse:
             except ValueError:
                 print("Invalid date/time format. Use YYYY-MM-DD HH:MM.")
 
-        found_product.quantity -= product_quantity_input
+        customer = input("Customer name (optional): ").strip()
+        try:
+            reservation = self.add_reservation(found_product, product_quantity_input, product_reservation_datetime,
+                                               customer or None)
+        except ValueError as e:
+            # Units of a lot past its date are counted in stock but cannot be reserved
+            print(f"{e}\n")
+            return
+
+        print(f"/=== {product_quantity_input} {found_product.name} reserved successfully for "
+              f"{product_reservation_datetime}. Reservation ID: {format_reservation_id(reservation['id'])} ===/\n")
 
-        reservation = {
-            "product": found_product,
-            "quantity": product_quantity_input,
-            "pickup_datetime": product_reservation_datetime
-        }
-        self.reserved_products.append(reservation)
+    def collect_reservation(self):
+        reference = input("Please enter the reservation ID or the customer name: ").strip()
+        try:
+            reservation = self.reservation(reference)
+        except ValueError:
+            # Not an ID, so a customer name
+            mine = self.reservations_of(reference)
+            if not mine:
+                print(f"No open reservations for {reference}.\n")
+                return
+            for r in mine:
+                print(f"{format_reservation_id(r['id'])}: {r['quantity']} {r['product'].name}, "
+                      f"pickup {r['pickup_datetime']:%Y-%m-%d %H:%M}")
+            try:
+                reservation = self.reservation(input("Enter the ID of the reservation to collect: "))
+            except ValueError as e:
+                print(f"{e}\n")
+                return
+        if reservation is None:
+            print("No open reservation with that ID.\n")
+            return
 
-        print(
-            f"/=== {product_quantity_input} {found_product.name} reserved successfully for {product_reservation_datetime} ===/\n")
+        action = input("Pick it up (p) or cancel it (c)? ").strip().lower()
+        name = f"{reservation['quantity']} {reservation['product'].name}"
+        if action == "p":
+            total = self.pickup_reservation(reservation["id"])
+            print(f"/=== {name} picked up. Total to pay: {total:.2f} ===/\n")
+        elif action == "c":
+            try:
+                expired = self.cancel_reservation(reservation["id"])
+            except ValueError as e:
+                print(f"/=== Reservation not cancelled: {e} ===/\n")
+                return
+            if expired:
+                print(f"/=== Reservation cancelled; {expired} expired unit(s) of {name} were written off ===/\n")
+            else:
+                print(f"/=== Reservation cancelled; {name} back in stock ===/\n")
+        else:
+            print("Nothing changed.\n")
 
     def save_reservation(self):
         if not hasattr(self, 'reserved_products') or not self.reserved_products:
-            print("/=== No reserved products to save ===/\n")
+            log(logging.INFO, "store.save_reservations", "No reserved products to save")
             return
 
+        started = time.perf_counter()
         try:
             with open("reserved_products.pickle", "wb") as file:
                 pickle.dump(self.reserved_products, file)
-            print("/=== Reserved products successfully saved! ===/\n")
+            log_batch("store.save_reservations", f"Saved {len(self.reserved_products)} reservation(s)", started,
+                      reservations=len(self.reserved_products))
         except Exception as e:
-            print(f"/=== Something went wrong while saving reserved products: {e} ===/\n")
+            log(logging.ERROR, "store.save_reservations", f"Something went wrong while saving reserved products: {e}")
 
     def load_reservation(self):
+        started = time.perf_counter()
         try:
             with open("reserved_products.pickle", "rb") as file:
-                self.reserved_products = pickle.load(file)
-            print("/=== Reserved products successfully loaded! ===/\n")
+                # Relinked before they are set, so subscribers only ever see the live products
+                self.reserved_products = self._relink_reservations(pickle.load(file))
+            log_batch("store.load_reservations", f"Loaded {len(self.reserved_products)} reservation(s)", started,
+                      reservations=len(self.reserved_products))
         except FileNotFoundError:
-            print("/=== No reserved products file found. ===/\n")
+            log(logging.INFO, "store.load_reservations", "No reserved products file found.")
             self.reserved_products = []
         except Exception as e:
-            print(f"/=== Something went wrong while loading reserved products: {e} ===/\n")
+            log(logging.ERROR, "store.load_reservations", f"Something went wrong while loading reserved products: {e}")
             self.reserved_products = []
 
+    def _relink_reservations(self, reservations) -> list:
+        # The legacy reservation file pickles its own copy of every reserved product.
+        # Point each reservation back at the live product, or at one shared copy if the
+        # product was deleted from stock in the meantime.
+        for reservation in reservations:
+            product = reservation["product"]
+            if is_legacy_bar_code(product.bar_code) and product.bar_code in self.legacy_bar_codes:
+                product.bar_code = self.legacy_bar_codes[product.bar_code]
+        migrate_bar_codes([r["product"] for r in reservations], self.bar_codes)
+
+        detached = {}
+        for reservation in reservations:
+            code = reservation["product"].bar_code
+            live = self._lookup(code)
+            if live is None:
+                live = detached.setdefault(code, reservation["product"])
+            reservation["product"] = live
+        return reservations
+
+    def save_snapshot(self, filename=SNAPSHOT_FILE) -> bool:
+        """
+        Products and reservations in one file; reservations only keep the bar code they refer to.
+        The file is replaced atomically, so a crash mid-save leaves the previous snapshot intact.
+        """
+        started = time.perf_counter()
+        try:
+            changes, data = self.snapshot_bytes()
+            write_atomically(filename, data)
+            if self.cold is not None:
+                self.cold.sync()
+        except (OSError, pickle.PickleError) as e:
+            log(logging.ERROR, "store.save_snapshot", f"Error saving warehouse: {e}", file=filename)
+            return False
+        self.saved_change_count = changes
+        log_batch("store.save_snapshot", f"Saved {self.name} to '{filename}'", started, file=filename,
+                  products=len(self.products), reservations=len(self.reserved_products))
+        return True
+
+    def snapshot_bytes(self) -> tuple:
+        """ (change count the state reflects, pickled snapshot state). """
+        changes = self.change_count
+        return changes, pickle.dumps(self._snapshot_state(), protocol=pickle.HIGHEST_PROTOCOL)
+
+    def load_snapshot(self, filename=SNAPSHOT_FILE) -> bool:
+        """ Returns False when the file exists but cannot be read; the warehouse is then left as it was. """
+        started = time.perf_counter()
+        try:
+            with open(filename, "rb") as data_file:
+                state = pickle.load(data_file)
+        except FileNotFoundError:
+            log(logging.WARNING, "store.load_snapshot",
+                f"File '{filename}' not found. Falling back to the separate product files.", file=filename)
+            self.load_products()
+            self.load_reservation()
+            return True
+        except (OSError, EOFError, pickle.PickleError) as e:
+            log(logging.ERROR, "store.load_snapshot", f"Error loading warehouse: {e}", file=filename)
+            return False
+
+        self._restore_state(state)
+        self.saved_change_count = self.change_count
+        log_batch("store.load_snapshot", f"Loaded {self.name} from '{filename}'", started, file=filename,
+                  products=len(self.products), reservations=len(self.reserved_products))
+        return True
+
+    def _snapshot_state(self):
+        detached = {}
+        reservations = []
+        for reservation in self.reserved_products:
+            product = reservation["product"]
+            if self._lookup(product.bar_code) != product:
+                detached.setdefault(product.bar_code, product)
+            reservations.append((product.bar_code, reservation["quantity"], reservation["pickup_datetime"],
+                                 reservation.get("lots"), reservation["id"], reservation.get("customer")))
+
+        return {
+            "version": SNAPSHOT_VERSION,
+            "next_bar_code_serial": self.bar_codes.next_serial,
+            "bar_code_step": self.bar_codes.step,
+            "legacy_bar_codes": self.legacy_bar_codes,
+            "products": self.products,
+            "detached_products": list(detached.values()),
+            "reservations": reservations,
+            "next_reservation_id": self.next_reservation_id,
+            "reservation_id_step": self.reservation_id_step,
+            "last_activity": self.activity.last_seen,
+        }
+
+    def _restore_state(self, state):
+        self.bar_codes = BarCodeAllocator(state["next_bar_code_serial"], state.get("bar_code_step", 1))
+        self.legacy_bar_codes = dict(state["legacy_bar_codes"])
+        self.activity.last_seen = dict(state.get("last_activity", {}))
+        self.products = state["products"]
+        # Snapshots from before reservation IDs number their reservations on the lane already set (see WarehouseCluster)
+        if "next_reservation_id" in state:
+            self.next_reservation_id = state["next_reservation_id"]
+            self.reservation_id_step = state.get("reservation_id_step", 1)
+        self.reserved_products = self._resolve_reservations(state["reservations"], state["detached_products"])
+
+    def _resolve_reservations(self, references, detached_products):
+        detached = {p.bar_code: p for p in detached_products}
+        reservations = []
+        for bar_code, quantity, pickup_datetime, *extra in references:
+            # Older snapshots end after the lots, or before them; the ID is then assigned on load
+            lots, number, customer = (extra + [None, None, None])[:3]
+            product = self._lookup(bar_code) or detached.get(bar_code)
+            if product is None:
+                log(logging.WARNING, "store.load_snapshot",
+                    f"Dropping reservation for unknown bar code {format_bar_code(bar_code)}", bar_code=bar_code)
+                continue
+            reservation = {"id": number, "product": product, "quantity": quantity, "pickup_datetime": pickup_datetime}
+            if customer:
+                reservation["customer"] = customer
+            if lots:
+                reservation["lots"] = lots
+            reservations.append(reservation)
+        return reservations
+
     def buy_product(self):
         product_name_input = input("Please enter the product name: ").strip()
-        found_product = None
-        for product in self.products:
-            if product.name == product_name_input:
-                found_product = product
-                break
+        found_product = self.find_by_name(product_name_input)
 
         if not found_product:
             print("No product found with this name.\n")
             return
 
         now = datetime.datetime.now()
-        if isinstance(found_product, FoodProduct) and found_product.expiration_date <= now:
-            print(f"Cannot buy {found_product.name}: product has expired.\n")
-            return
-        if isinstance(found_product, ElectronicProduct) and found_product.warranty_date <= now:
-            print(f"Cannot buy {found_product.name}: product is out of warranty.\n")
+        reason = kind_of(found_product).sale_block(found_product, now.date())
+        if reason:
+            print(f"Cannot buy {found_product.name}: product is {reason}.\n")
             return
 
         while True:
@@ -388,8 +1349,12 @@ class Warehouse:
             except ValueError:
                 print("Invalid quantity. Please enter a number.")
 
-        total_amount_to_pay = product_quantity_input * found_product.price
-        found_product.quantity -= product_quantity_input
+        try:
+            total_amount_to_pay = self.sell(found_product, product_quantity_input)
+        except ValueError as e:
+            # Units of a lot past its date are counted in stock but cannot be sold
+            print(f"{e}\n")
+            return
 
         print(f"/=== You have successfully bought {product_quantity_input} {found_product.name}. "
               f"Total to pay: {total_amount_to_pay:.2f} ===/\n")